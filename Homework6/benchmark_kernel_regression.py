@@ -0,0 +1,115 @@
+import argparse
+import time
+
+import cvxpy as cp
+import numpy as np
+
+from kernel_regression import (KernelRidge, NystroemRidge, RandomFourierRidge, fit_lad, fit_lad_batch,
+                               gaussian_kernel_matrix, load_daily, load_hourly, polynomial_features, rbf_features)
+
+# Wall time of the kernel_regression module against the loops of
+# homework6_python.ipynb, and the accuracy of its approximations.
+#
+#   python benchmark_kernel_regression.py --sigma 20 --lambda 1e-5
+#   python benchmark_kernel_regression.py --skip-notebook --components 200 500 1000
+
+
+# the notebook's kernel: one Python call per entry
+def notebook_kernel_matrix(x, y, sigma):
+    kernel_matrix = np.zeros([len(x), len(y)])
+    for i in range(len(x)):
+        for j in range(len(y)):
+            r = np.abs(x[i] - y[j])
+            kernel_matrix[i, j] = np.exp(-(r ** 2) / (2 * sigma**2))
+    return kernel_matrix
+
+
+# the notebook's fit: explicit inverse of K + lambda I
+def notebook_kernel_ridge(x, y, test_points, sigma, lambda_):
+    K = notebook_kernel_matrix(x, x, sigma)
+    alpha = np.linalg.inv(K + lambda_ * np.eye(len(x))) @ y
+    return notebook_kernel_matrix(test_points, x, sigma) @ alpha
+
+
+# the notebook's LAD fits, one problem per feature map, on the raw
+# columns (which the default conic solver fails on, hence HiGHS)
+def notebook_lad(feature_maps, y):
+    thetas = {}
+    for name, phi in feature_maps.items():
+        theta = cp.Variable(phi.shape[1])
+        cp.Problem(cp.Minimize(cp.sum(cp.abs(y - phi @ theta)))).solve(solver=cp.HIGHS)
+        thetas[name] = theta.value
+    return thetas
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def rmse(prediction, y):
+    return np.sqrt(np.mean((prediction - y)**2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sigma", type=float, default=20)
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=1e-5)
+    parser.add_argument("--hourly-sigma", type=float, default=5)
+    parser.add_argument("--hourly-lambda", type=float, default=1e-3)
+    parser.add_argument("--components", type=int, nargs="+", default=[100, 500, 1000])
+    # largest n fitted exactly on the hourly series (n^2 doubles of kernel)
+    parser.add_argument("--exact-max", type=int, default=10000)
+    parser.add_argument("--skip-notebook", action="store_true")
+    args = parser.parse_args()
+
+    temp, demand = load_daily()
+    test_points = np.linspace(1, temp.max(), 1000)
+    print(f"daily: n = {len(temp)}")
+
+    kernel, kernel_time = timed(gaussian_kernel_matrix, temp, temp, args.sigma)
+    model, fit_time = timed(KernelRidge(args.sigma, args.lambda_).fit, temp, demand)
+    prediction = model.predict(test_points)
+    print(f"{'broadcast kernel':>28}: {kernel_time:8.3f} s")
+    print(f"{'KernelRidge fit (Cholesky)':>28}: {fit_time:8.3f} s")
+    if not args.skip_notebook:
+        notebook_kernel, notebook_kernel_time = timed(notebook_kernel_matrix, temp, temp, args.sigma)
+        notebook_prediction, notebook_time = timed(notebook_kernel_ridge, temp, demand, test_points,
+                                                   args.sigma, args.lambda_)
+        print(f"{'notebook kernel (loops)':>28}: {notebook_kernel_time:8.3f} s "
+              f"({notebook_kernel_time / kernel_time:.0f}x), max |diff| {np.abs(kernel - notebook_kernel).max():.1e}")
+        print(f"{'notebook fit + predict':>28}: {notebook_time:8.3f} s, "
+              f"max |prediction diff| {np.abs(prediction - notebook_prediction).max():.3e}")
+
+    feature_maps = {
+        "linear": polynomial_features(temp, 1),
+        "polynomial": polynomial_features(temp, 5),
+        "rbf": rbf_features(temp, np.linspace(temp.min(), temp.max(), 5), 20),
+    }
+    thetas, batch_time = timed(fit_lad_batch, feature_maps, demand)
+    print(f"{'fit_lad_batch (3 maps)':>28}: {batch_time:8.3f} s")
+    if not args.skip_notebook:
+        notebook_thetas, notebook_lad_time = timed(notebook_lad, feature_maps, demand)
+        # the LAD optimum need not be unique, so compare the sums of |residuals|
+        lad_gap = max(abs(np.abs(demand - phi @ thetas[name]).sum() - np.abs(demand - phi @ notebook_thetas[name]).sum())
+                      for name, phi in feature_maps.items())
+        print(f"{'notebook LAD (3 problems)':>28}: {notebook_lad_time:8.3f} s, max |objective diff| {lad_gap:.1e}")
+    bootstrap = np.random.default_rng(0).choice(demand, size=(len(demand), 50))
+    _, lad_time = timed(fit_lad, feature_maps["polynomial"], bootstrap)
+    print(f"{'fit_lad (50 targets)':>28}: {lad_time:8.3f} s")
+
+    x, y = load_hourly()
+    rng = np.random.default_rng(0)
+    test = rng.random(len(x)) < 0.2
+    print(f"hourly: n = {len(x)} ({np.count_nonzero(~test)} train, {np.count_nonzero(test)} test)")
+    train_x, train_y = x[~test], y[~test]
+    if len(train_x) <= args.exact_max:
+        model, fit_time = timed(KernelRidge(args.hourly_sigma, args.hourly_lambda).fit, train_x, train_y)
+        print(f"{'KernelRidge':>28}: {fit_time:8.3f} s, test rmse {rmse(model.predict(x[test]), y[test]):.2f}")
+    for components in args.components:
+        for name, approximation in (("NystroemRidge", NystroemRidge), ("RandomFourierRidge", RandomFourierRidge)):
+            model, fit_time = timed(approximation(args.hourly_sigma, args.hourly_lambda, components, seed=0).fit,
+                                    train_x, train_y)
+            print(f"{f'{name} m={components}':>28}: {fit_time:8.3f} s, "
+                  f"test rmse {rmse(model.predict(x[test]), y[test]):.2f}")
@@ -0,0 +1,222 @@
+import os
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+import scipy.linalg
+
+# Regression of ERCOT demand on temperature with Gaussian kernels, without
+# the Python loops and explicit inverses of homework6_python.ipynb.
+#
+#   temp, demand = load_daily("hw6_data")
+#   model = KernelRidge(sigma=20, lambda_=1e-5).fit(temp, demand)
+#   x, y = load_hourly("hw6_data")
+#   model = NystroemRidge(sigma=5, lambda_=1e-3, components=500).fit(x, y)
+#   theta = fit_lad(polynomial_features(temp, 5), demand)
+#
+# gaussian_kernel_matrix broadcasts the squared distances, KernelRidge
+# solves (K + lambda I) alpha = y by Cholesky (O(n^2) memory, O(n^3) time:
+# fine for the 1,460 days of maxdemand.txt). For the 35,064 hours of
+# demand.txt, NystroemRidge (m landmark points) and RandomFourierRidge (D
+# random cosine features) fit a ridge regression on n x m / n x D features
+# accumulated in row blocks, O(n m^2) time and O(m^2) memory. fit_lad
+# solves the least absolute deviation fits of several targets in one LP.
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hw6_data")
+MISSING = -9999
+# rows of features held in memory at once
+BLOCK_ROWS = 4096
+
+
+def _columns(x):
+    x = np.asarray(x, dtype=float)
+    return x[:, None] if x.ndim == 1 else x
+
+
+# the (n, m) pairwise squared distances of the rows of x and y
+def squared_distances(x, y):
+    x, y = _columns(x), _columns(y)
+    distances = (x**2).sum(axis=1)[:, None] + (y**2).sum(axis=1)[None, :] - 2 * x @ y.T
+    return np.maximum(distances, 0)
+
+
+def gaussian_kernel_matrix(x, y, sigma):
+    return np.exp(-squared_distances(x, y) / (2 * sigma**2))
+
+
+# [1, x, x^2, ..., x^degree] of a 1-D x
+def polynomial_features(x, degree):
+    return np.vander(np.asarray(x, dtype=float), degree + 1, increasing=True)
+
+
+# radial basis functions at `centres`
+def rbf_features(x, centres, sigma):
+    return gaussian_kernel_matrix(x, centres, sigma)
+
+
+# ridge coefficients of features(x) in row blocks: (Z'Z + lambda I)^-1 Z'y
+def _ridge(features, x, y, lambda_, block_rows=BLOCK_ROWS):
+    x, y = _columns(x), np.asarray(y, dtype=float)
+    gram = None
+    for first in range(0, len(x), block_rows):
+        z = features(x[first:first + block_rows])
+        if gram is None:
+            gram = np.zeros((z.shape[1], z.shape[1]))
+            moment = np.zeros((z.shape[1],) + y.shape[1:])
+        gram += z.T @ z
+        moment += z.T @ y[first:first + block_rows]
+    gram[np.diag_indices_from(gram)] += lambda_
+    return scipy.linalg.cho_solve(scipy.linalg.cho_factor(gram), moment)
+
+
+class KernelRidge:
+
+    def __init__(self, sigma, lambda_):
+        self.sigma = sigma
+        self.lambda_ = lambda_
+
+    def fit(self, x, y):
+        self.x = _columns(x)
+        K = gaussian_kernel_matrix(self.x, self.x, self.sigma)
+        K[np.diag_indices_from(K)] += self.lambda_
+        try:
+            self.alpha = scipy.linalg.cho_solve(scipy.linalg.cho_factor(K, overwrite_a=True), y)
+        except np.linalg.LinAlgError:
+            # a lambda too small for K + lambda I to be numerically positive definite
+            K = gaussian_kernel_matrix(self.x, self.x, self.sigma)
+            K[np.diag_indices_from(K)] += self.lambda_
+            self.alpha = scipy.linalg.solve(K, y, assume_a="sym")
+        return self
+
+    def predict(self, x, block_rows=BLOCK_ROWS):
+        x = _columns(x)
+        return np.concatenate([gaussian_kernel_matrix(x[first:first + block_rows], self.x, self.sigma) @ self.alpha
+                               for first in range(0, len(x), block_rows)])
+
+
+# kernel ridge on the Nystroem features K(x, L) W^-1/2 of m landmark
+# points L (sampled from the data), W = K(L, L)
+class NystroemRidge:
+
+    def __init__(self, sigma, lambda_, components=500, seed=None):
+        self.sigma = sigma
+        self.lambda_ = lambda_
+        self.components = components
+        self.seed = seed
+
+    def features(self, x):
+        return gaussian_kernel_matrix(x, self.landmarks, self.sigma) @ self.normalisation
+
+    def fit(self, x, y):
+        x = _columns(x)
+        rng = np.random.default_rng(self.seed)
+        self.landmarks = x[rng.choice(len(x), size=min(self.components, len(x)), replace=False)]
+        # W^-1/2 over the eigenvalues that are not round-off
+        eigenvalues, eigenvectors = np.linalg.eigh(gaussian_kernel_matrix(self.landmarks, self.landmarks, self.sigma))
+        kept = eigenvalues > eigenvalues.max() * 1e-10
+        self.normalisation = eigenvectors[:, kept] / np.sqrt(eigenvalues[kept])
+        self.theta = _ridge(self.features, x, y, self.lambda_)
+        return self
+
+    def predict(self, x, block_rows=BLOCK_ROWS):
+        x = _columns(x)
+        return np.concatenate([self.features(x[first:first + block_rows]) @ self.theta
+                               for first in range(0, len(x), block_rows)])
+
+
+# kernel ridge on D random Fourier features sqrt(2/D) cos(x w + b),
+# w ~ N(0, 1/sigma^2), b ~ U(0, 2 pi)
+class RandomFourierRidge:
+
+    def __init__(self, sigma, lambda_, features=1000, seed=None):
+        self.sigma = sigma
+        self.lambda_ = lambda_
+        self.num_features = features
+        self.seed = seed
+
+    def features(self, x):
+        return np.sqrt(2 / self.num_features) * np.cos(x @ self.weights + self.offsets)
+
+    def fit(self, x, y):
+        x = _columns(x)
+        rng = np.random.default_rng(self.seed)
+        self.weights = rng.normal(scale=1 / self.sigma, size=(x.shape[1], self.num_features))
+        self.offsets = rng.uniform(0, 2 * np.pi, size=self.num_features)
+        self.theta = _ridge(self.features, x, y, self.lambda_)
+        return self
+
+    def predict(self, x, block_rows=BLOCK_ROWS):
+        x = _columns(x)
+        return np.concatenate([self.features(x[first:first + block_rows]) @ self.theta
+                               for first in range(0, len(x), block_rows)])
+
+
+# the columns of phi scaled to a largest |entry| of 1 (all-zero columns
+# left as they are) and y to a largest |entry| of 1: raw polynomial
+# features span ten orders of magnitude (x^5 of a 100 degree day is 1e10),
+# which stalls the conic solvers. Returns the scaled phi and y and the
+# factors theta = theta_scaled * y_scale / column_scale maps back by
+def _scaled_lad(phi, y):
+    column_scale = np.abs(phi).max(axis=0)
+    column_scale[column_scale == 0] = 1
+    y_scale = np.abs(y).max() or 1.0
+    return phi / column_scale, y / y_scale, column_scale, y_scale
+
+
+def _unscaled(theta, column_scale, y_scale):
+    return theta * y_scale / column_scale.reshape((-1,) + (1,) * (theta.ndim - 1))
+
+
+# least absolute deviation coefficients, min sum |y - phi theta| +
+# l1_penalty * sum |theta|, for one target (n,) or a batch of targets
+# (n, B) fitted in one LP; returns (p,) or (p, B). The LP is solved on
+# scaled columns (_scaled_lad), with the penalty weighted so the optimum is
+# the same
+def fit_lad(phi, y, l1_penalty=0.0, solver=None):
+    phi, y, column_scale, y_scale = _scaled_lad(np.asarray(phi, dtype=float), np.asarray(y, dtype=float))
+    theta = cp.Variable((phi.shape[1],) + y.shape[1:])
+    objective = cp.sum(cp.abs(y - phi @ theta))
+    if l1_penalty:
+        objective += l1_penalty * cp.sum(cp.abs(cp.multiply(theta, _unscaled(np.ones(theta.shape), column_scale, 1.0))))
+    problem = cp.Problem(cp.Minimize(objective))
+    problem.solve(**({} if solver is None else {"solver": solver}))
+    if problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        raise RuntimeError(f"LAD fit not solved: {problem.status}")
+    return _unscaled(theta.value, column_scale, y_scale)
+
+
+# least absolute deviation coefficients of several feature maps of the same
+# target, e.g. {"linear": polynomial_features(x, 1), "rbf": rbf_features(...)},
+# in one LP on scaled columns; returns the coefficients by name
+def fit_lad_batch(feature_maps, y, l1_penalty=0.0, solver=None):
+    y = np.asarray(y, dtype=float)
+    scaled = {name: _scaled_lad(np.asarray(phi, dtype=float), y) for name, phi in feature_maps.items()}
+    thetas = {name: cp.Variable(phi.shape[1]) for name, (phi, _, _, _) in scaled.items()}
+    objective = sum(cp.sum(cp.abs(y_scaled - phi @ thetas[name])) for name, (phi, y_scaled, _, _) in scaled.items())
+    if l1_penalty:
+        objective += sum(l1_penalty * cp.sum(cp.abs(cp.multiply(thetas[name], 1 / column_scale)))
+                         for name, (_, _, column_scale, y_scale) in scaled.items())
+    problem = cp.Problem(cp.Minimize(objective))
+    problem.solve(**({} if solver is None else {"solver": solver}))
+    if problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        raise RuntimeError(f"LAD fit not solved: {problem.status}")
+    return {name: _unscaled(thetas[name].value, column_scale, y_scale)
+            for name, (_, _, column_scale, y_scale) in scaled.items()}
+
+
+# the daily maximum temperature and peak demand of question 1
+def load_daily(data_folder=DATA_FOLDER):
+    return (np.loadtxt(os.path.join(data_folder, "maxtemp.txt")),
+            np.loadtxt(os.path.join(data_folder, "maxdemand.txt")))
+
+
+# hourly temperature and demand of question 3: each demand hour with the
+# nearest weather reading within the hour, missing readings interpolated
+def load_hourly(data_folder=DATA_FOLDER):
+    weather = pd.DataFrame(np.loadtxt(os.path.join(data_folder, "weather.txt"))[:, :2],
+                           columns=["time_utc", "temperature"])
+    weather["temperature"] = weather["temperature"].replace(MISSING, np.nan).interpolate().bfill()
+    demand = pd.DataFrame(np.loadtxt(os.path.join(data_folder, "demand.txt")), columns=["time_utc", "demand"])
+    joined = pd.merge_asof(demand.sort_values("time_utc"), weather.sort_values("time_utc"), on="time_utc",
+                           direction="nearest", tolerance=3600.0).dropna()
+    return joined["temperature"].to_numpy(), joined["demand"].to_numpy()
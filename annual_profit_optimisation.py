@@ -1,5 +1,16 @@
+from dataclasses import asdict
+
+import numpy as np
 import pandas as pd 
-import cvxpy as cp
+
+from h2_plant import (CAPACITY_FACTOR_KPIS, CAPEX_KPIS, PER_KG_KPIS, SALES_KPIS, PlantParams, compute_kpis,
+                      hourly_columns, levelised_cost_model, profit_model, results_array, select_kpis)
+from merit_order_dispatch import merit_order_dispatch, set_warm_start
+from storage_formulation import check_formulation, solve_auto
+from representative_days import run_representative_day_sizing, select_representative_days
+from solver_config import solve_problem, solve_stats
+from sparse_lp import check_backend, run_sparse
+from stochastic_sizing import run_stochastic_profit_maximisation
 
 def run_levelised_cost_minimisation(
         SOLAR_CAPACITY,
@@ -18,137 +29,85 @@ def run_levelised_cost_minimisation(
         LIQUEFACTION_CAPEX_DOL_kgPD,
         GREEN_THRESHOLD_kg_per_kg,
         ERCTO_CO2_kg_per_kwh,
-        T
+        T,
+        formulation="milp",
+        fixed_capacities=None,
+        representative_days=None,
+        representative_day_method="kmedoids",
+        representative_extreme_days=0,
+        backend="cvxpy",
+        solver=None,
+        return_stats=False
         ):
-    
-    realtime_consumption = cp.Variable(T, nonneg = True)
-    realtime_supplied = cp.Variable(T, nonneg = True)
-    solar_consumed_facility = cp.Variable(T, nonneg = True) 
-
-    #   Design decision variables
-    electrolyser_nameplate_capacity_hour = cp.Variable(nonneg = True)
-    compressor_nameplate_capacity_hour = cp.Variable(nonneg = True)
-    liquefaction_nameplate_capacity_hour = cp.Variable(nonneg = True)
-
-    # set throughput
-    electrolyser_throughput = cp.Variable(T, nonneg = True)
-    compressor_throughput = cp.Variable(T, nonneg = True)
-    compressor_to_liquefaction = cp.Variable(T, nonneg = True)
-    liquefacion_throughput = cp.Variable(T, nonneg = True)
-
-    #   Operational decision variables
-    gh2_storage_inflow = cp.Variable(T,nonneg=True)
-    gh2_storage_outflow = cp.Variable(T,nonneg=True)
-    gh2_storage_level = cp.Variable(T+1, nonneg = True)
-    lh2_storage_level = cp.Variable(T+1, nonneg = True)
-    gh2_storage_active = cp.Variable(T, boolean=True)
-
-    # Define power balance constraints t
-    constraints = [
-        # restrict the amount of solar that can be consumed
-        solar_consumed_facility <= SOLAR_CAPACITY * hourly_solar_production_kwh,
-        # power balance equation: sum of electricity in = amount consumed           
-        realtime_consumption + solar_consumed_facility == 
-            ELECTROLYSIS_EFFICIENCY*electrolyser_throughput + 
-            COMPRESSION_EFFICIENCY*compressor_throughput + 
-            LIQUEFACTION_EFFICIENCY*liquefacion_throughput, 
-    ]
-
-    # add 'green' constraint; restrict amount that can be taken from grid
-    constraints += [ 
-        sum(realtime_consumption) * ERCTO_CO2_kg_per_kwh <= GREEN_THRESHOLD_kg_per_kg * (OFFTAKE_TPD * NUM_DAYS)
-    ]
-
-    # operational constraints of equipment
-    constraints += [
-        # constraint operational bounds of each piece of equipment: 
-        0 <= electrolyser_throughput, 
-        electrolyser_throughput <= electrolyser_nameplate_capacity_hour,
-        0 <= compressor_throughput, 
-        compressor_throughput <= compressor_nameplate_capacity_hour,
-        0 <= liquefacion_throughput, 
-        liquefacion_throughput <= liquefaction_nameplate_capacity_hour
-        ]
-
-    # ramp constraints throughput constraints 
-    constraints += [ 
-        liquefacion_throughput[1:T] - liquefacion_throughput[0:T-1] <= LIQUEFACTION_MAX_UP*liquefaction_nameplate_capacity_hour,
-        liquefacion_throughput[0:T-1] - liquefacion_throughput[1:T] <= LIQUEFACTION_MAX_DOWN*liquefaction_nameplate_capacity_hour,
-    ]
-
-    # set initial storage levels to empty
-    constraints += [ 
-        gh2_storage_level[0] == 0,
-    ]
-
-    # balance mass through system
-    constraints += [
-        electrolyser_throughput == compressor_throughput,
-        compressor_throughput == compressor_to_liquefaction + gh2_storage_inflow,
-        liquefacion_throughput == compressor_to_liquefaction + gh2_storage_outflow,
-        gh2_storage_level[1:T+1] == gh2_storage_level[0:T] + gh2_storage_inflow  - gh2_storage_outflow,
-        # big-M constraint to only turn on storage if used 
-        # TODO: remove if computational issues arise 
-        compressor_throughput - liquefacion_throughput <= 1000 * gh2_storage_active,
-        gh2_storage_inflow <= 1000*gh2_storage_active,
-        gh2_storage_outflow <= 1000*gh2_storage_active
-    ]
-
-    # set 1 tph offtake 
-    # constraints += [ 
-    #     sum(liquefacion_throughput) == cp.Parameter(value=OFFTAKE_TPD*NUM_DAYS)
-    # ]
+    check_formulation(formulation)
+    check_backend(backend)
+    # the representative-day model is built in cvxpy only
+    if representative_days is not None and backend != "cvxpy":
+        raise ValueError("representative_days does not support backend")
+    if formulation == "auto":
+        return solve_auto(lambda f: run_levelised_cost_minimisation(
+            SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, hourly_solar_production_kwh, hourly_dayahead_dol_per_kwh,
+            ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, OFFTAKE_TPD, NUM_DAYS,
+            ELECTROLYSIS_CAPEX_DOL_kgPD, COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD,
+            GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh, T, formulation=f,
+            fixed_capacities=fixed_capacities, representative_days=representative_days,
+            representative_day_method=representative_day_method,
+            representative_extreme_days=representative_extreme_days, backend=backend,
+            solver=solver, return_stats=return_stats))
+
+    # size on k representative days instead of the full horizon
+    if representative_days is not None:
+        days = select_representative_days(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh,
+                                          representative_days, method=representative_day_method,
+                                          extreme_days=representative_extreme_days)
+        return run_representative_day_sizing(
+            "levelised", days, SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH,
+            ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, OFFTAKE_TPD, NUM_DAYS,
+            ELECTROLYSIS_CAPEX_DOL_kgPD, COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD,
+            GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh, formulation=formulation,
+            fixed_capacities=fixed_capacities, solver=solver, return_stats=return_stats)
+
+    plant = PlantParams(
+        SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+        LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh,
+        OFFTAKE_TPD=OFFTAKE_TPD, NUM_DAYS=NUM_DAYS, ELECTROLYSIS_CAPEX_DOL_kgPD=ELECTROLYSIS_CAPEX_DOL_kgPD,
+        COMPRESSOR_CAPEX_DOL_kgPD=COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD=LIQUEFACTION_CAPEX_DOL_kgPD)
+
+    # assemble the constraint matrices directly, without cvxpy
+    if backend == "sparse":
+        params = {**asdict(plant), "hourly_solar_production_kwh": hourly_solar_production_kwh,
+                  "hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh}
+        result = run_sparse(params, T, "levelised", formulation, fixed_capacities, solver=solver)
+        return (*result, result[0].solve_stats()) if return_stats else result
 
     # Minimize total cost of supply; min(OPEX + CAPEX)
     # OPEX = electricity, CAPEX = annualised capex
-    objective = 0
-
-    # add electricity cost from dayahead market consumption
-    objective += realtime_consumption @ hourly_dayahead_dol_per_kwh  
-
-    # add electricity cost from solar ppa consumption
-    objective += cp.sum(SOLAR_PPA_DOL_KWH * solar_consumed_facility)
-
-    # add capex costs for electrolyser, compressor and liquefaction
-    # multiply 24 to get nameplate capacity in kg per day
-    objective += (electrolyser_nameplate_capacity_hour * 24) * ELECTROLYSIS_CAPEX_DOL_kgPD
-    objective += (compressor_nameplate_capacity_hour * 24) * COMPRESSOR_CAPEX_DOL_kgPD
-    objective += (liquefaction_nameplate_capacity_hour * 24) * LIQUEFACTION_CAPEX_DOL_kgPD
-
-
-    # Define problem
-    objective_min = cp.Minimize(objective)
-    problem = cp.Problem(objective_min, constraints)
+    problem, v = levelised_cost_model(plant, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, T,
+                                      formulation, fixed_capacities)
 
     # Solve problem
-    problem.solve()
+    wall_time = solve_problem(problem, formulation, T, solver)
 
     operations_df = pd.DataFrame({
         "hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh,
-        "realtime_production_kwh":realtime_consumption.value,
-        "solar_production_kwh": solar_consumed_facility.value, 
-        "electrolyser_consumption_kwh": ELECTROLYSIS_EFFICIENCY*electrolyser_throughput.value, 
-        "compressor_consumption_kwh": COMPRESSION_EFFICIENCY*compressor_throughput.value, 
-        "liquefaction_consumption_kwh": LIQUEFACTION_EFFICIENCY*liquefacion_throughput.value,
-        "electrolyser_produced_kg": electrolyser_throughput.value, 
-        "compressor_produced_kg": compressor_throughput.value, 
-        "liquefaction_produced_kg": liquefacion_throughput.value,
-        "compress_to_liquefaction": compressor_to_liquefaction.value,
-        "gh2_storage_level_kg": gh2_storage_level.value[0:T],
-        # TODO: if problem size allows, add in big-M constraint 
-        "gh2_storage_net_inflow": gh2_storage_inflow.value[0:T] - gh2_storage_outflow.value[0:T],
-        "gh2_storge_inflow_kg": gh2_storage_inflow.value[0:T], 
-        "gh2_storage_outflow_kg": gh2_storage_outflow.value[0:T],
-        # "gh2_storage_netflow": gh2_storage_netflow.value
+        "realtime_production_kwh": v.realtime_consumption.value,
+        "solar_production_kwh": v.solar_consumed_facility.value,
+        **hourly_columns(v, plant),
     })
 
+    capacities = v.capacity_values()
+    kpis = compute_kpis(results_array(operations_df), capacities, plant)
     facility = {
-        "electrolyser_capacity_ph":electrolyser_nameplate_capacity_hour.value,
-        "compressor_capacity_ph": compressor_nameplate_capacity_hour.value, 
-        "liquefaction_capacity_ph": liquefaction_nameplate_capacity_hour.value, 
-
+        **capacities,
+        **select_kpis(kpis, CAPEX_KPIS[0:3] + CAPACITY_FACTOR_KPIS[0:3] + PER_KG_KPIS),
+        "formulation": formulation,
+        "lp_milp_gap": None,
     }
 
+    if return_stats:
+        return problem, operations_df, facility, solve_stats(problem, wall_time)
     return problem, operations_df, facility
 
 
@@ -172,166 +131,122 @@ def run_profit_maximisation(
         H2_SALES_PRICE_DOL_per_kg,
         GREEN_THRESHOLD_kg_per_kg,
         ERCTO_CO2_kg_per_kwh,
-        T
+        T,
+        formulation="milp",
+        fixed_capacities=None,
+        representative_days=None,
+        representative_day_method="kmedoids",
+        representative_extreme_days=0,
+        backend="cvxpy",
+        solver=None,
+        return_stats=False,
+        scenario_probabilities=None,
+        cvar_weight=0.0,
+        cvar_alpha=0.1,
+        workers=None,
+        warm_start=None,
+        dt_hours=1.0
         ):
-    realtime_consumption = cp.Variable(T, nonneg = True)
-    realtime_supplied = cp.Variable(T, nonneg = True)
-    solar_consumed_facility = cp.Variable(T, nonneg = True) 
-
-    #   Design decision variables
-    electrolyser_nameplate_capacity_hour = cp.Variable(nonneg = True)
-    compressor_nameplate_capacity_hour = cp.Variable(nonneg = True)
-    liquefaction_nameplate_capacity_hour = cp.Variable(nonneg = True)
-    fuelcell_nameplate_capacity_hour = cp.Variable(nonneg= True)
-
-    # set throughput
-    electrolyser_throughput = cp.Variable(T, nonneg = True)
-    compressor_throughput = cp.Variable(T, nonneg = True)
-    compressor_to_liquefaction = cp.Variable(T, nonneg = True)
-    liquefacion_throughput = cp.Variable(T, nonneg = True)
-    fuel_cell_throughput = cp.Variable(T, nonneg = True)
-
-    #   Operational decision variables
-    gh2_storage_inflow = cp.Variable(T,nonneg=True)
-    gh2_storage_outflow = cp.Variable(T,nonneg=True)
-    gh2_storage_level = cp.Variable(T+1, nonneg = True)
-    lh2_storage_level = cp.Variable(T+1, nonneg = True)
-    gh2_storage_active = cp.Variable(T, boolean=True)
-
-    # Define power balance constraints t
-    constraints = [
-        # restrict the amount of solar that can be consumed
-        solar_consumed_facility <= SOLAR_CAPACITY * hourly_solar_production_kwh,
-        # power balance equation: sum of electricity in = amount consumed           
-        realtime_consumption + solar_consumed_facility == 
-            ELECTROLYSIS_EFFICIENCY*electrolyser_throughput + 
-            COMPRESSION_EFFICIENCY*compressor_throughput + 
-            LIQUEFACTION_EFFICIENCY*liquefacion_throughput, 
-    ]
-
-    # add 'green' constraint; restrict amount that can be taken from grid
-    constraints += [ 
-        sum(realtime_consumption) * ERCTO_CO2_kg_per_kwh <= GREEN_THRESHOLD_kg_per_kg * sum(liquefacion_throughput + fuel_cell_throughput)# (OFFTAKE_TPD * NUM_DAYS)
-    ]
-
-    # operational constraints of equipment
-    constraints += [
-        # constraint operational bounds of each piece of equipment: 
-        0 <= electrolyser_throughput, 
-        electrolyser_throughput <= electrolyser_nameplate_capacity_hour,
-        0 <= compressor_throughput, 
-        compressor_throughput <= compressor_nameplate_capacity_hour,
-        0 <= liquefacion_throughput, 
-        liquefacion_throughput <= liquefaction_nameplate_capacity_hour,
-        0 <= fuel_cell_throughput, 
-        fuel_cell_throughput <= fuelcell_nameplate_capacity_hour,
-        # 0.81 <= fuelcell_nameplate_capacity_hour
-        ]
-
-    # ramp constraints throughput constraints 
-    constraints += [ 
-        liquefacion_throughput[1:T] - liquefacion_throughput[0:T-1] <= LIQUEFACTION_MAX_UP*liquefaction_nameplate_capacity_hour,
-        liquefacion_throughput[0:T-1] - liquefacion_throughput[1:T] <= LIQUEFACTION_MAX_DOWN*liquefaction_nameplate_capacity_hour,
-    ]
-
-    # add fuel cell offtake 
-    constraints += [ 
-        fuel_cell_throughput*FUEL_CELL_EFFICIENCY == realtime_supplied, 
-
-    ]
-
-    # set initial storage levels to empty
-    constraints += [ 
-        gh2_storage_level[0] == 0,
-    ]
-
-    # balance mass through system
-    constraints += [
-        electrolyser_throughput == compressor_throughput,
-        compressor_throughput == compressor_to_liquefaction + gh2_storage_inflow,
-        liquefacion_throughput == compressor_to_liquefaction + gh2_storage_outflow,
-        gh2_storage_level[1:T+1] == gh2_storage_level[0:T] + gh2_storage_inflow  - gh2_storage_outflow - fuel_cell_throughput,
-        # big-M constraint to only turn on storage if used 
-        # TODO: remove if computational issues arise 
-        compressor_throughput - liquefacion_throughput <= 1000 * gh2_storage_active,
-        gh2_storage_inflow <= 1000*gh2_storage_active,
-        gh2_storage_outflow <= 1000*gh2_storage_active
-    ]
-
-    # set 1 tph offtake 
-    # constraints += [ 
-    #     sum(liquefacion_throughput) == cp.Parameter(value=OFFTAKE_TPD*NUM_DAYS)
-    # ]
-
-    # Minimize total cost of supply; min(OPEX + CAPEX)
-    # OPEX = electricity, CAPEX = annualised capex
-    objective = 0
-
-    # add electricity cost from dayahead market consumption
-    objective -= realtime_consumption @ hourly_dayahead_dol_per_kwh  
-
-    # add electricity cost from solar ppa consumption
-    objective -= cp.sum(SOLAR_PPA_DOL_KWH * solar_consumed_facility)
-
-    objective += realtime_supplied @ hourly_dayahead_dol_per_kwh  
-    # H2 SALES REVENUE 
-    objective +=   sum(liquefacion_throughput) * H2_SALES_PRICE_DOL_per_kg
-
-    # add capex costs for electrolyser, compressor and liquefaction
-    # multiply 24 to get nameplate capacity in kg per day
-    objective -= (electrolyser_nameplate_capacity_hour * 24) * ELECTROLYSIS_CAPEX_DOL_kgPD
-    objective -= (compressor_nameplate_capacity_hour * 24) * COMPRESSOR_CAPEX_DOL_kgPD
-    objective -= (liquefaction_nameplate_capacity_hour * 24) * LIQUEFACTION_CAPEX_DOL_kgPD
-    objective -= (fuelcell_nameplate_capacity_hour * 24) * FUELCELL_CAPEX_DOL_kgPD
-
-
-    # Define problem
-    objective_min = cp.Maximize(objective)
-    problem = cp.Problem(objective_min, constraints)
+    check_formulation(formulation)
+    check_backend(backend)
+    # the decompositions and representative days are hourly
+    if dt_hours != 1 and (np.ndim(hourly_dayahead_dol_per_kwh) == 2 or representative_days is not None):
+        raise ValueError("dt_hours other than 1 needs a single price series and no representative_days")
+    # the representative-day model is built in cvxpy only
+    if representative_days is not None and backend != "cvxpy":
+        raise ValueError("representative_days does not support backend")
+    # the merit-order start is set on the full-resolution cvxpy model only
+    if warm_start is not None and (np.ndim(hourly_dayahead_dol_per_kwh) == 2 or representative_days is not None
+                                   or backend != "cvxpy"):
+        raise ValueError("warm_start needs a single price series, no representative_days and backend='cvxpy'")
+
+    # (S, T) price scenarios: one design against all of them, sized by the
+    # L-shaped decomposition (LP formulation)
+    if np.ndim(hourly_dayahead_dol_per_kwh) == 2:
+        if representative_days is not None or fixed_capacities is not None or backend != "cvxpy":
+            raise ValueError("price scenarios do not support representative_days, fixed_capacities or backend")
+        return run_stochastic_profit_maximisation(
+            hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, PlantParams.from_mapping(locals()),
+            probabilities=scenario_probabilities, cvar_weight=cvar_weight, cvar_alpha=cvar_alpha,
+            workers=workers, return_stats=return_stats)
+
+    if formulation == "auto":
+        return solve_auto(lambda f: run_profit_maximisation(
+            SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, hourly_solar_production_kwh, hourly_dayahead_dol_per_kwh,
+            ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY, FUEL_CELL_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, OFFTAKE_TPD, NUM_DAYS,
+            ELECTROLYSIS_CAPEX_DOL_kgPD, COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD,
+            FUELCELL_CAPEX_DOL_kgPD, H2_SALES_PRICE_DOL_per_kg, GREEN_THRESHOLD_kg_per_kg,
+            ERCTO_CO2_kg_per_kwh, T, formulation=f,
+            fixed_capacities=fixed_capacities, representative_days=representative_days,
+            representative_day_method=representative_day_method,
+            representative_extreme_days=representative_extreme_days, backend=backend,
+            solver=solver, return_stats=return_stats, warm_start=warm_start, dt_hours=dt_hours))
+
+    # size on k representative days instead of the full horizon
+    if representative_days is not None:
+        days = select_representative_days(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh,
+                                          representative_days, method=representative_day_method,
+                                          extreme_days=representative_extreme_days)
+        return run_representative_day_sizing(
+            "profit", days, SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH,
+            ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, OFFTAKE_TPD, NUM_DAYS,
+            ELECTROLYSIS_CAPEX_DOL_kgPD, COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD,
+            GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh,
+            FUEL_CELL_EFFICIENCY=FUEL_CELL_EFFICIENCY, FUELCELL_CAPEX_DOL_kgPD=FUELCELL_CAPEX_DOL_kgPD,
+            H2_SALES_PRICE_DOL_per_kg=H2_SALES_PRICE_DOL_per_kg, formulation=formulation,
+            fixed_capacities=fixed_capacities, solver=solver, return_stats=return_stats)
+
+    plant = PlantParams(
+        SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+        LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh,
+        FUEL_CELL_EFFICIENCY=FUEL_CELL_EFFICIENCY, H2_SALES_PRICE_DOL_per_kg=H2_SALES_PRICE_DOL_per_kg,
+        OFFTAKE_TPD=OFFTAKE_TPD, NUM_DAYS=NUM_DAYS, ELECTROLYSIS_CAPEX_DOL_kgPD=ELECTROLYSIS_CAPEX_DOL_kgPD,
+        COMPRESSOR_CAPEX_DOL_kgPD=COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD=LIQUEFACTION_CAPEX_DOL_kgPD,
+        FUELCELL_CAPEX_DOL_kgPD=FUELCELL_CAPEX_DOL_kgPD, dt_hours=dt_hours)
+
+    # assemble the constraint matrices directly, without cvxpy
+    if backend == "sparse":
+        params = {**asdict(plant), "hourly_solar_production_kwh": hourly_solar_production_kwh,
+                  "hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh}
+        result = run_sparse(params, T, "profit", formulation, fixed_capacities, solver=solver)
+        return (*result, result[0].solve_stats()) if return_stats else result
+
+    # Maximise profit from h2 sales and fuel cell electricity less OPEX and CAPEX
+    problem, v = profit_model(plant, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, T,
+                              formulation, fixed_capacities)
+
+    # start from the merit-order dispatch of the warm_start capacities (a
+    # facility summary), for solvers that take a MIP start
+    solve_kwargs = {}
+    if warm_start is not None:
+        capacities = fixed_capacities or warm_start
+        heuristic = merit_order_dispatch(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, capacities, plant)
+        set_warm_start(v, heuristic, capacities)
+        solve_kwargs["warm_start"] = True
 
     # Solve problem
-    problem.solve()
-
-    facility_summary = {
-        "electrolyser_capacity_ph":electrolyser_nameplate_capacity_hour.value,
-        "compressor_capacity_ph": compressor_nameplate_capacity_hour.value, 
-        "liquefaction_capacity_ph": liquefaction_nameplate_capacity_hour.value, 
-        "fuelcell_capacity_ph":fuelcell_nameplate_capacity_hour.value,
-        "h2_sold": sum(liquefacion_throughput.value), 
-        "h2_revenue":  sum(liquefacion_throughput.value) * H2_SALES_PRICE_DOL_per_kg, 
-        "solar_consumed": sum(solar_consumed_facility.value), 
-        "solar_cost": sum(solar_consumed_facility.value) * SOLAR_PPA_DOL_KWH, 
-        "wholesale_consumed": sum(realtime_consumption.value),
-        "wholesale_cost": realtime_consumption.value @ hourly_dayahead_dol_per_kwh, 
-        "wholesale_supplied": sum(realtime_supplied.value), 
-        "wholesale_revenue": realtime_supplied.value @ hourly_dayahead_dol_per_kwh, 
-        "total_profit": problem.value, 
-        "electrolyser_capex_annualised":(electrolyser_nameplate_capacity_hour.value * 24) * ELECTROLYSIS_CAPEX_DOL_kgPD,
-        "compression_capex_annualised":(compressor_nameplate_capacity_hour.value * 24) * COMPRESSOR_CAPEX_DOL_kgPD,
-        "liquefaction_capex_annualised":(liquefaction_nameplate_capacity_hour.value * 24) * LIQUEFACTION_CAPEX_DOL_kgPD,
-        "fuelcell_capex_annualised":(fuelcell_nameplate_capacity_hour.value * 24) * FUELCELL_CAPEX_DOL_kgPD
-
-    }
+    wall_time = solve_problem(problem, formulation, T, solver, **solve_kwargs)
 
     operations_df = pd.DataFrame({"hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh,
-            "realtime_production_kwh":realtime_consumption.value,
-            "realtime_supplied_kwh": realtime_supplied.value,
-            "solar_production_kwh": solar_consumed_facility.value, 
-            "electrolyser_consumption_kwh": ELECTROLYSIS_EFFICIENCY*electrolyser_throughput.value, 
-            "compressor_consumption_kwh": COMPRESSION_EFFICIENCY*compressor_throughput.value, 
-            "liquefaction_consumption_kwh": LIQUEFACTION_EFFICIENCY*liquefacion_throughput.value,
-            "electrolyser_produced_kg": electrolyser_throughput.value, 
-            "compressor_produced_kg": compressor_throughput.value, 
-            "liquefaction_produced_kg": liquefacion_throughput.value,
-            "compress_to_liquefaction": compressor_to_liquefaction.value,
-            "fuel_cell_consumed_kg": fuel_cell_throughput.value,
-            "gh2_storage_level_kg": gh2_storage_level.value[0:T],
-            # TODO: if problem size allows, add in big-M constraint 
-            "gh2_storage_net_inflow": gh2_storage_inflow.value - gh2_storage_outflow.value,
-            "gh2_storge_inflow_kg": gh2_storage_inflow.value, 
-            "gh2_storage_outflow_kg": gh2_storage_outflow.value
+            "realtime_production_kwh": v.realtime_consumption.value,
+            "realtime_supplied_kwh": v.realtime_supplied.value,
+            "solar_production_kwh": v.solar_consumed_facility.value,
+            **hourly_columns(v, plant),
         })
 
-    return problem, operations_df, facility_summary
-
+    capacities = v.capacity_values()
+    kpis = compute_kpis(results_array(operations_df), capacities, plant)
+    facility_summary = {
+        **capacities,
+        **select_kpis(kpis, SALES_KPIS),
+        "total_profit": problem.value,
+        **select_kpis(kpis, CAPEX_KPIS + CAPACITY_FACTOR_KPIS + PER_KG_KPIS),
+        "formulation": formulation,
+        "lp_milp_gap": None,
+    }
 
+    if return_stats:
+        return problem, operations_df, facility_summary, solve_stats(problem, wall_time)
+    return problem, operations_df, facility_summary
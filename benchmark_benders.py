@@ -0,0 +1,42 @@
+import argparse
+import inspect
+import time
+
+from annual_profit_optimisation import run_profit_maximisation
+from benchmark_representative_days import profit_args
+from benders_decomposition import run_benders_profit_maximisation
+from h2_plant import CAPACITY_KEYS
+
+# Benders decomposition vs. the monolithic LP of run_profit_maximisation on
+# LZ_HOUSTON dayahead prices: profit, capacities and wall time.
+#
+#   python benchmark_benders.py --hours 8760 --block-hours 730 --workers 12
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=int, default=8760)
+    parser.add_argument("--block-hours", type=int, default=730)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--skip-monolithic", action="store_true")
+    args = parser.parse_args()
+
+    profit = profit_args(args.hours)
+    named = dict(zip(inspect.signature(run_profit_maximisation).parameters, profit))
+    prices = named.pop("hourly_dayahead_dol_per_kwh")
+    solar = named.pop("hourly_solar_production_kwh")
+
+    if not args.skip_monolithic:
+        start = time.perf_counter()
+        problem, _, facility = run_profit_maximisation(*profit, formulation="lp")
+        print(f"monolithic: profit {problem.value:.2f} in {time.perf_counter() - start:.1f}s",
+              [round(facility[key], 3) for key in CAPACITY_KEYS])
+
+    start = time.perf_counter()
+    _, facility, history = run_benders_profit_maximisation(
+        prices, solar, named, block_hours=args.block_hours, tolerance=args.tolerance, workers=args.workers)
+    print(f"benders:    profit {facility['total_profit']:.2f} in {time.perf_counter() - start:.1f}s",
+          [round(facility[key], 3) for key in CAPACITY_KEYS])
+    print(f"{facility['blocks']} blocks, {facility['iterations']} iterations, gap {facility['benders_gap']:.1e}, "
+          f"master {history['master_time_s'].sum():.1f}s, subproblems {history['subproblem_time_s'].sum():.1f}s")
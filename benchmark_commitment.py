@@ -0,0 +1,88 @@
+import argparse
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from benchmark_rolling_horizon import CAPACITIES, ERCOT_LOAD_ZONE, INITIAL_STATE, PLANT
+from market_data import load_hourly
+from rolling_horizon_optimisation import run_rolling_horizon_opt
+from solver_config import SolverConfig
+
+# Branch-and-bound nodes and solve time of the liquefaction on/off model:
+# the 1000-coefficient big-M rows of the Code_LeeKopijMyrick variant
+# ("legacy") vs. the tight on/startup/shutdown formulation ("tight"), on
+# rolling windows spread over a year of LZ_HOUSTON dayahead prices. Both
+# modes describe the same operating rules, so their objectives should agree
+# up to the MIP gap.
+#
+#   python benchmark_commitment.py --horizon 48 --windows 12 --time-limit 60
+
+
+def solve_window(prices, solar, start, horizon, commitment, formulation, solver):
+    # run_rolling_horizon_opt prints the previous liquefaction every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        problem, operations_df, _, _, stats = run_rolling_horizon_opt(
+            PLANT['SOLAR_CAPACITY'],
+            PLANT['SOLAR_PPA_DOL_KWH'],
+            solar[start:start+horizon],
+            prices[start:start+horizon],
+            PLANT['ELECTROLYSIS_EFFICIENCY'],
+            PLANT['COMPRESSION_EFFICIENCY'],
+            PLANT['LIQUEFACTION_EFFICIENCY'],
+            PLANT['FUEL_CELL_EFFICIENCY'],
+            PLANT['LIQUEFACTION_MAX_UP'],
+            PLANT['LIQUEFACTION_MAX_DOWN'],
+            CAPACITIES['electrolyser_capacity_ph'],
+            CAPACITIES['compressor_capacity_ph'],
+            CAPACITIES['liquefaction_capacity_ph'],
+            CAPACITIES['fuelcell_capacity_ph'],
+            PLANT['H2_SALES_PRICE_DOL_per_kg'],
+            PLANT['GREEN_THRESHOLD_kg_per_kg'],
+            PLANT['ERCTO_CO2_kg_per_kwh'],
+            horizon,
+            INITIAL_STATE,
+            formulation=formulation,
+            solver=solver,
+            return_stats=True,
+            commitment=commitment)
+    return {
+        "start_hour": start,
+        "commitment": commitment,
+        "status": stats.status,
+        "objective": stats.objective,
+        "mip_gap": stats.mip_gap,
+        "node_count": stats.node_count,
+        "solve_time_s": stats.solve_time,
+        "wall_time_s": stats.wall_time,
+        "integer_variables": stats.num_integer_variables,
+        "constraints": stats.num_constraints,
+        "starts": int(np.round(operations_df["liquefaction_startup"].iloc[1:].sum())),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--horizon", type=int, default=48)
+    parser.add_argument("--windows", type=int, default=12)
+    parser.add_argument("--formulation", default="lp", choices=["lp", "milp"])
+    parser.add_argument("--time-limit", type=float, default=60)
+    # HiGHS' presolve tightens big-M rows by itself; without it the node
+    # counts show the strength of the formulations as written
+    parser.add_argument("--no-presolve", action="store_true")
+    parser.add_argument("--commitments", nargs="+", default=["legacy", "tight"], choices=["legacy", "tight"])
+    args = parser.parse_args()
+
+    prices, solar = load_hourly(ERCOT_LOAD_ZONE, 2019)
+    starts = np.linspace(0, len(prices) - args.horizon, args.windows).astype(int)
+    solver = SolverConfig(time_limit=args.time_limit, options={"presolve": "off"} if args.no_presolve else {})
+
+    rows = [solve_window(prices, solar, start, args.horizon, commitment, args.formulation, solver)
+            for start in starts for commitment in args.commitments]
+    report = pd.DataFrame(rows)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report)
+        print(report.groupby("commitment")[["node_count", "solve_time_s", "wall_time_s", "objective"]]
+              .agg(["mean", "max"]))
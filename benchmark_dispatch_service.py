@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmark_rolling_horizon import CAPACITIES, ERCOT_LOAD_ZONE, INITIAL_STATE, PLANT
+from dispatch_service import DEFAULT_PORT
+from market_data import load_hourly
+
+# Load test of dispatch_service.py: --plants concurrent clients, each on its
+# own keep-alive connection, step their plant hour by hour through the
+# LZ_HOUSTON dayahead prices (plant i starting i days in), carrying the
+# returned state into the next request. Each plant is its own configuration
+# (SOLAR_CAPACITY offset by i) unless --shared-config, so the plants are
+# spread over the workers. The first step of every plant compiles its model
+# and is reported separately; the latency percentiles are over the rest.
+#
+#   python benchmark_dispatch_service.py --plants 8 --steps 200 --workers 4
+#   python benchmark_dispatch_service.py --host 127.0.0.1 --port 8750 --no-server
+
+
+async def _post(reader, writer, path, payload):
+    body = json.dumps(payload).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    response = json.loads(await reader.readexactly(int(headers["content-length"])))
+    if status != 200:
+        raise RuntimeError(f"{status}: {response.get('error')}")
+    return response
+
+
+async def _wait_for_service(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+            continue
+        writer.close()
+        return
+
+
+async def run_plant(i, host, port, prices, solar, steps, horizon, shared_config, latencies, solve_times,
+                    compile_latencies):
+    plant = dict(PLANT) if shared_config else {**PLANT, "SOLAR_CAPACITY": PLANT["SOLAR_CAPACITY"] + i}
+    state = dict(INITIAL_STATE)
+    offset = 24 * i
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for t in range(offset, offset + steps + 1):
+            request = {"plant": plant, "capacities": CAPACITIES, "plant_id": f"plant-{i}", "state": state,
+                       "prices": prices[t:t+horizon].tolist(), "solar": solar[t:t+horizon].tolist()}
+            start = time.perf_counter()
+            response = await _post(reader, writer, "/step", request)
+            latency = time.perf_counter() - start
+            if response["compiled"]:
+                compile_latencies.append(latency)
+            else:
+                latencies.append(latency)
+                solve_times.append(response["solve_time_s"])
+            state = response["state"]
+    finally:
+        writer.close()
+
+
+def _percentiles(values):
+    values = 1000 * np.asarray(values)
+    return (f"p50 {np.percentile(values, 50):8.1f} ms  p99 {np.percentile(values, 99):8.1f} ms  "
+            f"mean {values.mean():8.1f} ms  max {values.max():8.1f} ms")
+
+
+async def main(args):
+    prices, solar = load_hourly(ERCOT_LOAD_ZONE, 2019)
+    if 24 * (args.plants - 1) + args.steps + 1 + args.horizon > len(prices):
+        raise ValueError("--plants / --steps / --horizon run past the end of the year")
+
+    server = None
+    if not args.no_server:
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "dispatch_service.py"), "--host", args.host,
+                                   "--port", str(args.port), "--workers", str(args.workers)])
+    try:
+        await _wait_for_service(args.host, args.port)
+        latencies, solve_times, compile_latencies = [], [], []
+        start = time.perf_counter()
+        await asyncio.gather(*(run_plant(i, args.host, args.port, prices, solar, args.steps, args.horizon,
+                                         args.shared_config, latencies, solve_times, compile_latencies)
+                               for i in range(args.plants)))
+        wall_time = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.plants} plants x {args.steps} steps, horizon {args.horizon}, {args.workers} workers, "
+          f"{'shared' if args.shared_config else 'one'} configuration{'' if args.shared_config else ' each'}")
+    print(f"{'first step (compile)':>22}: {_percentiles(compile_latencies)}")
+    print(f"{'step latency':>22}: {_percentiles(latencies)}")
+    print(f"{'solve time (server)':>22}: {_percentiles(solve_times)}")
+    print(f"{'throughput':>22}: {(len(latencies) + len(compile_latencies)) / wall_time:.1f} requests/s "
+          f"({wall_time:.1f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--horizon", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--shared-config", action="store_true")
+    # load-test a service that is already running
+    parser.add_argument("--no-server", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,48 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmark_rolling_horizon import CAPACITIES, ERCOT_LOAD_ZONE, PLANT
+from Homework6.kernel_regression import NystroemRidge, RandomFourierRidge
+from market_data import load_hourly, load_system_load
+from price_forecast import KernelForecaster, RidgeForecaster, SeasonalNaive, backtest
+
+# Forecast error and profit impact of dispatching the rolling horizon on
+# price forecasts instead of the realised LZ_HOUSTON dayahead prices: every
+# forecaster is fitted on the first --train-days and backtested on the rest
+# of the year against perfect foresight.
+#
+#   python benchmark_price_forecast.py --hours 2160 --train-days 30 --horizon 24
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", type=int, default=2019)
+    parser.add_argument("--hours", type=int, default=None)
+    parser.add_argument("--train-days", type=int, default=90)
+    parser.add_argument("--horizon", type=int, default=24)
+    parser.add_argument("--commit", type=int, default=1)
+    parser.add_argument("--components", type=int, default=500)
+    args = parser.parse_args()
+
+    prices, solar = load_hourly(ERCOT_LOAD_ZONE, args.year, hours=args.hours)
+    load = load_system_load(args.year, hours=len(prices))
+    h = args.horizon
+    forecasters = {
+        "seasonal_naive_day": SeasonalNaive(24),
+        "seasonal_naive_week": SeasonalNaive(168),
+        "ridge": RidgeForecaster(horizon=h),
+        "nystroem": KernelForecaster(NystroemRidge(sigma=3, lambda_=1e-2, components=args.components, seed=0),
+                                     horizon=h),
+        "random_fourier": KernelForecaster(RandomFourierRidge(sigma=3, lambda_=1e-2, features=args.components,
+                                                              seed=0), horizon=h),
+    }
+
+    start = time.perf_counter()
+    report = backtest(forecasters, prices, solar, CAPACITIES, PLANT, horizon=h, train_hours=24 * args.train_days,
+                      load=load, commit=args.commit, on_failure="relax")
+    print(f"{len(prices) - 24 * args.train_days} backtest hours, {len(report)} runs in "
+          f"{time.perf_counter() - start:.1f} s")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report)
@@ -0,0 +1,62 @@
+import argparse
+
+import pandas as pd
+
+from annual_profit_optimisation import run_profit_maximisation
+from market_data import load_hourly
+from representative_days import representative_day_report
+
+# Accuracy / runtime of representative-day sizing against the full-year
+# run_profit_maximisation on LZ_HOUSTON dayahead prices: for every k the
+# capacities sized on k days are re-dispatched over the full year and the
+# validated profit compared with the full-resolution optimum.
+#
+#   python benchmark_representative_days.py --k 4 8 12 24 --method kmedoids --extreme-days 2
+
+ERCOT_LOAD_ZONE = 'LZ_HOUSTON'
+FACILITY_LIFETIME = 25
+
+
+def profit_args(hours):
+    prices, solar = load_hourly(ERCOT_LOAD_ZONE, 2019, hours=hours)
+    num_days = hours / 24
+    # $ per kg per day of nameplate, annualised over the modelled days
+    capex = lambda dol_tpd: dol_tpd / 1000 * (num_days / (FACILITY_LIFETIME * 365))
+    return (
+        400,                # SOLAR_CAPACITY
+        0.03,               # SOLAR_PPA_DOL_KWH
+        solar,
+        prices,
+        55,                 # ELECTROLYSIS_EFFICIENCY
+        4,                  # COMPRESSION_EFFICIENCY
+        10,                 # LIQUEFACTION_EFFICIENCY
+        20,                 # FUEL_CELL_EFFICIENCY
+        0.1,                # LIQUEFACTION_MAX_UP
+        0.1,                # LIQUEFACTION_MAX_DOWN
+        1,                  # OFFTAKE_TPD
+        num_days,           # NUM_DAYS
+        capex(1200000),     # ELECTROLYSIS_CAPEX_DOL_kgPD
+        capex(900000),      # COMPRESSOR_CAPEX_DOL_kgPD
+        capex(2350000),     # LIQUEFACTION_CAPEX_DOL_kgPD
+        capex(1945000),     # FUELCELL_CAPEX_DOL_kgPD
+        4.5,                # H2_SALES_PRICE_DOL_per_kg
+        0.4,                # GREEN_THRESHOLD_kg_per_kg
+        0.42062,            # ERCTO_CO2_kg_per_kwh
+        hours,              # T
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=int, default=8760)
+    parser.add_argument("--k", type=int, nargs="+", default=[4, 8, 12, 24])
+    parser.add_argument("--method", default="kmedoids", choices=["kmedoids", "hierarchical"])
+    parser.add_argument("--extreme-days", type=int, default=0)
+    parser.add_argument("--formulation", default="lp", choices=["lp", "milp"])
+    args = parser.parse_args()
+
+    report = representative_day_report(run_profit_maximisation, profit_args(args.hours), args.k,
+                                       method=args.method, extreme_days=args.extreme_days,
+                                       formulation=args.formulation)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report)
@@ -0,0 +1,127 @@
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from market_data import load_hourly
+from rolling_horizon_optimisation import run_rolling_horizon_opt, RollingHorizonModel, simulate_rolling_horizon
+
+# Per-step wall time of the rolling horizon optimisation over a year of
+# LZ_HOUSTON dayahead prices: rebuilding the problem every hour with
+# run_rolling_horizon_opt vs. re-solving the compiled RollingHorizonModel.
+#
+#   python benchmark_rolling_horizon.py --hours 8760 --horizon 24
+
+ERCOT_LOAD_ZONE = 'LZ_HOUSTON'
+
+PLANT = dict(
+    SOLAR_CAPACITY = 400,
+    SOLAR_PPA_DOL_KWH = 0.03,
+    ELECTROLYSIS_EFFICIENCY = 55,
+    COMPRESSION_EFFICIENCY = 4,
+    LIQUEFACTION_EFFICIENCY = 10,
+    FUEL_CELL_EFFICIENCY = 20,
+    LIQUEFACTION_MAX_UP = 0.1,
+    LIQUEFACTION_MAX_DOWN = 0.1,
+    H2_SALES_PRICE_DOL_per_kg = 4.5,
+    GREEN_THRESHOLD_kg_per_kg = 0.4,
+    ERCTO_CO2_kg_per_kwh = 0.42062,
+)
+
+CAPACITIES = {
+    "electrolyser_capacity_ph": 8.0,
+    "compressor_capacity_ph": 8.0,
+    "liquefaction_capacity_ph": 5.0,
+    "fuelcell_capacity_ph": 1.0,
+}
+
+INITIAL_STATE = {
+    "grid_running_sum": 0,
+    "h2_offtake_running_sum": 0,
+    "gh2_storage_level_kg": 0,
+    "liquefaction_produced_kg": 0,
+}
+
+
+def run_function(prices, solar, hours, h):
+    state = INITIAL_STATE
+    step_times = np.empty(hours)
+    for t in range(hours):
+        start = time.perf_counter()
+        # run_rolling_horizon_opt prints the previous liquefaction every call
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, _, _, state = run_rolling_horizon_opt(
+                PLANT['SOLAR_CAPACITY'],
+                PLANT['SOLAR_PPA_DOL_KWH'],
+                solar[t:t+h],
+                prices[t:t+h],
+                PLANT['ELECTROLYSIS_EFFICIENCY'],
+                PLANT['COMPRESSION_EFFICIENCY'],
+                PLANT['LIQUEFACTION_EFFICIENCY'],
+                PLANT['FUEL_CELL_EFFICIENCY'],
+                PLANT['LIQUEFACTION_MAX_UP'],
+                PLANT['LIQUEFACTION_MAX_DOWN'],
+                CAPACITIES['electrolyser_capacity_ph'],
+                CAPACITIES['compressor_capacity_ph'],
+                CAPACITIES['liquefaction_capacity_ph'],
+                CAPACITIES['fuelcell_capacity_ph'],
+                PLANT['H2_SALES_PRICE_DOL_per_kg'],
+                PLANT['GREEN_THRESHOLD_kg_per_kg'],
+                PLANT['ERCTO_CO2_kg_per_kwh'],
+                h,
+                state)
+        step_times[t] = time.perf_counter() - start
+    return step_times, state
+
+
+def run_model(prices, solar, hours, h):
+    state = INITIAL_STATE
+    step_times = np.empty(hours)
+    start = time.perf_counter()
+    model = RollingHorizonModel(T=h, capacities=CAPACITIES, **PLANT)
+    build_time = time.perf_counter() - start
+    for t in range(hours):
+        start = time.perf_counter()
+        state = model.step(prices[t:t+h], solar[t:t+h], state)
+        step_times[t] = time.perf_counter() - start
+    return step_times, state, build_time
+
+
+def summarise(name, step_times):
+    print(f"{name:>22}: total {step_times.sum():9.2f} s | mean {1000*step_times.mean():7.2f} ms/step | "
+          f"p50 {1000*np.percentile(step_times, 50):7.2f} ms | p99 {1000*np.percentile(step_times, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=int, default=8760)
+    parser.add_argument("--horizon", type=int, default=24)
+    parser.add_argument("--commit", type=int, default=1)
+    parser.add_argument("--skip-function", action="store_true")
+    args = parser.parse_args()
+
+    prices, solar = load_hourly(ERCOT_LOAD_ZONE, 2019)
+    h = args.horizon
+    # fixed-length windows, so the last simulated hour still sees a full horizon
+    hours = min(args.hours, len(prices) - h)
+    print(f"{hours} rolling steps, horizon {h} h")
+
+    model_times, model_state, build_time = run_model(prices, solar, hours, h)
+    print(f"RollingHorizonModel build: {1000*build_time:.2f} ms (first solve compiles)")
+    summarise("RollingHorizonModel", model_times)
+
+    start = time.perf_counter()
+    simulation = simulate_rolling_horizon(prices[:hours+1], solar[:hours+1], CAPACITIES,
+                                          horizon=h, commit=args.commit, **PLANT)
+    simulation_time = time.perf_counter() - start
+    print(f"{'simulate_rolling_horizon':>22}: total {simulation_time:9.2f} s | commit {args.commit} h | "
+          f"h2 offtake {simulation['h2_offtake_running_sum'].iloc[-1]:.3f} kg")
+
+    if not args.skip_function:
+        function_times, function_state = run_function(prices, solar, hours, h)
+        summarise("run_rolling_horizon_opt", function_times)
+        print(f"speed-up: {function_times.sum() / model_times.sum():.1f}x")
+        print(f"h2 offtake: function {function_state['h2_offtake_running_sum']:.3f} kg, "
+              f"model {model_state['h2_offtake_running_sum']:.3f} kg")
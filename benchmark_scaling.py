@@ -0,0 +1,207 @@
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+
+from annual_profit_optimisation import run_levelised_cost_minimisation, run_profit_maximisation
+from benchmark_representative_days import profit_args
+from benchmark_rolling_horizon import CAPACITIES, INITIAL_STATE, PLANT
+from rolling_horizon_optimisation import run_rolling_horizon_opt
+from solver_config import SolverConfig
+
+# Build / canonicalization / solve time and peak memory of the three
+# optimisation entry points against the horizon length, for the MILP and LP
+# storage formulations, on the bundled LZ_HOUSTON 2019 dayahead prices and
+# solar profile.
+#
+#   python benchmark_scaling.py run --out benchmarks/baseline.json
+#   python benchmark_scaling.py run --hours 24 168 --models profit --out current.json
+#   python benchmark_scaling.py compare benchmarks/baseline.json current.json --threshold 0.25
+#
+# Every case runs in a fresh process, so its peak RSS is its own. Times per
+# case: build (model construction and result assembly, i.e. everything
+# outside problem.solve), canonicalization (cvxpy's compilation), solve
+# (the solver) and total. The rolling horizon case is one window of T hours.
+# compare prints the cases whose times or memory grew by more than the
+# threshold over the baseline and exits with status 1 if there are any.
+
+MODELS = ("levelised", "profit", "rolling")
+FORMULATIONS = ("milp", "lp")
+HORIZONS = (24, 168, 720, 2400, 8760)
+
+# metrics compared against the baseline, with the absolute change below
+# which a difference is noise (seconds, MiB)
+METRICS = {
+    "build_time_s": 0.05,
+    "canonicalization_time_s": 0.05,
+    "solve_time_s": 0.05,
+    "total_time_s": 0.1,
+    "peak_rss_mib": 20,
+}
+# cases identified by
+CASE_KEYS = ["model", "formulation", "T"]
+
+
+def _peak_rss_mib():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _solve(model, formulation, T, solver):
+    named = dict(zip(inspect.signature(run_profit_maximisation).parameters, profit_args(T)))
+    if model == "profit":
+        return run_profit_maximisation(**named, formulation=formulation, solver=solver, return_stats=True)
+    if model == "levelised":
+        arguments = {name: named[name] for name in inspect.signature(run_levelised_cost_minimisation).parameters
+                     if name in named}
+        return run_levelised_cost_minimisation(**arguments, formulation=formulation, solver=solver,
+                                               return_stats=True)
+    # run_rolling_horizon_opt prints the previous liquefaction every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_rolling_horizon_opt(
+            PLANT['SOLAR_CAPACITY'], PLANT['SOLAR_PPA_DOL_KWH'],
+            named["hourly_solar_production_kwh"], named["hourly_dayahead_dol_per_kwh"],
+            PLANT['ELECTROLYSIS_EFFICIENCY'], PLANT['COMPRESSION_EFFICIENCY'], PLANT['LIQUEFACTION_EFFICIENCY'],
+            PLANT['FUEL_CELL_EFFICIENCY'], PLANT['LIQUEFACTION_MAX_UP'], PLANT['LIQUEFACTION_MAX_DOWN'],
+            CAPACITIES['electrolyser_capacity_ph'], CAPACITIES['compressor_capacity_ph'],
+            CAPACITIES['liquefaction_capacity_ph'], CAPACITIES['fuelcell_capacity_ph'],
+            PLANT['H2_SALES_PRICE_DOL_per_kg'], PLANT['GREEN_THRESHOLD_kg_per_kg'], PLANT['ERCTO_CO2_kg_per_kwh'],
+            T, INITIAL_STATE, formulation=formulation, solver=solver, return_stats=True)
+
+
+# one case, in its own process
+def run_case(model, formulation, T, time_limit):
+    profit_args(T)  # read the market data cache before the clock starts
+    baseline_rss = _peak_rss_mib()
+    solver = SolverConfig(time_limit=time_limit) if time_limit is not None else None
+
+    start = time.perf_counter()
+    stats = _solve(model, formulation, T, solver)[-1]
+    total = time.perf_counter() - start
+
+    return {
+        "model": model,
+        "formulation": formulation,
+        "T": T,
+        "status": stats.status,
+        "objective": stats.objective,
+        "build_time_s": total - stats.wall_time,
+        "canonicalization_time_s": stats.canonicalization_time,
+        "solve_time_s": stats.solve_time,
+        "total_time_s": total,
+        "peak_rss_mib": _peak_rss_mib(),
+        "baseline_rss_mib": baseline_rss,
+        "num_variables": stats.num_variables,
+        "num_integer_variables": stats.num_integer_variables,
+        "num_constraints": stats.num_constraints,
+        "node_count": stats.node_count,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(models=MODELS, formulations=FORMULATIONS, horizons=HORIZONS, time_limit=None, repeat=1):
+    cases = []
+    for T in horizons:
+        for model in models:
+            for formulation in formulations:
+                timings = []
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                        timings.append(executor.submit(run_case, model, formulation, T, time_limit).result())
+                # the fastest repeat, the least disturbed by the machine
+                case = min(timings, key=lambda timing: timing["total_time_s"])
+                cases.append(case)
+                print(f"{model:>9} {formulation:>4} T={T:>5}: total {case['total_time_s']:8.2f} s | "
+                      f"build {case['build_time_s']:7.2f} s | canon {case['canonicalization_time_s'] or 0:7.2f} s | "
+                      f"solve {case['solve_time_s'] or 0:8.2f} s | rss {case['peak_rss_mib']:7.1f} MiB | "
+                      f"{case['status']}", flush=True)
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cvxpy": cp.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "installed_solvers": cp.installed_solvers(),
+            "time_limit_s": time_limit,
+            "repeat": repeat,
+        },
+        "cases": cases,
+    }
+
+
+# cases of `current` slower or larger than `baseline` by more than
+# `threshold` (relative) and the noise floor of the metric, one row per
+# case and metric
+def compare(baseline, current, threshold=0.2):
+    merged = pd.DataFrame(baseline["cases"]).merge(pd.DataFrame(current["cases"]), on=CASE_KEYS,
+                                                   suffixes=("_baseline", "_current"))
+    rows = []
+    for metric, noise in METRICS.items():
+        before = merged[f"{metric}_baseline"].astype(float)
+        after = merged[f"{metric}_current"].astype(float)
+        change = after - before
+        regressed = (change > threshold * before) & (change > noise)
+        for i in np.flatnonzero(regressed.to_numpy()):
+            rows.append({**merged.loc[i, CASE_KEYS].to_dict(), "metric": metric, "baseline": before[i],
+                         "current": after[i], "ratio": after[i] / before[i] if before[i] > 0 else np.inf})
+    return pd.DataFrame(rows, columns=CASE_KEYS + ["metric", "baseline", "current", "ratio"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--out", required=True)
+    run_parser.add_argument("--hours", type=int, nargs="+", default=list(HORIZONS))
+    run_parser.add_argument("--models", nargs="+", default=list(MODELS), choices=MODELS)
+    run_parser.add_argument("--formulations", nargs="+", default=list(FORMULATIONS), choices=FORMULATIONS)
+    run_parser.add_argument("--time-limit", type=float, default=None)
+    run_parser.add_argument("--repeat", type=int, default=1)
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.models, args.formulations, args.hours, args.time_limit, args.repeat)
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2, default=float)
+        sys.exit(0)
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions.empty:
+        print(f"no regressions over {args.threshold:.0%}")
+        sys.exit(0)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(regressions)
+    sys.exit(1)
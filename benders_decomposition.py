@@ -0,0 +1,482 @@
+import multiprocessing
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import cvxpy as cp
+
+from h2_plant import (CAPACITY_KEYS, PlantParams, PlantVariables, capacity_limits, electricity_cost, electricity_revenue,
+                      green_cap, h2_revenue, hourly_columns, mass_balance, power_balance, ramp, storage)
+from h2_plant.objective import CAPEX_PARAMS
+from shared_arrays import attach_arrays, release, share_arrays
+from storage_formulation import default_solve_options
+
+# Benders decomposition of run_profit_maximisation (LP formulation).
+#
+# The master problem holds the design decisions (the four nameplate
+# capacities) and the quantities that couple the dispatch of consecutive
+# blocks of hours (weeks, months):
+#   - a share b[s] of the annual green budget per block, sum(b) <= 0, where a
+#     block's share is CO2 * grid consumption - GREEN_THRESHOLD * h2 produced
+#   - the gh2 storage level at every block boundary
+#   - the liquefaction throughput of the last hour before every boundary
+#     (ramp constraints hold across boundaries)
+# Each block's dispatch is a subproblem with the same rows as the rolling
+# horizon model, with these values fixed; its optimal value and the duals of
+# the fixing rows give a cut
+#   theta[s] <= Q[s](y_k) + grad_k . (y - y_k)
+# for the master. Subproblems are compiled once per worker process and solved
+# in parallel; memory per process is bounded by the blocks it has seen.
+# Boundary and green rows take penalised slacks so every subproblem is
+# feasible for any master decision (complete recourse).
+#
+#   operations_df, facility, history = run_benders_profit_maximisation(
+#       prices, solar, plant, block_hours=730, workers=8)
+#
+# `plant` holds the scalar run_profit_maximisation arguments by name. The
+# master's capacities are boxed by capacity_bounds, by default the bounds
+# capacity_bounds_from_data derives from the prices and solar.
+
+# $ per unit of boundary / green slack
+BENDERS_PENALTY_DOL = 1000
+# iterations without a better design before separating at the master solution
+STALL_ITERATIONS = 3
+
+
+# Upper bounds on the nameplate capacities (kg per hour) that no optimal
+# design exceeds. All the solar plus the grid power the green cap allows
+# per kg produce at most
+#   H = SOLAR_CAPACITY * sum(solar) / (ELECTROLYSIS + COMPRESSION - GREEN_THRESHOLD / CO2)
+# kg over the horizon, so no throughput exceeds H in a period, and the
+# liquefaction ramp limits stop binding at H / min(MAX_UP, MAX_DOWN). The
+# empty plant earns 0, so an optimal design's capex is at most what H kg can
+# earn: sold as h2, plus the allowed grid power bought at the most negative
+# price, plus the fuel cell burning them in the dearest periods its capacity
+# allows. That bounds the fuel cell (past some capacity it cannot earn its
+# capex) and then every other capacity with positive capex. prices and
+# solar may be (S, T) scenarios.
+def capacity_bounds_from_data(plant, prices, solar):
+    plant = plant if isinstance(plant, PlantParams) else PlantParams.from_mapping(plant)
+    grid_per_kg = plant.GREEN_THRESHOLD_kg_per_kg / plant.ERCTO_CO2_kg_per_kwh
+    energy_per_kg = plant.ELECTROLYSIS_EFFICIENCY + plant.COMPRESSION_EFFICIENCY - grid_per_kg
+    if energy_per_kg <= 0:
+        raise ValueError("the green threshold allows more grid power per kg than production needs, so the data "
+                         "do not bound the capacities; pass capacity_bounds")
+    dt = plant.dt_hours
+    solar_kwh = plant.SOLAR_CAPACITY * dt * np.max(np.atleast_2d(np.asarray(solar, dtype=float)).sum(axis=1))
+    h2_max = solar_kwh / energy_per_kg
+    bounds = {key: h2_max / dt for key in CAPACITY_KEYS}
+    ramp_fraction = min([1.0] + [f * dt for f in (plant.LIQUEFACTION_MAX_UP, plant.LIQUEFACTION_MAX_DOWN) if f > 0])
+    bounds['liquefaction_capacity_ph'] /= ramp_fraction
+
+    prices = np.atleast_2d(np.asarray(prices, dtype=float))
+    revenue = h2_max * ((plant.H2_SALES_PRICE_DOL_per_kg or 0) + grid_per_kg * max(-prices.min(), 0))
+    # fuel cell burning h2_max kg in its n dearest periods (capacity
+    # h2_max / n per period): revenue less capex, by n
+    dearest = np.cumsum(-np.sort(-np.maximum(prices, 0), axis=1), axis=1).max(axis=0)
+    n = np.arange(1, len(dearest) + 1)
+    fuel_cell_capex = 24 * (plant.FUELCELL_CAPEX_DOL_kgPD or 0)
+    fuel_cell_margin = h2_max * ((plant.FUEL_CELL_EFFICIENCY or 0) * dearest - fuel_cell_capex / dt) / n
+    if fuel_cell_capex:
+        # the fewest periods in which the fuel cell still pays its capex out of
+        # everything the plant earns; one period fewer is beyond any optimum
+        pays = np.flatnonzero(revenue + fuel_cell_margin >= 0)
+        fewest = n[pays[0]] - 1 if len(pays) else len(n)
+        if fewest >= 1:
+            bounds['fuelcell_capacity_ph'] = min(bounds['fuelcell_capacity_ph'], h2_max / (fewest * dt))
+    revenue += max(fuel_cell_margin.max(), 0)
+    for key in CAPACITY_KEYS:
+        capex = getattr(plant, CAPEX_PARAMS[key])
+        if capex and key != 'fuelcell_capacity_ph':
+            bounds[key] = min(bounds[key], revenue / (24 * capex))
+    return bounds
+
+
+# warn when a design sits at its capacity bounds: the optimum may lie beyond them
+def check_capacity_bounds(design, capacity_bounds):
+    at_bound = [key for key in CAPACITY_KEYS if design[key] >= capacity_bounds[key] * (1 - 1e-6)]
+    if at_bound:
+        warnings.warn(f"{at_bound} at their capacity_bounds; the optimal design may lie beyond them",
+                      stacklevel=3)
+
+
+class DispatchBlock:
+
+    # n hours of dispatch; the first block starts with empty storage and no
+    # ramp from the previous hour, the last block has a free end state
+    def __init__(self, plant, n, first, last):
+        self.n = n
+        self.first = first
+        self.last = last
+        self.plant = PlantParams.from_mapping(plant)
+
+        # market and solar data for the block
+        self.hourly_dayahead_dol_per_kwh = cp.Parameter(n)
+        self.hourly_solar_production_kwh = cp.Parameter(n, nonneg = True)
+
+        # master decisions; each is copied into a variable by a fixing row
+        # whose dual is the slope of the block's value in that decision
+        self.linking = {name: cp.Parameter(nonneg = True) for name in CAPACITY_KEYS}
+        self.linking['green_budget'] = cp.Parameter()
+        if not first:
+            self.linking['start_gh2_storage_level_kg'] = cp.Parameter(nonneg = True)
+            self.linking['start_liquefaction_produced_kg'] = cp.Parameter(nonneg = True)
+        if not last:
+            self.linking['end_gh2_storage_level_kg'] = cp.Parameter(nonneg = True)
+            self.linking['end_liquefaction_produced_kg'] = cp.Parameter(nonneg = True)
+        fixed = {name: cp.Variable() for name in self.linking}
+        self.fixing = {name: fixed[name] == parameter for name, parameter in self.linking.items()}
+
+        self.v = v = PlantVariables(n, capacities={key: fixed[key] for key in CAPACITY_KEYS})
+        self.ci_slack = cp.Variable(nonneg = True)
+        # end level / end liquefaction shortfall and excess and start ramp
+        # violation (liquefaction may have to ramp down from more than
+        # the block can produce)
+        self.boundary_slack = cp.Variable(6, nonneg = True)
+        boundary_slack = self.boundary_slack
+        liquefaction_capacity = fixed['liquefaction_capacity_ph']
+
+        constraints = list(self.fixing.values())
+        constraints += power_balance(v, self.plant, self.hourly_solar_production_kwh)
+        # the block may use its share of the green budget
+        constraints += green_cap(v, self.plant, allowance=fixed['green_budget'], slack=self.ci_slack)
+        constraints += capacity_limits(v)
+        constraints += ramp(v, self.plant)
+
+        # start from the previous block's state
+        if first:
+            constraints += storage(v, None, initial_level=0)
+        else:
+            start_liquefaction = fixed['start_liquefaction_produced_kg']
+            constraints += storage(v, None, initial_level=fixed['start_gh2_storage_level_kg'])
+            constraints += [
+                v.liquefacion_throughput[0] - start_liquefaction <= self.plant.LIQUEFACTION_MAX_UP*liquefaction_capacity + boundary_slack[4],
+                start_liquefaction - v.liquefacion_throughput[0] <= self.plant.LIQUEFACTION_MAX_DOWN*liquefaction_capacity + boundary_slack[5],
+            ]
+
+        # hand over the state the next block starts from
+        if not last:
+            constraints += [
+                v.gh2_storage_level[n] + boundary_slack[0] - boundary_slack[1] == fixed['end_gh2_storage_level_kg'],
+                v.liquefacion_throughput[n-1] + boundary_slack[2] - boundary_slack[3] == fixed['end_liquefaction_produced_kg'],
+            ]
+
+        constraints += mass_balance(v)
+        # relaxed storage on/off logic, subproblems must be LPs
+        constraints += storage(v, "lp", initial_level=None)
+
+        objective = -electricity_cost(v, self.plant, self.hourly_dayahead_dol_per_kwh) \
+            + electricity_revenue(v, self.hourly_dayahead_dol_per_kwh) + h2_revenue(v, self.plant) \
+            - v.storage_cycling_cost \
+            - BENDERS_PENALTY_DOL * (self.ci_slack + cp.sum(boundary_slack))
+
+        self.problem = cp.Problem(cp.Maximize(objective), constraints)
+
+    # value, slopes in the linking decisions and total slack of the block
+    def slack(self):
+        return float(self.ci_slack.value + self.boundary_slack.value.sum())
+
+    def solve(self, prices, solar, linking):
+        self.hourly_dayahead_dol_per_kwh.value = np.asarray(prices, dtype=float)
+        self.hourly_solar_production_kwh.value = np.asarray(solar, dtype=float)
+        for name, parameter in self.linking.items():
+            parameter.value = linking[name]
+        self.problem.solve(**default_solve_options("lp", self.n))
+        if self.problem.status not in ("optimal", "optimal_inaccurate"):
+            raise RuntimeError(f"dispatch subproblem {self.problem.status}")
+        gradient = {name: float(row.dual_value) for name, row in self.fixing.items()}
+        return self.problem.value, gradient, self.slack()
+
+    def operations_df(self):
+        v = self.v
+        return pd.DataFrame({
+            "hourly_dayahead_dol_per_kwh": self.hourly_dayahead_dol_per_kwh.value,
+            "realtime_production_kwh": v.realtime_consumption.value,
+            "realtime_supplied_kwh": v.realtime_supplied.value,
+            "solar_production_kwh": v.solar_consumed_facility.value,
+            **hourly_columns(v, self.plant),
+        })
+
+
+# compiled blocks, plant and hourly series of this process
+_blocks = {}
+_plant = {}
+_arrays = {}
+
+
+def _solve_block(s, start, stop, num_blocks, linking, operations=False):
+    if s not in _blocks:
+        _blocks[s] = DispatchBlock(_plant, stop - start, s == 0, s == num_blocks - 1)
+    block = _blocks[s]
+    value, gradient, slack = block.solve(
+        _arrays['hourly_dayahead_dol_per_kwh'][start:stop], _arrays['hourly_solar_production_kwh'][start:stop], linking)
+    if operations:
+        return value, gradient, slack, block.operations_df()
+    return value, gradient, slack
+
+
+# Worker process owning a fixed set of blocks, so each block is compiled
+# once and a process only ever holds the models of its own blocks. Receives
+# (linking values of every block, operations) and answers {block: result}.
+def _block_worker(connection, plant, descriptors, owned):
+    _plant.update(plant)
+    _arrays.update(attach_arrays(descriptors))
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        linking_values, operations = request
+        try:
+            connection.send({s: _solve_block(s, start, stop, num_blocks, linking_values[s], operations)
+                             for s, start, stop, num_blocks in owned})
+        except Exception as error:
+            connection.send(error)
+
+
+# weight * master point + (1 - weight) * best point, block by block
+def blend_linking(linking_values, best_values, weight):
+    if best_values is None or weight >= 1.0:
+        return linking_values
+    return [{name: weight * point[name] + (1 - weight) * best[name] for name in point}
+            for point, best in zip(linking_values, best_values)]
+
+
+def block_bounds(T, block_hours):
+    starts = np.arange(0, T, block_hours)
+    return list(zip(starts, np.minimum(starts + block_hours, T)))
+
+
+class BendersMaster:
+
+    # compiled once: cuts go into preallocated parameter rows
+    #   cut_theta @ theta <= cut_constant + cut_slope @ y
+    # where y stacks every master decision (unused rows are 0 <= 0)
+    def __init__(self, plant, prices, bounds, capacity_bounds, max_cuts):
+        S = len(bounds)
+        self.S = S
+        self.bounds = bounds
+        hours = np.array([stop - start for start, stop in bounds])
+        cap_max = np.array([capacity_bounds[name] for name in CAPACITY_KEYS], dtype=float)
+
+        # y = [capacities, green budget per block, storage level and
+        #      liquefaction at the S - 1 block boundaries]
+        self.columns = [self.block_columns(s) for s in range(S)]
+        self.y = cp.Variable(4 + S + 2 * (S - 1))
+        self.theta = cp.Variable(S)
+        capacity = self.y[0:4]
+        green_budget = self.y[4:4+S]
+        electrolyser, compressor, liquefaction, fuelcell = (capacity[i] for i in range(4))
+
+        peak_draw = plant['ELECTROLYSIS_EFFICIENCY'] * cap_max[0] + plant['COMPRESSION_EFFICIENCY'] * cap_max[1] \
+            + plant['LIQUEFACTION_EFFICIENCY'] * cap_max[2]
+        # most a block can earn: all liquefaction sold, fuel cell at the top price
+        revenue_bound = np.array([
+            (stop - start) * (plant['H2_SALES_PRICE_DOL_per_kg'] * cap_max[2]
+                              + max(np.max(prices[start:stop]), 0) * plant['FUEL_CELL_EFFICIENCY'] * cap_max[3])
+            for start, stop in bounds])
+
+        self.constraints = [
+            capacity >= 0,
+            capacity <= cap_max,
+            cp.sum(green_budget) <= 0,
+            green_budget <= plant['ERCTO_CO2_kg_per_kwh'] * peak_draw * hours,
+            green_budget >= -plant['GREEN_THRESHOLD_kg_per_kg'] * (cap_max[2] + cap_max[3]) * hours,
+            self.theta <= revenue_bound,
+        ]
+        if S > 1:
+            gh2_storage_level = self.y[4+S:4+S+(S-1)]
+            liquefaction_produced = self.y[4+S+(S-1):]
+            # the storage can fill by at most the compressor and empty by at
+            # most liquefaction + fuel cell throughput per hour
+            level = cp.hstack([np.zeros(1), gh2_storage_level])
+            self.constraints += [
+                gh2_storage_level >= 0,
+                liquefaction_produced >= 0,
+                liquefaction_produced <= liquefaction,
+                level[1:] - level[:-1] <= compressor * hours[:-1],
+                level[:-1] - level[1:] <= (liquefaction + fuelcell) * hours[:-1],
+            ]
+
+        self.cuts = {"theta": np.zeros((max_cuts, S)), "slope": np.zeros((max_cuts, self.y.size)),
+                     "constant": np.zeros(max_cuts)}
+        self.num_cuts = 0
+        self.cut_theta = cp.Parameter((max_cuts, S))
+        self.cut_slope = cp.Parameter((max_cuts, self.y.size))
+        self.cut_constant = cp.Parameter(max_cuts)
+        self.constraints += [self.cut_theta @ self.theta <= self.cut_constant + self.cut_slope @ self.y]
+
+        self.capex_dol_kgpd = np.array([plant['ELECTROLYSIS_CAPEX_DOL_kgPD'], plant['COMPRESSOR_CAPEX_DOL_kgPD'],
+                                        plant['LIQUEFACTION_CAPEX_DOL_kgPD'], plant['FUELCELL_CAPEX_DOL_kgPD']])
+        capex = 24 * (self.capex_dol_kgpd @ capacity)
+        self.problem = cp.Problem(cp.Maximize(cp.sum(self.theta) - capex), self.constraints)
+
+    # column of y of every linking decision of block s
+    def block_columns(self, s):
+        S = self.S
+        columns = {name: i for i, name in enumerate(CAPACITY_KEYS)}
+        columns['green_budget'] = 4 + s
+        if s > 0:
+            columns['start_gh2_storage_level_kg'] = 4 + S + (s - 1)
+            columns['start_liquefaction_produced_kg'] = 4 + S + (S - 1) + (s - 1)
+        if s < S - 1:
+            columns['end_gh2_storage_level_kg'] = 4 + S + s
+            columns['end_liquefaction_produced_kg'] = 4 + S + (S - 1) + s
+        return columns
+
+    def capex_of(self, design):
+        return 24 * sum(self.capex_dol_kgpd[i] * design[name] for i, name in enumerate(CAPACITY_KEYS))
+
+    # theta[s] <= value + gradient . (y - y_k)
+    def add_cut(self, s, value, gradient, linking_values):
+        if self.num_cuts == len(self.cuts["constant"]):
+            raise RuntimeError("no cut rows left in the master")
+        row = self.num_cuts
+        columns = self.columns[s]
+        self.cuts["theta"][row, s] = 1
+        for name, column in columns.items():
+            self.cuts["slope"][row, column] = gradient[name]
+        self.cuts["constant"][row] = value - sum(gradient[name] * linking_values[name] for name in columns)
+        self.num_cuts += 1
+
+    def solve(self):
+        self.cut_theta.value = self.cuts["theta"]
+        self.cut_slope.value = self.cuts["slope"]
+        self.cut_constant.value = self.cuts["constant"]
+        self.problem.solve(**default_solve_options("lp", 0))
+        return self.problem.value
+
+    def linking_values(self):
+        # clip solver noise so the fixing parameters stay nonnegative
+        y = self.y.value
+        return [{name: float(y[column]) if name == 'green_budget' else max(float(y[column]), 0.0)
+                 for name, column in columns.items()} for columns in self.columns]
+
+
+# Benders decomposition of the LP profit maximisation over blocks of
+# `block_hours` hours. Stops when the relative gap between the master bound
+# and the best decomposed profit is below `tolerance`. Returns the dispatch of
+# the best design, its facility summary and the iteration history.
+def run_benders_profit_maximisation(
+        hourly_dayahead_dol_per_kwh,
+        hourly_solar_production_kwh,
+        plant,
+        block_hours=730,
+        capacity_bounds=None,
+        tolerance=1e-4,
+        max_iterations=200,
+        in_out=0.5,
+        workers=None,
+        verbose=False):
+    prices = np.asarray(hourly_dayahead_dol_per_kwh, dtype=float)
+    solar = np.asarray(hourly_solar_production_kwh, dtype=float)
+    bounds = block_bounds(len(prices), block_hours)
+    S = len(bounds)
+    if capacity_bounds is None:
+        capacity_bounds = capacity_bounds_from_data(plant, prices, solar)
+    workers = min(workers or os.cpu_count(), S)
+
+    master = BendersMaster(plant, prices, bounds, capacity_bounds, max_cuts=S * max_iterations)
+    history = []
+    best = None
+    arrays = {"hourly_dayahead_dol_per_kwh": prices, "hourly_solar_production_kwh": solar}
+    shared = []
+    workers_connections = []
+
+    def solve_blocks(linking_values, operations=False):
+        if not workers_connections:
+            return [_solve_block(s, start, stop, S, linking_values[s], operations)
+                    for s, (start, stop) in enumerate(bounds)]
+        for connection, _ in workers_connections:
+            connection.send((linking_values, operations))
+        results = {}
+        for connection, _ in workers_connections:
+            answer = connection.recv()
+            if isinstance(answer, Exception):
+                raise answer
+            results.update(answer)
+        return [results[s] for s in range(S)]
+
+    try:
+        if workers > 1:
+            shared, descriptors = share_arrays(arrays)
+            for worker in range(workers):
+                owned = [(s, start, stop, S) for s, (start, stop) in enumerate(bounds) if s % workers == worker]
+                connection, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_block_worker, args=(child, plant, descriptors, owned),
+                                                  daemon=True)
+                process.start()
+                workers_connections.append((connection, process))
+        else:
+            _blocks.clear()
+            _plant.update(plant)
+            _arrays.update(arrays)
+
+        stalled = 0
+        for iteration in range(max_iterations):
+            start = time.perf_counter()
+            upper_bound = master.solve()
+            linking_values = master.linking_values()
+            master_time = time.perf_counter() - start
+
+            # in-out stabilisation: separate at a point between the master
+            # solution and the best design so far, the master alone jumps
+            # between the corners of its box for many iterations
+            weight = 1.0 if best is None or stalled >= STALL_ITERATIONS else in_out
+            linking_values = blend_linking(linking_values, best[1] if best else None, weight)
+
+            start = time.perf_counter()
+            results = solve_blocks(linking_values)
+            subproblem_time = time.perf_counter() - start
+
+            profit = sum(value for value, _, _ in results) - master.capex_of(linking_values[0])
+            slack = sum(s for _, _, s in results)
+            if best is not None and profit <= best[0] + tolerance * max(abs(best[0]), 1.0):
+                stalled += 1
+            else:
+                stalled = 0
+            if best is None or profit > best[0]:
+                best = (profit, linking_values)
+            for s, (value, gradient, _) in enumerate(results):
+                master.add_cut(s, value, gradient, linking_values[s])
+
+            gap = (upper_bound - best[0]) / max(abs(best[0]), 1.0)
+            history.append({"iteration": iteration, "upper_bound": upper_bound, "lower_bound": best[0],
+                            "profit": profit, "gap": gap, "slack": slack, "in_out": weight,
+                            "master_time_s": master_time, "subproblem_time_s": subproblem_time})
+            if verbose:
+                print(f"iteration {iteration}: bound {upper_bound:.2f} best {best[0]:.2f} gap {gap:.2e}")
+            if gap <= tolerance:
+                break
+
+        # dispatch of the best design
+        profit, linking_values = best
+        results = solve_blocks(linking_values, operations=True)
+    finally:
+        for connection, process in workers_connections:
+            connection.send(None)
+        for connection, process in workers_connections:
+            # a worker blocked on an unread answer (after an error) is stopped
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        release(shared)
+
+    operations_df = pd.concat([operations for _, _, _, operations in results], ignore_index=True)
+    design = linking_values[0]
+    check_capacity_bounds(design, capacity_bounds)
+    facility = {name: design[name] for name in CAPACITY_KEYS}
+    facility.update({
+        "h2_sold": operations_df["liquefaction_produced_kg"].sum(),
+        "wholesale_consumed": operations_df["realtime_production_kwh"].sum(),
+        "wholesale_supplied": operations_df["realtime_supplied_kwh"].sum(),
+        "total_profit": profit,
+        "slack": sum(s for _, _, s, _ in results),
+        "blocks": S,
+        "iterations": len(history),
+        "benders_gap": history[-1]["gap"],
+        "formulation": "lp",
+        "lp_milp_gap": None,
+    })
+    return operations_df, facility, pd.DataFrame(history)
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from multiprocessing import get_context
+
+import cvxpy as cp
+
+from h2_plant import CAPACITY_KEYS
+from results_store import params_hash
+from rolling_horizon_optimisation import INITIAL_STATE, RollingHorizonModel
+from solver_config import SolverConfig
+
+# Long-lived local dispatch service: "what should the plant do next hour
+# given these prices and this state", answered by a compiled
+# RollingHorizonModel instead of rebuilding run_rolling_horizon_opt.
+#
+#   python dispatch_service.py --port 8750 --workers 4
+#   python dispatch_service.py --unix /tmp/dispatch.sock
+#
+#   POST /step
+#   {"plant": {"SOLAR_CAPACITY": 400, ..., "formulation": "milp", "solver": {"mip_gap": 1e-3}},
+#    "capacities": {"electrolyser_capacity_ph": 8.0, ...},
+#    "prices": [...], "solar": [...],                  # the horizon, hour 0 already committed
+#    "state": {"grid_running_sum": 0, ...},            # as INITIAL_STATE
+#    "plant_id": "plant-a", "on_failure": "relax"}     # optional
+#   -> {"operations_t_vector": {...}, "state": {...}, "status": "optimal",
+#       "solve_time_s": 0.01, "fallback": false, "compiled": false}
+#   GET /health
+#
+# "plant" holds the RollingHorizonModel arguments (solver as SolverConfig
+# fields); with the horizon it identifies a plant configuration, compiled
+# the first time it is seen in one worker process and kept there. Later
+# steps only set the parameter values (prices, solar, state, capacities) and
+# re-solve, warm-started from the worker's previous solution (shifted by an
+# hour when the same plant_id stepped last). The returned state is the next
+# request's. Configurations are spread over the workers, so steps of
+# different plants solve in parallel; steps on one worker queue. A window
+# without a solution is re-solved with the storage logic relaxed to the LP
+# (fallback) unless on_failure is "raise"; without any solution the service
+# answers 422.
+
+DEFAULT_PORT = 8750
+ON_FAILURE = ("raise", "relax")
+# largest request body accepted (bytes)
+MAX_BODY = 1 << 20
+
+# compiled models of the worker process, by configuration key
+_models = {}
+# plant_id of the last step of each model
+_last_plant = {}
+
+
+def _step(key, plant, horizon, capacities, prices, solar, state, plant_id, on_failure):
+    model = _models.get(key)
+    compiled = model is None
+    if compiled:
+        plant = dict(plant)
+        if isinstance(plant.get("solver"), dict):
+            plant["solver"] = SolverConfig(**plant["solver"])
+        model = _models[key] = RollingHorizonModel(T=horizon, **plant)
+    elif plant_id is not None and _last_plant.get(key) == plant_id and model.solved():
+        model.shift_solution(1)
+    _last_plant[key] = plant_id
+    model.set_capacities(capacities)
+
+    start = time.perf_counter()
+    fallback = False
+    try:
+        vector = model.step(prices, solar, state, warm_start=not compiled)
+    except cp.error.SolverError:
+        vector = None
+    if vector is None and on_failure == "relax":
+        fallback = True
+        try:
+            vector = model.solve_relaxed()
+        except cp.error.SolverError:
+            vector = None
+    solve_time = time.perf_counter() - start
+
+    response = {"status": model.problem.status, "solve_time_s": solve_time, "fallback": fallback,
+                "compiled": compiled}
+    if vector is not None:
+        vector = {name: float(value) for name, value in vector.items()}
+        response["operations_t_vector"] = vector
+        response["state"] = {name: vector[name] for name in INITIAL_STATE}
+    return response
+
+
+class RequestError(ValueError):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _require(request, name, kind):
+    if not isinstance(request.get(name), kind):
+        raise RequestError(400, f"{name!r} missing or not a {kind.__name__}")
+    return request[name]
+
+
+class DispatchService:
+
+    def __init__(self, workers=None):
+        workers = workers or os.cpu_count()
+        context = get_context("spawn")
+        # one process per executor, so a configuration always reaches the
+        # worker holding its compiled model
+        self.executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(workers)]
+        self.assignment = {}
+        self.plants_per_worker = [0] * workers
+        self.requests = 0
+
+    # worker of a configuration: the one with the fewest configurations when first seen
+    def executor(self, key):
+        if key not in self.assignment:
+            worker = min(range(len(self.executors)), key=self.plants_per_worker.__getitem__)
+            self.assignment[key] = worker
+            self.plants_per_worker[worker] += 1
+        return self.executors[self.assignment[key]]
+
+    async def step(self, request):
+        plant = _require(request, "plant", dict)
+        capacities = _require(request, "capacities", dict)
+        prices = _require(request, "prices", list)
+        solar = _require(request, "solar", list)
+        state = _require(request, "state", dict)
+        on_failure = request.get("on_failure", "relax")
+        if on_failure not in ON_FAILURE:
+            raise RequestError(400, f"on_failure must be one of {ON_FAILURE}, got {on_failure!r}")
+        if len(prices) < 2 or len(solar) != len(prices):
+            raise RequestError(400, "prices and solar must have the same length of at least 2 hours")
+        missing = [name for name in CAPACITY_KEYS if name not in capacities] + \
+            [name for name in INITIAL_STATE if name not in state]
+        if missing:
+            raise RequestError(400, f"missing capacities / state {missing}")
+        if "T" in plant or "capacities" in plant:
+            raise RequestError(400, "plant must not hold T or capacities (the horizon is len(prices))")
+
+        horizon = len(prices)
+        key = params_hash({**plant, "T": horizon})
+        self.requests += 1
+        response = await asyncio.get_running_loop().run_in_executor(
+            self.executor(key), _step, key, plant, horizon, capacities, prices, solar, state,
+            request.get("plant_id"), on_failure)
+        if "operations_t_vector" not in response:
+            raise RequestError(422, f"no solution for the window (status {response['status']})")
+        return response
+
+    def health(self):
+        return {"workers": len(self.executors), "configurations": len(self.assignment),
+                "configurations_per_worker": self.plants_per_worker, "requests": self.requests}
+
+    async def respond(self, method, path, body):
+        if path == "/health" and method == "GET":
+            return 200, self.health()
+        if path == "/step" and method == "POST":
+            try:
+                request = json.loads(body)
+            except ValueError as error:
+                raise RequestError(400, f"invalid JSON: {error}")
+            if not isinstance(request, dict):
+                raise RequestError(400, "request must be a JSON object")
+            return 200, await self.step(request)
+        raise RequestError(404, f"no route {method} {path}")
+
+    # HTTP/1.1 with keep-alive, one request at a time per connection
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    status, payload = 413, {"error": f"body over {MAX_BODY} bytes"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    try:
+                        status, payload = await self.respond(method, path, body)
+                    except RequestError as error:
+                        status, payload = error.status, {"error": str(error)}
+                    except Exception as error:
+                        status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(cancel_futures=True)
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, unix=None, workers=None):
+    service = DispatchService(workers)
+    if unix is not None:
+        server = await asyncio.start_unix_server(service.handle, path=unix)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    print(f"dispatch service on {unix or f'http://{host}:{port}'} with {len(service.executors)} workers",
+          flush=True)
+    # SIGTERM (e.g. Popen.terminate) stops the server like Ctrl-C, so the
+    # workers are shut down with it instead of being orphaned
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
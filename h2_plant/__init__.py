@@ -0,0 +1,20 @@
+# Shared model of the hydrogen plant: parameters, decision variables and
+# composable constraint builders used by annual sizing, profit maximisation
+# and rolling dispatch. A speed-up to a builder applies to all of them.
+#
+#   plant = PlantParams.from_mapping(arguments)
+#   v = PlantVariables(T)
+#   constraints = power_balance(v, plant, solar) + green_cap(v, plant) + capacity_limits(v) \
+#       + ramp(v, plant) + storage(v, "lp") + mass_balance(v)
+#
+# compute_kpis turns the operations of one run, or a batch of them, into the
+# summary metrics (revenue, costs, LCOH, capacity factors, ...).
+
+from h2_plant.constraints import capacity_limits, green_cap, mass_balance, power_balance, ramp, storage
+from h2_plant.kpis import (CAPACITY_FACTOR_KPIS, CAPEX_KPIS, PER_KG_KPIS, SALES_KPIS, compute_kpis, kpi_frame,
+                           results_array, select_kpis)
+from h2_plant.models import CI_SLACK_PENALTY_DOL, dispatch_model, levelised_cost_model, profit_model
+from h2_plant.objective import capex, electricity_cost, electricity_revenue, h2_revenue
+from h2_plant.params import PlantParams
+from h2_plant.results import hourly_columns
+from h2_plant.variables import CAPACITY_KEYS, PlantVariables
@@ -0,0 +1,96 @@
+import cvxpy as cp
+
+from liquefaction_commitment import liquefaction_commitment
+from storage_formulation import gh2_storage_logic
+
+# Constraint builders of the plant model. Each takes the PlantVariables `v`
+# and the PlantParams `plant` and returns a list of constraints; hourly data
+# and previous state may be arrays or cp.Parameters, so the same rows serve
+# the one-off annual models and the compiled rolling horizon model. Rows are
+# per period of v.dt_hours: hourly capacities and solar output scale with
+# dt_hours, ramp limits (per hour of nameplate per hour) with dt_hours**2.
+
+
+# solar availability, electricity balance and fuel cell output
+def power_balance(v, plant, hourly_solar_production_kwh):
+    constraints = [
+        # restrict the amount of solar that can be consumed
+        v.solar_consumed_facility <= plant.SOLAR_CAPACITY * v.dt_hours * hourly_solar_production_kwh,
+        # power balance equation: sum of electricity in = amount consumed
+        v.realtime_consumption + v.solar_consumed_facility ==
+            plant.ELECTROLYSIS_EFFICIENCY*v.electrolyser_throughput +
+            plant.COMPRESSION_EFFICIENCY*v.compressor_throughput +
+            plant.LIQUEFACTION_EFFICIENCY*v.liquefacion_throughput,
+    ]
+    # add fuel cell offtake
+    if v.fuel_cell:
+        constraints += [
+            v.fuel_cell_throughput*plant.FUEL_CELL_EFFICIENCY == v.realtime_supplied,
+        ]
+    return constraints
+
+
+# equipment throughput within nameplate; fixed_capacities pins the design
+# variables (dispatch only, e.g. to validate a sizing)
+def capacity_limits(v, fixed_capacities=None):
+    constraints = [v.throughput(key) <= capacity * v.dt_hours for key, capacity in v.capacities.items()]
+    if fixed_capacities is not None:
+        if not v.design:
+            raise ValueError("fixed_capacities needs design variables for the capacities")
+        constraints += [capacity == fixed_capacities[key] for key, capacity in v.capacities.items()]
+    return constraints
+
+
+# hour-to-hour mass flow through compression, storage and liquefaction
+def mass_balance(v):
+    storage_outflow = v.gh2_storage_outflow + v.fuel_cell_throughput if v.fuel_cell else v.gh2_storage_outflow
+    return [
+        v.electrolyser_throughput == v.compressor_throughput,
+        v.compressor_throughput == v.compressor_to_liquefaction + v.gh2_storage_inflow,
+        v.liquefacion_throughput == v.compressor_to_liquefaction + v.gh2_storage_outflow,
+        v.gh2_storage_level[1:v.T+1] == v.gh2_storage_level[0:v.T] + v.gh2_storage_inflow - storage_outflow,
+    ]
+
+
+# liquefaction ramp limits, with the on/off logic of a commitment mode (see
+# liquefaction_commitment); initial_throughput pins the first period. The
+# rows see the capacity per period and the ramp fractions per period.
+def ramp(v, plant, commitment=None, initial_throughput=None):
+    dt = v.dt_hours
+    v.commitment, constraints = liquefaction_commitment(
+        commitment, v.liquefacion_throughput, v.capacities["liquefaction_capacity_ph"] * dt,
+        plant.LIQUEFACTION_MAX_UP * dt, plant.LIQUEFACTION_MAX_DOWN * dt, v.T)
+    if initial_throughput is not None:
+        constraints += [v.liquefacion_throughput[0] == initial_throughput]
+    return constraints
+
+
+# gh2 storage: the level at level_index pinned to initial_level (None leaves
+# it free) and the storage on/off logic of `formulation` (None adds none).
+# Sets v.gh2_storage_active and v.storage_cycling_cost.
+def storage(v, formulation, initial_level=0, level_index=0):
+    constraints = []
+    if initial_level is not None:
+        constraints += [v.gh2_storage_level[level_index] == initial_level]
+    if formulation is not None:
+        v.gh2_storage_active, storage_constraints, v.storage_cycling_cost = gh2_storage_logic(
+            formulation, v.compressor_throughput, v.liquefacion_throughput,
+            v.gh2_storage_inflow, v.gh2_storage_outflow, v.T)
+        constraints += storage_constraints
+    return constraints
+
+
+# 'green' constraint; restrict amount that can be taken from grid:
+#   CO2 * (grid + grid_running_sum) <= GREEN_THRESHOLD * (h2 + h2_offtake_running_sum)
+#                                      + allowance + CO2 * slack
+# h2 defaults to the hydrogen produced (liquefied plus fuel cell feed); the
+# levelised cost model passes its fixed offtake instead
+def green_cap(v, plant, h2_offtake=None, grid_running_sum=0, h2_offtake_running_sum=0, allowance=0, slack=None):
+    if h2_offtake is None:
+        h2_offtake = cp.sum(v.liquefacion_throughput + v.fuel_cell_throughput) if v.fuel_cell \
+            else cp.sum(v.liquefacion_throughput)
+    grid = cp.sum(v.realtime_consumption) + grid_running_sum
+    budget = plant.GREEN_THRESHOLD_kg_per_kg * (h2_offtake + h2_offtake_running_sum) + allowance
+    if slack is not None:
+        budget = budget + plant.ERCTO_CO2_kg_per_kwh * slack
+    return [grid * plant.ERCTO_CO2_kg_per_kwh <= budget]
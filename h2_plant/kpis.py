@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+from h2_plant.objective import CAPEX_PARAMS
+from h2_plant.variables import CAPACITY_KEYS
+
+# Summary metrics (KPIs) of solved plant models, computed in one vectorized
+# pass over a structured array of the hourly results.
+#
+#   results = results_array(operations_df)                      # shape (T,)
+#   kpis = compute_kpis(results, facility, plant)                # floats
+#
+#   results = results_array([operations_df, ...])               # shape (N, T)
+#   kpis = compute_kpis(results, capacities, plants)             # arrays (N,)
+#
+# capacities (keyed as CAPACITY_KEYS; missing equipment counts as zero) and
+# plant may hold one value per run (arrays of shape (N,), e.g. columns of a
+# sweep table) or a single value for all runs; plant is a PlantParams or a
+# mapping of its fields, and KPIs of parameters it lacks are NaN.
+
+# hourly fields the KPIs are computed from; columns missing from an
+# operations table (no fuel cell in the levelised cost model) are zero
+RESULT_FIELDS = (
+    "hourly_dayahead_dol_per_kwh",
+    "realtime_production_kwh",
+    "realtime_supplied_kwh",
+    "solar_production_kwh",
+    "electrolyser_produced_kg",
+    "compressor_produced_kg",
+    "liquefaction_produced_kg",
+    "fuel_cell_consumed_kg",
+)
+RESULT_DTYPE = np.dtype([(name, np.float64) for name in RESULT_FIELDS])
+
+# throughput behind the capacity factor of each piece of equipment
+EQUIPMENT = dict(zip(CAPACITY_KEYS, ("electrolyser", "compression", "liquefaction", "fuelcell")))
+CAPACITY_FACTOR_FIELDS = dict(zip(CAPACITY_KEYS, (
+    "electrolyser_produced_kg", "compressor_produced_kg", "liquefaction_produced_kg", "fuel_cell_consumed_kg")))
+
+# KPIs reported in the facility summaries, in their order there
+SALES_KPIS = ("h2_sold", "h2_revenue", "solar_consumed", "solar_cost",
+              "wholesale_consumed", "wholesale_cost", "wholesale_supplied", "wholesale_revenue")
+CAPEX_KPIS = tuple(f"{equipment}_capex_annualised" for equipment in EQUIPMENT.values())
+CAPACITY_FACTOR_KPIS = tuple(f"{equipment}_capacity_factor" for equipment in EQUIPMENT.values())
+PER_KG_KPIS = ("opex_per_kg", "capex_per_kg", "lcoh_dol_per_kg", "carbon_intensity_kg_per_kg")
+
+
+# structured (T,) array of one operations table (DataFrame or dict of
+# columns), or (N, T) for a list of tables of equal length
+def results_array(operations):
+    if isinstance(operations, (list, tuple)):
+        return np.stack([results_array(table) for table in operations])
+    results = np.zeros(len(operations["liquefaction_produced_kg"]), dtype=RESULT_DTYPE)
+    for name in RESULT_FIELDS:
+        if name in operations:
+            results[name] = operations[name]
+    return results
+
+
+def _param(plant, name):
+    value = plant.get(name) if hasattr(plant, "get") else getattr(plant, name, None)
+    return np.nan if value is None else np.asarray(value, dtype=float)
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def compute_kpis(results, capacities, plant):
+    results = np.ascontiguousarray(results, dtype=RESULT_DTYPE)
+    F = len(RESULT_FIELDS)
+    values = results.view(np.float64).reshape(results.shape + (F,))
+    T = values.shape[-2]
+
+    # every hourly total and every price-weighted total in one pass each
+    totals = dict(zip(RESULT_FIELDS, np.moveaxis(values.sum(axis=-2), -1, 0)))
+    priced = dict(zip(RESULT_FIELDS, np.moveaxis(
+        np.einsum("...t,...tf->...f", values[..., 0], values), -1, 0)))
+
+    kpis = {
+        "h2_sold": totals["liquefaction_produced_kg"],
+        "h2_revenue": totals["liquefaction_produced_kg"] * _param(plant, "H2_SALES_PRICE_DOL_per_kg"),
+        "solar_consumed": totals["solar_production_kwh"],
+        "solar_cost": totals["solar_production_kwh"] * _param(plant, "SOLAR_PPA_DOL_KWH"),
+        "wholesale_consumed": totals["realtime_production_kwh"],
+        "wholesale_cost": priced["realtime_production_kwh"],
+        "wholesale_supplied": totals["realtime_supplied_kwh"],
+        "wholesale_revenue": priced["realtime_supplied_kwh"],
+    }
+    kpis["opex"] = kpis["wholesale_cost"] + kpis["solar_cost"]
+
+    # T periods of dt_hours (hourly without a dt_hours parameter)
+    dt_hours = np.nan_to_num(_param(plant, "dt_hours"), nan=1.0)
+
+    # multiply 24 to get nameplate capacity in kg per day
+    capex = 0
+    for key, equipment in EQUIPMENT.items():
+        capacity = np.asarray(capacities.get(key, 0), dtype=float)
+        annualised = capacity * 24 * _param(plant, CAPEX_PARAMS[key]) if np.any(capacity) else np.zeros_like(capacity)
+        kpis[f"{equipment}_capex_annualised"] = annualised
+        capex = capex + annualised
+        kpis[f"{equipment}_capacity_factor"] = _ratio(totals[CAPACITY_FACTOR_FIELDS[key]], capacity * T * dt_hours)
+    kpis["capex"] = capex
+
+    kpis["total_profit"] = kpis["h2_revenue"] + kpis["wholesale_revenue"] - kpis["opex"] - capex
+    kpis["opex_per_kg"] = _ratio(kpis["opex"], kpis["h2_sold"])
+    kpis["capex_per_kg"] = _ratio(capex, kpis["h2_sold"])
+    # levelised cost of the liquefied hydrogen, net of fuel cell sales
+    kpis["lcoh_dol_per_kg"] = _ratio(kpis["opex"] + capex - kpis["wholesale_revenue"], kpis["h2_sold"])
+    # grid CO2 per kg of hydrogen produced, as in the green constraint
+    kpis["carbon_intensity_kg_per_kg"] = _ratio(
+        kpis["wholesale_consumed"] * _param(plant, "ERCTO_CO2_kg_per_kwh"),
+        totals["liquefaction_produced_kg"] + totals["fuel_cell_consumed_kg"])
+
+    if results.ndim == 1:
+        return {name: float(value) for name, value in kpis.items()}
+    return {name: np.broadcast_to(value, results.shape[:-1]) for name, value in kpis.items()}
+
+
+# the KPIs `names` of a single run, e.g. for a facility summary
+def select_kpis(kpis, names):
+    return {name: kpis[name] for name in names}
+
+
+# KPIs of a batch of runs as a table, one row per run
+def kpi_frame(operations, capacities, plant):
+    return pd.DataFrame(compute_kpis(results_array(list(operations)), capacities, plant))
@@ -0,0 +1,64 @@
+import cvxpy as cp
+
+from h2_plant.constraints import capacity_limits, green_cap, mass_balance, power_balance, ramp, storage
+from h2_plant.objective import capex, electricity_cost, electricity_revenue, h2_revenue
+from h2_plant.variables import PlantVariables
+
+# The plant models as compositions of the constraint builders.
+
+# $ per kg CO2 above the green threshold in the dispatch model
+CI_SLACK_PENALTY_DOL = 100
+
+
+# annual sizing at minimum cost of supply (OPEX + CAPEX) for a fixed offtake
+def levelised_cost_model(plant, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, T,
+                         formulation="milp", fixed_capacities=None):
+    v = PlantVariables(T, fuel_cell=False, dt_hours=plant.dt_hours)
+    constraints = power_balance(v, plant, hourly_solar_production_kwh)
+    constraints += green_cap(v, plant, h2_offtake=plant.OFFTAKE_TPD * plant.NUM_DAYS)
+    constraints += capacity_limits(v, fixed_capacities)
+    constraints += ramp(v, plant)
+    constraints += storage(v, formulation)
+    constraints += mass_balance(v)
+
+    objective = electricity_cost(v, plant, hourly_dayahead_dol_per_kwh) + capex(v, plant) + v.storage_cycling_cost
+    return cp.Problem(cp.Minimize(objective), constraints), v
+
+
+# annual sizing at maximum profit from h2 sales and fuel cell electricity
+def profit_model(plant, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, T,
+                 formulation="milp", fixed_capacities=None):
+    v = PlantVariables(T, dt_hours=plant.dt_hours)
+    constraints = power_balance(v, plant, hourly_solar_production_kwh)
+    constraints += green_cap(v, plant)
+    constraints += capacity_limits(v, fixed_capacities)
+    constraints += ramp(v, plant)
+    constraints += storage(v, formulation)
+    constraints += mass_balance(v)
+
+    objective = -electricity_cost(v, plant, hourly_dayahead_dol_per_kwh) \
+        + electricity_revenue(v, hourly_dayahead_dol_per_kwh) + h2_revenue(v, plant) \
+        - capex(v, plant) - v.storage_cycling_cost
+    return cp.Problem(cp.Maximize(objective), constraints), v
+
+
+# dispatch of a rolling horizon window at given capacities (v built with
+# them), starting from `state` (the running sums, storage level and
+# liquefaction of the previously committed hour). Returns the constraints and
+# the objective without the storage on/off logic, which the caller adds with
+# storage(v, formulation, initial_level=None) and v.storage_cycling_cost.
+def dispatch_model(v, plant, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, state, commitment=None):
+    v.ci_slack = cp.Variable(nonneg = True)
+    constraints = power_balance(v, plant, hourly_solar_production_kwh)
+    constraints += green_cap(v, plant, grid_running_sum=state['grid_running_sum'],
+                             h2_offtake_running_sum=state['h2_offtake_running_sum'], slack=v.ci_slack)
+    constraints += capacity_limits(v)
+    constraints += ramp(v, plant, commitment, initial_throughput=state['liquefaction_produced_kg'])
+    # the first hour of the horizon is pinned to the previous state
+    constraints += storage(v, None, initial_level=state['gh2_storage_level_kg'], level_index=1)
+    constraints += mass_balance(v)
+
+    objective = -electricity_cost(v, plant, hourly_dayahead_dol_per_kwh) \
+        + electricity_revenue(v, hourly_dayahead_dol_per_kwh) + h2_revenue(v, plant) \
+        - CI_SLACK_PENALTY_DOL * v.ci_slack
+    return constraints, objective
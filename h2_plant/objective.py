@@ -0,0 +1,31 @@
+import cvxpy as cp
+
+from h2_plant.variables import CAPACITY_KEYS
+
+CAPEX_PARAMS = dict(zip(CAPACITY_KEYS, (
+    "ELECTROLYSIS_CAPEX_DOL_kgPD", "COMPRESSOR_CAPEX_DOL_kgPD", "LIQUEFACTION_CAPEX_DOL_kgPD", "FUELCELL_CAPEX_DOL_kgPD")))
+
+# Objective terms of the plant models, in $ over the modelled hours.
+
+
+# electricity bought from the dayahead market and the solar PPA
+def electricity_cost(v, plant, hourly_dayahead_dol_per_kwh):
+    return v.realtime_consumption @ hourly_dayahead_dol_per_kwh \
+        + cp.sum(plant.SOLAR_PPA_DOL_KWH * v.solar_consumed_facility)
+
+
+# fuel cell electricity sold at the dayahead price
+def electricity_revenue(v, hourly_dayahead_dol_per_kwh):
+    return v.realtime_supplied @ hourly_dayahead_dol_per_kwh
+
+
+# H2 SALES REVENUE
+def h2_revenue(v, plant):
+    return cp.sum(v.liquefacion_throughput) * plant.H2_SALES_PRICE_DOL_per_kg
+
+
+# annualised capex of the nameplate capacities; multiply 24 to get nameplate
+# capacity in kg per day
+def capex(v, plant):
+    return cp.sum([(capacity * 24) * getattr(plant, CAPEX_PARAMS[key]) for key, capacity in v.capacities.items()])
+
@@ -0,0 +1,45 @@
+from dataclasses import dataclass, fields
+
+# Scalar parameters of the hydrogen plant shared by the sizing and dispatch
+# models. Fields keep the argument names of the entry points, so a plant can
+# be built from their keyword arguments:
+#
+#   plant = PlantParams.from_mapping(named_arguments)
+#
+# Parameters a model does not use (fuel cell and sales price in the levelised
+# cost model, capex in dispatch) stay None.
+#
+# dt_hours is the length of a model period: the series are per period (kWh
+# and kg per period, $/kWh prices, the solar profile in kW per kW), the
+# capacities stay per hour and the ramp limits per hour of nameplate.
+
+
+@dataclass(frozen=True)
+class PlantParams:
+    SOLAR_CAPACITY: float
+    SOLAR_PPA_DOL_KWH: float
+    ELECTROLYSIS_EFFICIENCY: float
+    COMPRESSION_EFFICIENCY: float
+    LIQUEFACTION_EFFICIENCY: float
+    LIQUEFACTION_MAX_UP: float
+    LIQUEFACTION_MAX_DOWN: float
+    GREEN_THRESHOLD_kg_per_kg: float
+    ERCTO_CO2_kg_per_kwh: float
+    FUEL_CELL_EFFICIENCY: float = None
+    H2_SALES_PRICE_DOL_per_kg: float = None
+    OFFTAKE_TPD: float = None
+    NUM_DAYS: float = None
+    ELECTROLYSIS_CAPEX_DOL_kgPD: float = None
+    COMPRESSOR_CAPEX_DOL_kgPD: float = None
+    LIQUEFACTION_CAPEX_DOL_kgPD: float = None
+    FUELCELL_CAPEX_DOL_kgPD: float = None
+    dt_hours: float = 1.0
+
+    # the plant's fields out of a larger dict of arguments
+    @classmethod
+    def from_mapping(cls, values):
+        return cls(**{f.name: values[f.name] for f in fields(cls) if f.name in values})
+
+    @property
+    def has_fuel_cell(self):
+        return self.FUEL_CELL_EFFICIENCY is not None
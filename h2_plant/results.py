@@ -0,0 +1,29 @@
+# Solution columns of the plant models.
+
+
+# equipment consumption / production and storage columns of the
+# operations dataframes; `hours` selects the hours (all by default),
+# `levels` the storage levels reported with them (the same positions unless
+# given)
+def hourly_columns(v, plant, hours=None, levels=None):
+    hours = slice(0, v.T) if hours is None else hours
+    levels = hours if levels is None else levels
+    columns = {
+        "electrolyser_consumption_kwh": plant.ELECTROLYSIS_EFFICIENCY*v.electrolyser_throughput.value[hours],
+        "compressor_consumption_kwh": plant.COMPRESSION_EFFICIENCY*v.compressor_throughput.value[hours],
+        "liquefaction_consumption_kwh": plant.LIQUEFACTION_EFFICIENCY*v.liquefacion_throughput.value[hours],
+        "electrolyser_produced_kg": v.electrolyser_throughput.value[hours],
+        "compressor_produced_kg": v.compressor_throughput.value[hours],
+        "liquefaction_produced_kg": v.liquefacion_throughput.value[hours],
+        "compress_to_liquefaction": v.compressor_to_liquefaction.value[hours],
+    }
+    if v.fuel_cell:
+        columns["fuel_cell_consumed_kg"] = v.fuel_cell_throughput.value[hours]
+    columns.update({
+        "gh2_storage_level_kg": v.gh2_storage_level.value[levels],
+        "gh2_storage_net_inflow": v.gh2_storage_inflow.value[hours] - v.gh2_storage_outflow.value[hours],
+        "gh2_storge_inflow_kg": v.gh2_storage_inflow.value[hours],
+        "gh2_storage_outflow_kg": v.gh2_storage_outflow.value[hours],
+    })
+    return columns
+
@@ -0,0 +1,57 @@
+import cvxpy as cp
+
+# capacity keys of the facility summaries, in the order of the fuel cell plant
+CAPACITY_KEYS = ("electrolyser_capacity_ph", "compressor_capacity_ph", "liquefaction_capacity_ph", "fuelcell_capacity_ph")
+# hourly throughput bounded by each nameplate capacity
+CAPACITY_THROUGHPUT = {
+    "electrolyser_capacity_ph": "electrolyser_throughput",
+    "compressor_capacity_ph": "compressor_throughput",
+    "liquefaction_capacity_ph": "liquefacion_throughput",
+    "fuelcell_capacity_ph": "fuel_cell_throughput",
+}
+
+
+# Decision variables of T periods of dt_hours of plant operation (hours by
+# default). The nameplate capacities are design variables unless given
+# (numbers or cp.Parameters, keyed as CAPACITY_KEYS). The constraint builders attach the storage flags, the
+# storage cycling cost and the liquefaction commitment variables.
+class PlantVariables:
+
+    def __init__(self, T, fuel_cell=True, capacities=None, dt_hours=1.0):
+        self.T = T
+        self.dt_hours = dt_hours
+        self.fuel_cell = fuel_cell
+
+        self.realtime_consumption = cp.Variable(T, nonneg = True)
+        self.realtime_supplied = cp.Variable(T, nonneg = True) if fuel_cell else None
+        self.solar_consumed_facility = cp.Variable(T, nonneg = True)
+
+        #   Design decision variables, or the given nameplate capacities
+        keys = CAPACITY_KEYS if fuel_cell else CAPACITY_KEYS[0:3]
+        self.design = capacities is None
+        self.capacities = {key: cp.Variable(nonneg = True) if capacities is None else capacities[key]
+                           for key in keys}
+
+        # set throughput
+        self.electrolyser_throughput = cp.Variable(T, nonneg = True)
+        self.compressor_throughput = cp.Variable(T, nonneg = True)
+        self.compressor_to_liquefaction = cp.Variable(T, nonneg = True)
+        self.liquefacion_throughput = cp.Variable(T, nonneg = True)
+        self.fuel_cell_throughput = cp.Variable(T, nonneg = True) if fuel_cell else None
+
+        #   Operational decision variables
+        self.gh2_storage_inflow = cp.Variable(T, nonneg = True)
+        self.gh2_storage_outflow = cp.Variable(T, nonneg = True)
+        self.gh2_storage_level = cp.Variable(T+1, nonneg = True)
+
+        self.gh2_storage_active = None
+        self.storage_cycling_cost = 0
+        self.commitment = {}
+
+    def throughput(self, key):
+        return getattr(self, CAPACITY_THROUGHPUT[key])
+
+    # nameplate capacities as numbers, e.g. for the facility summary
+    def capacity_values(self):
+        return {key: capacity.value if isinstance(capacity, (cp.Variable, cp.Parameter)) else capacity
+                for key, capacity in self.capacities.items()}
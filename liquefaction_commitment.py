@@ -0,0 +1,116 @@
+import cvxpy as cp
+
+# On/off (unit commitment) logic of the liquefaction train for the rolling
+# horizon models. Both modes replace the plain ramp rows of the continuous
+# model with the operating rules of the Code_LeeKopijMyrick variant: a start
+# jumps straight to the minimum operating level, every other hour ramps by at
+# most LIQUEFACTION_MAX_UP / LIQUEFACTION_MAX_DOWN of nameplate, and the
+# train shuts down from at most LIQUEFACTION_MAX_DOWN of nameplate.
+#   None:     no commitment, liquefaction only ramp-limited
+#   "legacy": the variant's rows; integer state change with up/down booleans,
+#             linked to throughput by 1000-coefficient big-M rows. The variant
+#             puts the minimum operating level on the ramp
+#             (MIN_OP*cap*up <= x[t] - x[t-1]), which also forbids ramping down
+#             in every hour without a start; here it bounds the level x[t]
+#   "tight":  on / startup / shutdown binaries linked by
+#             on[t] - on[t-1] == startup[t] - shutdown[t]; throughput bounded
+#             by nameplate * on, start / stop capability rows
+#             x[t] <= cap*on[t] - (cap - start level)*startup[t], and the ramp
+#             rows widened by the start step, so every big-M is derived from
+#             the nameplate
+COMMITMENTS = (None, "legacy", "tight")
+
+# minimum operating level after a start, fraction of nameplate
+LIQUEFACTION_MIN_OPERATION = 0.3
+LEGACY_BIG_M = 1000
+# throughput below which the train counts as off in the "tight" mode, fraction
+# of nameplate (the legacy rows use an absolute 1/LEGACY_BIG_M kg)
+LIQUEFACTION_MIN_LOAD = 1e-3
+
+
+def check_commitment(commitment):
+    if commitment not in COMMITMENTS:
+        raise ValueError(f"commitment must be one of {COMMITMENTS}, got {commitment!r}")
+
+
+# ramp and on/off rows of the liquefaction throughput; returns the commitment
+# variables (empty for None) and the constraints
+def liquefaction_commitment(
+        commitment,
+        liquefacion_throughput,
+        liquefaction_nameplate_capacity_hour,
+        LIQUEFACTION_MAX_UP,
+        LIQUEFACTION_MAX_DOWN,
+        T):
+    check_commitment(commitment)
+    capacity = liquefaction_nameplate_capacity_hour
+    ramp = liquefacion_throughput[1:T] - liquefacion_throughput[0:T-1]
+
+    if commitment is None:
+        return {}, [
+            ramp <= LIQUEFACTION_MAX_UP*capacity,
+            -ramp <= LIQUEFACTION_MAX_DOWN*capacity,
+        ]
+
+    if commitment == "legacy":
+        liquefaction_on_off = cp.Variable(T, boolean=True)
+        liquefaction_state_change = cp.Variable(T, integer=True)
+        liquefaction_state_change_up = cp.Variable(T, boolean=True)
+        liquefaction_state_change_down = cp.Variable(T, boolean=True)
+        constraints = [
+            ramp <= LIQUEFACTION_MIN_OPERATION*capacity * liquefaction_state_change_up[1:T]
+                + LIQUEFACTION_MAX_UP*capacity * (liquefaction_on_off[1:T] - liquefaction_state_change_up[1:T]),
+            LIQUEFACTION_MIN_OPERATION*capacity * liquefaction_state_change_up[1:T] <= liquefacion_throughput[1:T],
+            -ramp <= LIQUEFACTION_MAX_DOWN*capacity,
+            liquefacion_throughput <= LEGACY_BIG_M*liquefaction_on_off,
+            liquefaction_on_off <= LEGACY_BIG_M*liquefacion_throughput,
+            liquefaction_state_change >= -1,
+            liquefaction_state_change <= 1,
+            liquefaction_on_off[1:T] - liquefaction_on_off[0:T-1] == liquefaction_state_change[1:T],
+            liquefaction_state_change <= liquefaction_state_change_up,
+            liquefaction_state_change >= 2*liquefaction_state_change_up - 1,
+            -liquefaction_state_change <= liquefaction_state_change_down,
+            -liquefaction_state_change >= 2*liquefaction_state_change_down - 1,
+        ]
+        return {
+            "liquefaction_on_off": liquefaction_on_off,
+            "liquefaction_startup": liquefaction_state_change_up,
+            "liquefaction_shutdown": liquefaction_state_change_down,
+        }, constraints
+
+    liquefaction_on_off = cp.Variable(T, boolean=True)
+    liquefaction_startup = cp.Variable(T, boolean=True)
+    liquefaction_shutdown = cp.Variable(T, boolean=True)
+    on = liquefaction_on_off
+    startup = liquefaction_startup[1:T]
+    shutdown = liquefaction_shutdown[1:T]
+    startup_level = LIQUEFACTION_MIN_OPERATION*capacity
+    shutdown_level = LIQUEFACTION_MAX_DOWN*capacity
+    constraints = [
+        # logical identities; startup / shutdown are implied for t >= 1 only
+        on[1:T] - on[0:T-1] == startup - shutdown,
+        liquefaction_startup + liquefaction_shutdown <= 1,
+        liquefaction_startup[0] == 0,
+        liquefaction_shutdown[0] == 0,
+        # capacity and minimum load, both scaled by nameplate
+        liquefacion_throughput <= capacity * on,
+        LIQUEFACTION_MIN_LOAD*capacity * on <= liquefacion_throughput,
+        # a start lands exactly on the minimum operating level, a shutdown
+        # leaves from at most MAX_DOWN of nameplate
+        startup_level * startup <= liquefacion_throughput[1:T],
+        liquefacion_throughput[1:T] <= capacity * on[1:T] - (capacity - startup_level) * startup,
+        liquefacion_throughput[0:T-1] <= capacity * on[0:T-1] - (capacity - shutdown_level) * shutdown,
+        # ramp limits of the running hours, widened by the start step
+        ramp <= LIQUEFACTION_MAX_UP*capacity * on[1:T] + (startup_level - LIQUEFACTION_MAX_UP*capacity) * startup,
+        -ramp <= LIQUEFACTION_MAX_DOWN*capacity * on[0:T-1],
+    ]
+    return {
+        "liquefaction_on_off": liquefaction_on_off,
+        "liquefaction_startup": liquefaction_startup,
+        "liquefaction_shutdown": liquefaction_shutdown,
+    }, constraints
+
+
+# hourly commitment columns for the operations dataframes
+def commitment_columns(variables, index=slice(None)):
+    return {name: variable.value[index] for name, variable in variables.items()}
@@ -0,0 +1,282 @@
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from time_alignment import align, canonical_hours, fill_gaps, local_offsets, resample, utc_offsets
+
+# Cached ERCOT price / solar ingestion.
+#
+# Each source CSV is parsed once into per-zone float32 .npy arrays on the
+# canonical hourly index of its year (see time_alignment; NaN where the source
+# has no row), stored under data/cache next to a manifest keyed on the source
+# file's mtime, size and SHA-1. Later loads memory-map the arrays, so
+#
+#   prices, solar = load_hourly('LZ_HOUSTON', 2019, start=0, hours=24*100)
+#
+# returns the $/kWh dayahead prices and the normalised solar profile the
+# optimisation functions expect without touching the CSVs again. With
+# dt_hours (e.g. 0.25) the series are on a grid of dt_hours periods: native
+# settlement-interval prices where INTERVAL_PRICE_SOURCES has them, else the
+# hourly prices held over each period, and the solar profile interpolated.
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT_DIR, "data", "cache")
+
+PRICE_SOURCES = {
+    ("dayahead", 2019): "2019_ercot_day_ahead_price.csv",
+    ("realtime", 2019): "2019_ercot_real_time_price.csv",
+    ("realtime", 2023): "20230101-20231231 ERCOT Real-time Price.csv",
+}
+
+# ERCOT settlement-interval prices (NP6-905 layout: Delivery Date, Delivery
+# Hour, Delivery Interval, Settlement Point Name, Settlement Point Price) by
+# (market, year): (file, intervals per hour)
+INTERVAL_PRICE_SOURCES = {}
+
+# Renewables.ninja profile; other years reuse the closest available profile
+SOLAR_SOURCES = {
+    2019: "solar_profile_29_-95.csv",
+}
+
+# ERCOT system-wide actual load (MW), all years in one file
+LOAD_SOURCE = "20140224-20231231 ERCOT Actual Load.csv"
+
+ERCOT_DATE_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+MANIFEST = "manifest.json"
+# bumped whenever the cached array layout changes
+CACHE_LAYOUT = 2
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+# a cache entry is fresh if the source's mtime and size are unchanged, or if
+# they changed but the content hash did not (e.g. after a fresh checkout, in
+# which case the entry's mtime and size are updated)
+def _is_fresh(path, entry, cache_dir):
+    if entry is None or entry.get("layout") != CACHE_LAYOUT:
+        return False
+    if not all(os.path.exists(os.path.join(cache_dir, f)) for f in entry["files"].values()):
+        return False
+    stat = os.stat(path)
+    if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return True
+    if entry["sha1"] == _file_hash(path):
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        return True
+    return False
+
+
+def parse_price_csv(path, year):
+    prices = pd.read_csv(path)
+    prices.columns = prices.columns.str.lower()
+    zones = prices["zone"].to_numpy()
+    offsets = local_offsets(pd.to_datetime(prices["date"], format=ERCOT_DATE_FORMAT), year, groups=zones)
+    values = prices["price"].to_numpy(dtype=np.float32)
+    n = canonical_hours(year)
+    return {
+        zone: align(offsets[zones == zone], values[zones == zone], n)[0]
+        for zone in np.unique(zones)
+    }
+
+
+# one row per settlement interval; offsets on the canonical index of
+# intervals_per_hour slots per hour
+def parse_interval_price_csv(path, year, intervals_per_hour=4):
+    prices = pd.read_csv(path)
+    prices.columns = prices.columns.str.lower()
+    zones = prices["settlement point name"].to_numpy()
+    interval = prices["delivery interval"].to_numpy(dtype=np.int64)
+    hour_start = (pd.to_datetime(prices["delivery date"], format="%m/%d/%Y")
+                  + pd.to_timedelta(prices["delivery hour"] - 1, unit="h"))
+    # each interval of a zone is its own hourly series for the fall-back repeat
+    hour_offsets = local_offsets(hour_start, year, groups=zones.astype(str) + "/" + interval.astype(str))
+    offsets = np.where(hour_offsets >= 0, hour_offsets * intervals_per_hour + interval - 1, -1)
+    values = prices["settlement point price"].to_numpy(dtype=np.float32)
+    n = canonical_hours(year) * intervals_per_hour
+    return {
+        zone: align(offsets[zones == zone], values[zones == zone], n)[0]
+        for zone in np.unique(zones)
+    }
+
+
+def parse_solar_csv(path, year):
+    solar = pd.read_csv(path, header=3, usecols=["time", "electricity"])
+    offsets = utc_offsets(pd.to_datetime(solar["time"], format="%Y-%m-%d %H:%M"), year)
+    return {"all": align(offsets, solar["electricity"].to_numpy(dtype=np.float32), canonical_hours(year))[0]}
+
+
+def parse_load_csv(path, year):
+    load = pd.read_csv(path)
+    times = pd.to_datetime(load["Date"], format=ERCOT_DATE_FORMAT)
+    in_year = (times.dt.year == year).to_numpy()
+    offsets = local_offsets(times[in_year], year)
+    return {"all": align(offsets, load["Load"].to_numpy(dtype=np.float32)[in_year], canonical_hours(year))[0]}
+
+
+# manifest entry of a source, parsing it into the cache if it is missing or stale
+def _cached_source(name, source_file, year, parse, cache_dir):
+    path = os.path.join(ROOT_DIR, source_file)
+    manifest = _read_manifest(cache_dir)
+    entry = manifest.get(name)
+    previous = dict(entry) if entry is not None else None
+    if _is_fresh(path, entry, cache_dir):
+        if entry != previous:
+            _write_manifest(cache_dir, manifest)
+        return entry
+
+    os.makedirs(cache_dir, exist_ok=True)
+    files = {}
+    for zone, hourly in parse(path, year).items():
+        files[zone] = f"{name}_{zone}.npy"
+        np.save(os.path.join(cache_dir, files[zone]), hourly)
+    stat = os.stat(path)
+    manifest[name] = {
+        "source": source_file,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": _file_hash(path),
+        "layout": CACHE_LAYOUT,
+        "files": files,
+    }
+    _write_manifest(cache_dir, manifest)
+    return manifest[name]
+
+
+def load_zone_prices(zone, year, market="dayahead", cache_dir=CACHE_DIR):
+    if (market, year) not in PRICE_SOURCES:
+        raise KeyError(f"no {market} price data for {year}; available: {sorted(PRICE_SOURCES)}")
+    name = f"{market}_{year}"
+    entry = _cached_source(name, PRICE_SOURCES[(market, year)], year, parse_price_csv, cache_dir)
+    if zone not in entry["files"]:
+        raise KeyError(f"zone {zone!r} not in {entry['source']}; available: {sorted(entry['files'])}")
+    return np.load(os.path.join(cache_dir, entry["files"][zone]), mmap_mode="r")
+
+
+def load_interval_prices(zone, year, market="realtime", cache_dir=CACHE_DIR):
+    if (market, year) not in INTERVAL_PRICE_SOURCES:
+        raise KeyError(f"no {market} interval price data for {year}; available: {sorted(INTERVAL_PRICE_SOURCES)}")
+    source_file, intervals_per_hour = INTERVAL_PRICE_SOURCES[(market, year)]
+    name = f"{market}_{year}_{intervals_per_hour}ph"
+    entry = _cached_source(name, source_file, year,
+                           functools.partial(parse_interval_price_csv, intervals_per_hour=intervals_per_hour),
+                           cache_dir)
+    if zone not in entry["files"]:
+        raise KeyError(f"zone {zone!r} not in {entry['source']}; available: {sorted(entry['files'])}")
+    return np.load(os.path.join(cache_dir, entry["files"][zone]), mmap_mode="r")
+
+
+# the zone's prices on a grid of dt_hours periods, NaN where the source has
+# no data: native intervals when the interval file matches dt_hours
+def _period_prices(zone, year, market, dt_hours, cache_dir):
+    source = INTERVAL_PRICE_SOURCES.get((market, year))
+    if source is not None and np.isclose(source[1] * dt_hours, 1):
+        return load_interval_prices(zone, year, market, cache_dir)
+    return resample(load_zone_prices(zone, year, market, cache_dir), dt_hours, "hold")
+
+
+def load_solar_profile(year, cache_dir=CACHE_DIR):
+    solar_year = min(SOLAR_SOURCES, key=lambda available: abs(available - year))
+    name = f"solar_{solar_year}"
+    entry = _cached_source(name, SOLAR_SOURCES[solar_year], solar_year, parse_solar_csv, cache_dir)
+    profile = np.load(os.path.join(cache_dir, entry["files"]["all"]), mmap_mode="r")
+    # align on hour of year, dropping Feb 29 / padding Dec 31 between leap and non-leap years
+    n = canonical_hours(year)
+    if len(profile) > n:
+        profile = profile[:n]
+    elif len(profile) < n:
+        profile = np.concatenate([profile, profile[len(profile) - n:]])
+    return profile
+
+
+# ERCOT system load (MW) on the year's canonical index, gaps filled with the
+# value of the same hour the day before
+def load_system_load(year, start=0, hours=None, cache_dir=CACHE_DIR):
+    entry = _cached_source(f"load_{year}", LOAD_SOURCE, year, parse_load_csv, cache_dir)
+    load = np.load(os.path.join(cache_dir, entry["files"]["all"]), mmap_mode="r")
+    stop = len(load) if hours is None else start + hours
+    if not 0 <= start < stop <= len(load):
+        raise ValueError(f"hours {start}..{stop} outside the {len(load)} hours of {year}")
+    return fill_gaps(load, period=24)[start:stop]
+
+
+def zones(year, market="dayahead", cache_dir=CACHE_DIR):
+    name = f"{market}_{year}"
+    entry = _cached_source(name, PRICE_SOURCES[(market, year)], year, parse_price_csv, cache_dir)
+    return sorted(entry["files"])
+
+
+# aligned series for [start, start + hours) of the year's canonical index,
+# with the gaps filled (prices carry the last value, solar the value of the
+# same hour the day before) and the masks of the filled slots. With dt_hours
+# start and hours count periods of dt_hours.
+def load_aligned(zone, year, start=0, hours=None, market="dayahead", cache_dir=CACHE_DIR, dt_hours=1.0):
+    prices = _period_prices(zone, year, market, dt_hours, cache_dir)
+    hourly_solar = load_solar_profile(year, cache_dir)
+    solar = resample(hourly_solar, dt_hours, "hold")
+    stop = len(prices) if hours is None else start + hours
+    if not 0 <= start < stop <= len(prices):
+        raise ValueError(f"periods {start}..{stop} outside the {len(prices)} periods of {year}")
+
+    solar_filled = resample(fill_gaps(hourly_solar, period=24), dt_hours, "linear")
+    return {
+        #   GRID: convert $/MWh -> $/kWh
+        "hourly_dayahead_dol_per_kwh": fill_gaps(prices)[start:stop] / 1000,
+        #   SOLAR: normalised profile (kW per kW of capacity)
+        "hourly_solar_production_kwh": solar_filled[start:stop] / solar_filled.max(),
+        "price_gap": np.isnan(prices[start:stop]),
+        "solar_gap": np.isnan(solar[start:stop]),
+    }
+
+
+# load_aligned for every zone of the price file at once: the cached zone
+# arrays are stacked into a zones x hours matrix (one row per zone, in the
+# order of zone_names, all zones by default) that shares one solar profile
+def load_zone_matrix(year, start=0, hours=None, market="dayahead", zone_names=None, cache_dir=CACHE_DIR):
+    zone_names = zones(year, market, cache_dir) if zone_names is None else list(zone_names)
+    prices = np.stack([load_zone_prices(zone, year, market, cache_dir) for zone in zone_names])
+    solar = load_solar_profile(year, cache_dir)
+    stop = prices.shape[1] if hours is None else start + hours
+    if not 0 <= start < stop <= prices.shape[1]:
+        raise ValueError(f"hours {start}..{stop} outside the {prices.shape[1]} hours of {year}")
+
+    solar_filled = fill_gaps(solar, period=24)
+    return {
+        "zones": zone_names,
+        #   GRID: convert $/MWh -> $/kWh
+        "hourly_dayahead_dol_per_kwh": np.stack([fill_gaps(row) for row in prices])[:, start:stop] / 1000,
+        #   SOLAR: normalised profile (kW per kW of capacity)
+        "hourly_solar_production_kwh": solar_filled[start:stop] / solar_filled.max(),
+        "price_gap": np.isnan(prices[:, start:stop]),
+        "solar_gap": np.isnan(solar[start:stop]),
+    }
+
+
+def load_hourly(zone, year, start=0, hours=None, market="dayahead", cache_dir=CACHE_DIR, dt_hours=1.0):
+    aligned = load_aligned(zone, year, start, hours, market, cache_dir, dt_hours)
+    return aligned["hourly_dayahead_dol_per_kwh"], aligned["hourly_solar_production_kwh"]
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+
+from h2_plant import CAPACITY_KEYS, PlantParams, kpi_frame
+from rolling_horizon_optimisation import INITIAL_STATE
+from storage_formulation import INTEGRALITY_TOLERANCE
+
+# Merit-order dispatch heuristic for fixed capacities, in NumPy only.
+#
+#   operations_df = merit_order_dispatch(prices, solar, facility, plant)
+#   kpis = screen_designs(designs, prices, solar, plant)
+#
+# Hours are ranked in merit order: most solar available first (the green
+# threshold leaves little grid power per kg), the rest by dayahead price.
+# Liquefaction runs at capacity in the first n hours of that order, shaped to
+# the ramp limits (the largest ramp-feasible profile under that target,
+# starting from the previous hour); the electrolyser and compressor fill the
+# same hours first until they cover it, and the fuel cell runs in the hours
+# where its electricity is worth more than the liquefied kg. One sequential
+# repair (as cumulative minima) adds production where the storage would run
+# empty and limits the fuel cell to the gas in storage. n is bisected down
+# from the hours where liquefied hydrogen is profitable until the green
+# threshold budget holds, so the dispatch is feasible for the
+# continuous-ramp model (commitment=None) and can seed the exact solver
+# through set_warm_start. On the notebook plant its operating margin is
+# within 20-30% of the LP dispatch of the same design.
+
+def _capacity(capacities, key):
+    value = capacities.get(key)
+    return 0.0 if value is None else float(value)
+
+
+# the largest profile under `target` that moves by at most `up` / `down` a
+# period, starting at `previous` (free if None): a forward and a backward
+# pass of cumulative minima
+def _ramped(target, previous, up, down):
+    hours = np.arange(len(target))
+    if previous is not None:
+        target = np.concatenate([[previous], target[1:]])
+    profile = up * hours + np.minimum.accumulate(target - up * hours)
+    profile = np.minimum.accumulate((profile + down * hours)[::-1])[::-1] - down * hours
+    if previous is not None:
+        # the pinned first hour can only ramp down so fast
+        profile = np.maximum(profile, previous - down * hours)
+    return np.maximum(profile, 0)
+
+
+# hourly dispatch with liquefaction in the first `hours_liquefying` hours of
+# the merit order
+def _dispatch(hours_liquefying, liquefaction_target, liquefaction_capacity, fuel_cell_desired, order, production_max,
+              plant, prices, solar_available, state):
+    T = len(prices)
+    # the first hour is pinned to the previous one, as in the rolling horizon;
+    # liquefaction_target is per period, the ramp fractions per hour
+    target = np.zeros(T)
+    target[order[:hours_liquefying]] = liquefaction_target
+    ramp = plant.dt_hours * liquefaction_capacity
+    liquefaction = _ramped(target, state["liquefaction_produced_kg"], plant.LIQUEFACTION_MAX_UP * ramp,
+                           plant.LIQUEFACTION_MAX_DOWN * ramp)
+    level0 = state["gh2_storage_level_kg"]
+
+    # on the solar left over from liquefaction as soon as it shines (the
+    # storage carries it to the hours that liquefy), then at full production
+    # in merit order, until the kg are covered
+    needed = max(liquefaction.sum() + fuel_cell_desired.sum() - level0, 0.0)
+    production_kwh_per_kg = plant.ELECTROLYSIS_EFFICIENCY + plant.COMPRESSION_EFFICIENCY
+    on_solar = np.clip((solar_available - plant.LIQUEFACTION_EFFICIENCY * liquefaction) / production_kwh_per_kg,
+                       0, production_max)
+    production = np.diff(np.minimum(np.cumsum(on_solar), needed), prepend=0.0)
+    room = (production_max - production)[order]
+    production[order] += np.clip(needed - production.sum() - (np.cumsum(room) - room), 0, room)
+
+    # produce more where the storage would run empty; the deficit only
+    # grows by the liquefaction of the hour, at most production_max
+    level = level0 + np.cumsum(production - liquefaction)
+    deficit = np.maximum.accumulate(np.maximum(-level, 0))
+    production = np.minimum(production + np.diff(deficit, prepend=0.0), production_max)
+
+    # fuel cell in chronological order, within the gas left in storage at
+    # every later hour: F[t] = D[t] + min(0, min_{k<=t} (m[k] - D[k]))
+    level = level0 + np.cumsum(production - liquefaction)
+    headroom = np.minimum.accumulate(level[::-1])[::-1]
+    wanted = np.cumsum(fuel_cell_desired)
+    drawn = wanted + np.minimum(np.minimum.accumulate(headroom - wanted), 0)
+    fuel_cell = np.maximum(np.diff(drawn, prepend=0.0), 0)
+
+    load = (plant.ELECTROLYSIS_EFFICIENCY + plant.COMPRESSION_EFFICIENCY) * production \
+        + plant.LIQUEFACTION_EFFICIENCY * liquefaction
+    solar = np.minimum(load, solar_available)
+    return production, liquefaction, fuel_cell, solar, load - solar
+
+
+def merit_order_dispatch(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, capacities, plant, state=None):
+    plant = plant if isinstance(plant, PlantParams) else PlantParams.from_mapping(plant)
+    prices = np.asarray(hourly_dayahead_dol_per_kwh, dtype=float)
+    solar_profile = np.asarray(hourly_solar_production_kwh, dtype=float)
+    # without a state the first hour is free of ramp limits, as in the annual models
+    state = {**INITIAL_STATE, "liquefaction_produced_kg": None, **(state or {})}
+    T = len(prices)
+
+    electrolyser, compressor, liquefaction_capacity, fuelcell = (_capacity(capacities, key) for key in CAPACITY_KEYS)
+    if not plant.has_fuel_cell:
+        fuelcell = 0.0
+    # capacities per period of dt_hours
+    dt = plant.dt_hours
+    electrolyser, compressor, liquefaction_capacity, fuelcell = (capacity * dt for capacity in (
+        electrolyser, compressor, liquefaction_capacity, fuelcell))
+    production_max = min(electrolyser, compressor)
+    production_kwh_per_kg = plant.ELECTROLYSIS_EFFICIENCY + plant.COMPRESSION_EFFICIENCY
+    solar_available = plant.SOLAR_CAPACITY * dt * solar_profile
+
+    # effective $/kWh of each hour at full load
+    full_load = production_kwh_per_kg * production_max + plant.LIQUEFACTION_EFFICIENCY * liquefaction_capacity
+    solar_share = np.clip(solar_available / full_load, 0, 1) if full_load > 0 else np.ones(T)
+    effective_price = solar_share * plant.SOLAR_PPA_DOL_KWH + (1 - solar_share) * prices
+    order = np.lexsort((prices, -solar_available))
+
+    # a kg is worth its sales price less liquefaction at the average cost;
+    # the fuel cell runs where its electricity is worth more
+    kg_value = plant.H2_SALES_PRICE_DOL_per_kg - plant.LIQUEFACTION_EFFICIENCY * effective_price.mean()
+    kg_cost = production_kwh_per_kg * effective_price
+    fuel_cell_desired = np.where(
+        (plant.FUEL_CELL_EFFICIENCY or 0) * prices > kg_value, fuelcell, 0.0) if fuelcell > 0 else np.zeros(T)
+    # liquefaction that production can keep up with hour by hour, in the
+    # hours where a kg costs less than it is worth
+    liquefaction_target = min(liquefaction_capacity, production_max)
+    profitable_hours = np.count_nonzero(kg_cost < kg_value)
+
+    def green_excess(dispatch):
+        production, liquefaction, fuel_cell, solar, grid = dispatch
+        return plant.ERCTO_CO2_kg_per_kwh * (grid.sum() + state["grid_running_sum"]) \
+            - plant.GREEN_THRESHOLD_kg_per_kg * (liquefaction.sum() + fuel_cell.sum() + state["h2_offtake_running_sum"])
+
+    arguments = (liquefaction_target, liquefaction_capacity, fuel_cell_desired, order, production_max, plant, prices,
+                 solar_available, state)
+    dispatch = _dispatch(profitable_hours, *arguments)
+    if green_excess(dispatch) > 0:
+        # bisect the liquefaction hours for the green budget
+        low, high = 0, profitable_hours
+        while high - low > 1:
+            middle = (low + high) // 2
+            if green_excess(_dispatch(middle, *arguments)) > 0:
+                high = middle
+            else:
+                low = middle
+        dispatch = _dispatch(low, *arguments)
+    production, liquefaction, fuel_cell, solar, grid = dispatch
+
+    inflow = np.maximum(production - liquefaction, 0)
+    outflow = np.maximum(liquefaction - production, 0)
+    level = state["gh2_storage_level_kg"] + np.cumsum(inflow - outflow - fuel_cell)
+    return pd.DataFrame({
+        "hourly_dayahead_dol_per_kwh": prices,
+        "realtime_production_kwh": grid,
+        "realtime_supplied_kwh": (plant.FUEL_CELL_EFFICIENCY or 0) * fuel_cell,
+        "solar_available_kwh": solar_profile,
+        "solar_production_kwh": solar,
+        "grid_running_sum": state["grid_running_sum"],
+        "h2_offtake_running_sum": state["h2_offtake_running_sum"],
+        "electrolyser_consumption_kwh": plant.ELECTROLYSIS_EFFICIENCY * production,
+        "compressor_consumption_kwh": plant.COMPRESSION_EFFICIENCY * production,
+        "liquefaction_consumption_kwh": plant.LIQUEFACTION_EFFICIENCY * liquefaction,
+        "electrolyser_produced_kg": production,
+        "compressor_produced_kg": production,
+        "liquefaction_produced_kg": liquefaction,
+        "compress_to_liquefaction": np.minimum(production, liquefaction),
+        "fuel_cell_consumed_kg": fuel_cell,
+        # level at the start of each hour
+        "gh2_storage_level_kg": np.concatenate([[state["gh2_storage_level_kg"]], level[:-1]]),
+        "gh2_storage_net_inflow": inflow - outflow,
+        "gh2_storge_inflow_kg": inflow,
+        "gh2_storage_outflow_kg": outflow,
+        "ci_slack": max(green_excess(dispatch), 0) / plant.ERCTO_CO2_kg_per_kwh,
+    })
+
+
+# start the variables of an annual model (v from levelised_cost_model /
+# profit_model) at a heuristic dispatch, and its design variables at
+# `capacities`; solve with warm_start=True to use it as the incumbent
+def set_warm_start(v, operations_df, capacities=None):
+    production = operations_df["electrolyser_produced_kg"].to_numpy()
+    liquefaction = operations_df["liquefaction_produced_kg"].to_numpy()
+    inflow = operations_df["gh2_storge_inflow_kg"].to_numpy()
+    outflow = operations_df["gh2_storage_outflow_kg"].to_numpy()
+    fuel_cell = operations_df["fuel_cell_consumed_kg"].to_numpy()
+    level = operations_df["gh2_storage_level_kg"].to_numpy()
+
+    v.realtime_consumption.value = operations_df["realtime_production_kwh"].to_numpy()
+    v.solar_consumed_facility.value = operations_df["solar_production_kwh"].to_numpy()
+    v.electrolyser_throughput.value = production
+    v.compressor_throughput.value = production
+    v.compressor_to_liquefaction.value = operations_df["compress_to_liquefaction"].to_numpy()
+    v.liquefacion_throughput.value = liquefaction
+    v.gh2_storage_inflow.value = inflow
+    v.gh2_storage_outflow.value = outflow
+    v.gh2_storage_level.value = np.append(level, level[-1] + inflow[-1] - outflow[-1] - fuel_cell[-1])
+    if v.fuel_cell:
+        v.fuel_cell_throughput.value = fuel_cell
+        v.realtime_supplied.value = operations_df["realtime_supplied_kwh"].to_numpy()
+    if v.gh2_storage_active is not None:
+        v.gh2_storage_active.value = ((production - liquefaction > INTEGRALITY_TOLERANCE)
+                                      | (inflow > INTEGRALITY_TOLERANCE)
+                                      | (outflow > INTEGRALITY_TOLERANCE)).astype(float)
+    if v.design and capacities is not None:
+        for key, capacity in v.capacities.items():
+            capacity.value = _capacity(capacities, key)
+
+
+# KPIs of many candidate designs (a DataFrame or list of facility
+# summaries with the *_capacity_ph keys) under the heuristic dispatch, one
+# row per design
+def screen_designs(designs, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, plant):
+    plant = plant if isinstance(plant, PlantParams) else PlantParams.from_mapping(plant)
+    designs = pd.DataFrame(designs).reset_index(drop=True)
+    operations = [merit_order_dispatch(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, design, plant)
+                  for design in designs.to_dict("records")]
+    return pd.concat([designs, kpi_frame(operations, designs, plant)], axis=1)
@@ -0,0 +1,115 @@
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from annual_profit_optimisation import run_profit_maximisation
+from shared_arrays import attach_arrays, attached, release, share_arrays
+
+# Parallel parameter sweep of run_profit_maximisation.
+#
+#   results = sweep(base_params, {
+#       "H2_SALES_PRICE_DOL_per_kg": [2.0, 3.0, 4.0],
+#       "SOLAR_CAPACITY": [200, 400],
+#   }, workers=8)
+#
+# base_params holds every run_profit_maximisation argument by name. Array
+# arguments (the hourly price and solar series) are copied once into shared
+# memory (shared_arrays) and attached read-only by each worker instead of
+# being pickled with every case. Each finished case's facility summary is streamed into one
+# results table (optionally appended to a CSV as cases complete). With a
+# ResultsStore, each case's hourly operations are appended to the store
+# instead of being written as one CSV and one JSON file per case. With a
+# SolveCache, cases solved before (same arguments) are read from the cache.
+# A case that raises does not stop the sweep: its row has status "error"
+# and the exception in the error column.
+
+def _run_case(case_index, scalar_params, overrides, out_dir, store, cache):
+    params = {**scalar_params, **attached, **overrides}
+    solve = run_profit_maximisation if cache is None else cache.wrap(run_profit_maximisation)
+    problem, operations_df, facility = solve(**params)
+
+    # the worker writes the hourly columns; the parent records the run
+    run = None
+    if store is not None:
+        run = store.write_run(operations_df, params, facility)
+
+    if out_dir is not None:
+        operations_df.to_csv(os.path.join(out_dir, f'operations_results_{case_index}.csv'))
+        with open(os.path.join(out_dir, f'facility_summary_results_{case_index}.json'), 'w') as file:
+            json.dump(facility, file, indent=4, default=float)
+
+    row = {"case": case_index, **overrides, "status": problem.status}
+    row.update({key: value for key, value in facility.items() if np.isscalar(value) or value is None})
+    if run is not None:
+        row["run_id"] = run["run_id"]
+    return row, run
+
+
+def _error_row(case_index, overrides, error):
+    return {"case": case_index, **overrides, "status": "error", "error": f"{type(error).__name__}: {error}"}
+
+
+# append one row to the results CSV; a row with columns the file does not
+# have yet (e.g. the first solved case after failed ones) rewrites it with
+# the union of the columns
+def _append_row(path, row):
+    row = pd.DataFrame([row])
+    if not os.path.exists(path):
+        row.to_csv(path, index=False)
+        return
+    columns = pd.read_csv(path, nrows=0).columns
+    if set(row.columns) <= set(columns):
+        row.reindex(columns=columns).to_csv(path, mode="a", index=False, header=False)
+    else:
+        pd.concat([pd.read_csv(path), row]).to_csv(path, index=False)
+
+
+def sweep_cases(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def sweep(base_params, grid, workers=None, results_path=None, out_dir=None, store=None, cache=None):
+    cases = sweep_cases(grid)
+    workers = workers or os.cpu_count()
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    rows = []
+
+    def collect(row, run):
+        rows.append(row)
+        if run is not None:
+            store.record(run)
+        if results_path is not None:
+            _append_row(results_path, row)
+
+    # serial in-process run, e.g. for debugging a single case
+    if workers == 1:
+        for case_index, overrides in enumerate(cases):
+            try:
+                collect(*_run_case(case_index, base_params, overrides, out_dir, store, cache))
+            except Exception as error:
+                collect(_error_row(case_index, overrides, error), None)
+        return pd.DataFrame(rows)
+
+    blocks, descriptors = share_arrays(base_params)
+    scalar_params = {name: value for name, value in base_params.items() if name not in descriptors}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_arrays,
+                                 initargs=(descriptors,)) as executor:
+            futures = {executor.submit(_run_case, case_index, scalar_params, overrides, out_dir, store, cache):
+                       (case_index, overrides) for case_index, overrides in enumerate(cases)}
+            for future in as_completed(futures):
+                try:
+                    collect(*future.result())
+                except Exception as error:
+                    collect(_error_row(*futures[future], error), None)
+    finally:
+        release(blocks)
+
+    return pd.DataFrame(rows).sort_values("case").reset_index(drop=True)
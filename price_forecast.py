@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+import scipy.linalg
+
+from h2_plant import compute_kpis, results_array
+from rolling_horizon_optimisation import simulate_rolling_horizon
+
+# Price forecasts for the rolling horizon simulation, instead of the
+# realised prices (perfect foresight).
+#
+#   forecaster = RidgeForecaster().fit(prices[:train], load[:train])
+#   forecast = forecaster.forecast(prices, horizon=24, load=load)
+#   operations_df = simulate_rolling_horizon(prices, solar, facility, horizon=24,
+#                                            price_forecast=forecast, **plant)
+#   report = backtest({"naive": SeasonalNaive(), "ridge": RidgeForecaster()},
+#                     prices, solar, facility, plant, load=load)
+#
+# Every forecaster has fit(prices, load=None) on a history and
+# forecast(prices, horizon, load=None), which returns the (N, horizon)
+# lookahead vectors of all hours at once: row t holds the realised price of
+# hour t and the forecasts of hours t+1 .. t+horizon-1 from what is known at
+# hour t (prices and load up to t). The regression forecasters are built
+# for one horizon (their horizon argument) and are direct multi-horizon
+# models, one coefficient vector per lead fitted in a single solve, so the
+# forecasts of a whole year are one matrix product.
+
+HOURS_PER_DAY = 24
+
+
+# (N, horizon) index matrix of hours t + j
+def _targets(N, horizon):
+    return np.arange(N)[:, None] + np.arange(horizon)[None, :]
+
+
+# the realised prices of every window, the series' last price beyond its end
+class PerfectForesight:
+
+    def fit(self, prices, load=None):
+        return self
+
+    def forecast(self, prices, horizon, load=None):
+        prices = np.asarray(prices, dtype=float)
+        return prices[np.minimum(_targets(len(prices), horizon), len(prices) - 1)]
+
+
+# the last observed price at the same hour of the period (24: yesterday's,
+# 168: last week's)
+class SeasonalNaive:
+
+    def __init__(self, period=HOURS_PER_DAY):
+        self.period = period
+
+    def fit(self, prices, load=None):
+        return self
+
+    def forecast(self, prices, horizon, load=None):
+        prices = np.asarray(prices, dtype=float)
+        lead = np.arange(horizon)
+        back = self.period * -(-lead // self.period)
+        return prices[np.maximum(_targets(len(prices), horizon) - back, 0)]
+
+
+# regression of the next horizon - 1 prices on the prices and load at fixed
+# lags before the forecast hour and its hour of day / day of week
+class _LagRegression:
+
+    def __init__(self, price_lags, load_lags, hour_encoding):
+        self.price_lags = np.asarray(price_lags)
+        self.load_lags = np.asarray(load_lags)
+        self.hour_encoding = hour_encoding
+
+    def features(self, prices, load):
+        N = len(prices)
+        t = np.arange(N)
+        columns = [prices[np.maximum(t[:, None] - self.price_lags, 0)]]
+        if load is not None:
+            columns.append(np.asarray(load, dtype=float)[np.maximum(t[:, None] - self.load_lags, 0)])
+        hour, day = t % HOURS_PER_DAY, (t // HOURS_PER_DAY) % 7
+        columns.append(np.column_stack([np.sin(2 * np.pi * hour / HOURS_PER_DAY),
+                                        np.cos(2 * np.pi * hour / HOURS_PER_DAY),
+                                        np.sin(2 * np.pi * day / 7), np.cos(2 * np.pi * day / 7)]))
+        X = np.hstack(columns)
+        if self.hour_encoding == "onehot":
+            X = np.hstack([X, np.eye(HOURS_PER_DAY)[hour]])
+        return X
+
+    # training rows: every hour with all its lags and all horizon-1 leads observed
+    def fit(self, prices, load=None):
+        prices = np.asarray(prices, dtype=float)
+        self.uses_load = load is not None
+        X = self.features(prices, load)
+        first = int(max(self.price_lags.max(), self.load_lags.max() if self.uses_load else 0))
+        rows = np.arange(first, len(prices) - self.horizon + 1)
+        Y = prices[rows[:, None] + np.arange(1, self.horizon)[None, :]]
+        self.mean = X[rows].mean(axis=0)
+        scale = X[rows].std(axis=0)
+        self.scale = np.where(scale > 0, scale, 1)
+        self.target_mean = Y.mean(axis=0)
+        self.fit_standardised((X[rows] - self.mean) / self.scale, Y - self.target_mean)
+        return self
+
+    def forecast(self, prices, horizon, load=None):
+        if horizon != self.horizon:
+            raise ValueError(f"fitted for horizon {self.horizon}, got {horizon}")
+        if self.uses_load != (load is not None):
+            raise ValueError("forecast needs the load exactly when fit was given it")
+        prices = np.asarray(prices, dtype=float)
+        X = (self.features(prices, load) - self.mean) / self.scale
+        return np.column_stack([prices, self.predict_standardised(X) + self.target_mean])
+
+
+class RidgeForecaster(_LagRegression):
+
+    def __init__(self, horizon=24, lambda_=1.0, price_lags=(0, 1, 2, 23, 167), load_lags=(0, 1, 23)):
+        super().__init__(price_lags, load_lags, hour_encoding="onehot")
+        self.horizon = horizon
+        self.lambda_ = lambda_
+
+    def fit_standardised(self, X, Y):
+        gram = X.T @ X
+        gram[np.diag_indices_from(gram)] += self.lambda_
+        self.coefficients = scipy.linalg.cho_solve(scipy.linalg.cho_factor(gram), X.T @ Y)
+
+    def predict_standardised(self, X):
+        return X @ self.coefficients
+
+
+# any regressor with fit(x, Y) / predict(x) on 2-D targets, e.g. the
+# Homework6 kernel models (KernelRidge, NystroemRidge, RandomFourierRidge)
+class KernelForecaster(_LagRegression):
+
+    def __init__(self, model, horizon=24, price_lags=(0, 1, 23, 167), load_lags=(0, 23)):
+        super().__init__(price_lags, load_lags, hour_encoding="cyclic")
+        self.model = model
+        self.horizon = horizon
+
+    def fit_standardised(self, X, Y):
+        self.model.fit(X, Y)
+
+    def predict_standardised(self, X):
+        return self.model.predict(X)
+
+
+# error of the forecasts of hours t+1 .. t+horizon-1 within the series
+def forecast_errors(forecast, prices):
+    prices = np.asarray(prices, dtype=float)
+    targets = _targets(len(prices), forecast.shape[1])[:, 1:]
+    observed = targets < len(prices)
+    error = forecast[:, 1:][observed] - prices[targets[observed]]
+    return {"mae": np.abs(error).mean(), "rmse": np.sqrt((error**2).mean()), "bias": error.mean()}
+
+
+# each forecaster fitted on the first train_hours and the rest of the series
+# dispatched on its forecasts; one row per forecaster with the forecast
+# error and the operating profit (realised prices, before capex) against
+# perfect foresight. plant holds the RollingHorizonModel arguments.
+def backtest(forecasters, prices, solar, capacities, plant, horizon=24, train_hours=24*90, load=None, commit=1,
+             **simulate_kwargs):
+    prices = np.asarray(prices, dtype=float)
+    solar = np.asarray(solar, dtype=float)
+    test = slice(train_hours, len(prices))
+    forecasters = {"perfect": PerfectForesight(), **forecasters}
+
+    rows = []
+    for name, forecaster in forecasters.items():
+        forecaster.fit(prices[:train_hours], None if load is None else load[:train_hours])
+        # forecast over the whole series, so the first test hours have their lags
+        forecast = forecaster.forecast(prices, horizon, load)[test]
+        operations_df = simulate_rolling_horizon(prices[test], solar[test], capacities, horizon=horizon,
+                                                 commit=commit, price_forecast=forecast, **plant,
+                                                 **simulate_kwargs)
+        kpis = compute_kpis(results_array(operations_df), capacities, plant)
+        rows.append({
+            "forecaster": name,
+            **forecast_errors(forecast, prices[test]),
+            "operating_profit": kpis["h2_revenue"] + kpis["wholesale_revenue"] - kpis["opex"],
+            "h2_sold": kpis["h2_sold"],
+            "fallback_hours": int(operations_df["fallback"].sum()),
+        })
+
+    report = pd.DataFrame(rows)
+    perfect = report["operating_profit"].iloc[0]
+    report["profit_loss"] = perfect - report["operating_profit"]
+    report["profit_loss_pct"] = 100 * report["profit_loss"] / abs(perfect) if perfect else np.nan
+    return report
@@ -0,0 +1,392 @@
+import time
+
+import numpy as np
+import pandas as pd
+import cvxpy as cp
+
+from solver_config import solve_problem, solve_stats
+from storage_formulation import check_formulation, gh2_storage_logic, solve_auto
+
+# Representative-day aggregation for capacity sizing.
+#
+# The daily price / solar profiles of the horizon are clustered into k
+# representative days (medoids) weighted by the number of days they stand
+# for. The sizing model is then solved on k*24 hours instead of T:
+#   - hourly constraints (power balance, equipment bounds, ramps within the
+#     day) hold on every representative hour
+#   - energy, revenue and the green cap are weighted sums over the days
+#   - gh2 storage is linked across the real calendar: every representative
+#     day has an intra-day level relative to its start, and an inter-day
+#     state of charge S[d] steps through the original day sequence,
+#     S[d+1] = S[d] + (end-of-day level of the day d is mapped to), with the
+#     absolute level S[d] + intra-day level kept nonnegative
+# The chosen capacities can be checked against the full-resolution dispatch
+# with validate_capacities / representative_day_report.
+
+HOURS_PER_DAY = 24
+
+
+def daily_profiles(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh):
+    prices = np.asarray(hourly_dayahead_dol_per_kwh, dtype=float)
+    solar = np.asarray(hourly_solar_production_kwh, dtype=float)
+    num_days = len(prices) // HOURS_PER_DAY
+    hours = num_days * HOURS_PER_DAY
+    return prices[:hours].reshape(num_days, HOURS_PER_DAY), solar[:hours].reshape(num_days, HOURS_PER_DAY)
+
+
+# clustering features: standardised price profile next to the solar profile
+def day_features(price_days, solar_days):
+    price_scale = price_days.std() or 1.0
+    solar_scale = solar_days.std() or 1.0
+    return np.hstack([(price_days - price_days.mean()) / price_scale,
+                      (solar_days - solar_days.mean()) / solar_scale])
+
+
+def pairwise_distances(features):
+    squared = (features ** 2).sum(axis=1)
+    distances = squared[:, None] + squared[None, :] - 2 * features @ features.T
+    return np.sqrt(np.maximum(distances, 0))
+
+
+def kmedoids(distances, k, seed=0, max_iter=100):
+    n = len(distances)
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on the precomputed distances
+    medoids = [int(rng.integers(n))]
+    for _ in range(1, k):
+        nearest = distances[:, medoids].min(axis=1) ** 2
+        p = nearest / nearest.sum() if nearest.sum() > 0 else None
+        medoids.append(int(rng.choice(n, p=p)))
+    medoids = np.array(medoids)
+
+    for _ in range(max_iter):
+        assignment = distances[:, medoids].argmin(axis=1)
+        updated = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members):
+                updated[cluster] = members[distances[np.ix_(members, members)].sum(axis=0).argmin()]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return medoids, distances[:, medoids].argmin(axis=1)
+
+
+def hierarchical_medoids(features, distances, k):
+    from scipy.cluster.hierarchy import fcluster, linkage
+
+    labels = fcluster(linkage(features, method="ward"), k, criterion="maxclust") - 1
+    clusters = np.unique(labels)
+    medoids = np.empty(len(clusters), dtype=np.int64)
+    assignment = np.empty(len(labels), dtype=np.int64)
+    for cluster, label in enumerate(clusters):
+        members = np.flatnonzero(labels == label)
+        medoids[cluster] = members[distances[np.ix_(members, members)].sum(axis=0).argmin()]
+        assignment[members] = cluster
+    return medoids, assignment
+
+
+# cluster the days of the horizon into k representative days; returns the
+# medoid day indices, the cluster of every day and the cluster weights (days).
+# The `extreme_days` days with the highest peak price are kept as clusters of
+# their own (counted in k): fuel cell / grid arbitrage lives on the few price
+# spikes that averaging into a medoid would smooth away.
+def select_representative_days(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, k, method="kmedoids",
+                               extreme_days=0, seed=0):
+    price_days, solar_days = daily_profiles(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh)
+    num_days = len(price_days)
+    if not 1 <= k <= num_days:
+        raise ValueError(f"k must be between 1 and the number of days ({num_days}), got {k}")
+    if not 0 <= extreme_days < k:
+        raise ValueError(f"extreme_days must be between 0 and k - 1, got {extreme_days}")
+
+    extremes = np.sort(np.argsort(price_days.max(axis=1))[::-1][:extreme_days])
+    ordinary = np.setdiff1d(np.arange(num_days), extremes)
+
+    features = day_features(price_days[ordinary], solar_days[ordinary])
+    distances = pairwise_distances(features)
+    if method == "kmedoids":
+        medoids, assignment = kmedoids(distances, k - extreme_days, seed=seed)
+    elif method == "hierarchical":
+        medoids, assignment = hierarchical_medoids(features, distances, k - extreme_days)
+    else:
+        raise ValueError(f"method must be 'kmedoids' or 'hierarchical', got {method!r}")
+
+    # back to day indices of the horizon, extreme days appended as singletons
+    medoids = np.concatenate([ordinary[medoids], extremes])
+    day_assignment = np.empty(num_days, dtype=np.int64)
+    day_assignment[ordinary] = assignment
+    day_assignment[extremes] = len(medoids) - extreme_days + np.arange(extreme_days)
+
+    return {
+        "medoids": medoids,
+        "assignment": day_assignment,
+        "weights": np.bincount(day_assignment, minlength=len(medoids)).astype(float),
+        "price_days": price_days[medoids],
+        "solar_days": solar_days[medoids],
+    }
+
+
+# Sizing model on representative days. objective is "levelised" (minimise
+# opex + capex, as run_levelised_cost_minimisation) or "profit" (as
+# run_profit_maximisation); days is the result of select_representative_days.
+# fixed_capacities (the *_capacity_ph keys of the facility summary) pins the
+# design, as in the full-resolution models.
+def run_representative_day_sizing(
+        objective,
+        days,
+        SOLAR_CAPACITY,
+        SOLAR_PPA_DOL_KWH,
+        ELECTROLYSIS_EFFICIENCY,
+        COMPRESSION_EFFICIENCY,
+        LIQUEFACTION_EFFICIENCY,
+        LIQUEFACTION_MAX_UP,
+        LIQUEFACTION_MAX_DOWN,
+        OFFTAKE_TPD,
+        NUM_DAYS,
+        ELECTROLYSIS_CAPEX_DOL_kgPD,
+        COMPRESSOR_CAPEX_DOL_kgPD,
+        LIQUEFACTION_CAPEX_DOL_kgPD,
+        GREEN_THRESHOLD_kg_per_kg,
+        ERCTO_CO2_kg_per_kwh,
+        FUEL_CELL_EFFICIENCY=None,
+        FUELCELL_CAPEX_DOL_kgPD=None,
+        H2_SALES_PRICE_DOL_per_kg=None,
+        formulation="lp",
+        fixed_capacities=None,
+        solver=None,
+        return_stats=False):
+    if objective not in ("levelised", "profit"):
+        raise ValueError(f"objective must be 'levelised' or 'profit', got {objective!r}")
+    check_formulation(formulation)
+    if formulation == "auto":
+        return solve_auto(lambda f: run_representative_day_sizing(
+            objective, days, SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH,
+            ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, OFFTAKE_TPD, NUM_DAYS,
+            ELECTROLYSIS_CAPEX_DOL_kgPD, COMPRESSOR_CAPEX_DOL_kgPD, LIQUEFACTION_CAPEX_DOL_kgPD,
+            GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh, FUEL_CELL_EFFICIENCY=FUEL_CELL_EFFICIENCY,
+            FUELCELL_CAPEX_DOL_kgPD=FUELCELL_CAPEX_DOL_kgPD, H2_SALES_PRICE_DOL_per_kg=H2_SALES_PRICE_DOL_per_kg,
+            formulation=f, fixed_capacities=fixed_capacities, solver=solver, return_stats=return_stats))
+    profit = objective == "profit"
+
+    price_days = days["price_days"]
+    solar_days = days["solar_days"]
+    assignment = days["assignment"]
+    K = len(price_days)
+    H = HOURS_PER_DAY
+    # weight of every representative hour, broadcast over the day
+    weight = np.repeat(days["weights"][:, None], H, axis=1)
+
+    realtime_consumption = cp.Variable((K, H), nonneg = True)
+    solar_consumed_facility = cp.Variable((K, H), nonneg = True)
+
+    #   Design decision variables
+    electrolyser_nameplate_capacity_hour = cp.Variable(nonneg = True)
+    compressor_nameplate_capacity_hour = cp.Variable(nonneg = True)
+    liquefaction_nameplate_capacity_hour = cp.Variable(nonneg = True)
+    fuelcell_nameplate_capacity_hour = cp.Variable(nonneg = True)
+    design = {
+        "electrolyser_capacity_ph": electrolyser_nameplate_capacity_hour,
+        "compressor_capacity_ph": compressor_nameplate_capacity_hour,
+        "liquefaction_capacity_ph": liquefaction_nameplate_capacity_hour,
+    }
+    if profit:
+        design["fuelcell_capacity_ph"] = fuelcell_nameplate_capacity_hour
+
+    # set throughput
+    electrolyser_throughput = cp.Variable((K, H), nonneg = True)
+    compressor_throughput = cp.Variable((K, H), nonneg = True)
+    compressor_to_liquefaction = cp.Variable((K, H), nonneg = True)
+    liquefacion_throughput = cp.Variable((K, H), nonneg = True)
+    fuel_cell_throughput = cp.Variable((K, H), nonneg = True)
+    realtime_supplied = cp.Variable((K, H), nonneg = True)
+
+    #   Operational decision variables
+    gh2_storage_inflow = cp.Variable((K, H), nonneg = True)
+    gh2_storage_outflow = cp.Variable((K, H), nonneg = True)
+    # intra-day level relative to the start of the representative day
+    gh2_storage_intraday = cp.Variable((K, H+1))
+    gh2_storage_intraday_min = cp.Variable(K)
+    # inter-day state of charge at the start of every calendar day
+    gh2_storage_interday = cp.Variable(len(assignment) + 1, nonneg = True)
+
+    constraints = [
+        # restrict the amount of solar that can be consumed
+        solar_consumed_facility <= SOLAR_CAPACITY * solar_days,
+        # power balance equation: sum of electricity in = amount consumed
+        realtime_consumption + solar_consumed_facility ==
+            ELECTROLYSIS_EFFICIENCY*electrolyser_throughput +
+            COMPRESSION_EFFICIENCY*compressor_throughput +
+            LIQUEFACTION_EFFICIENCY*liquefacion_throughput,
+    ]
+
+    # add 'green' constraint on the weighted grid consumption
+    grid_co2 = cp.sum(cp.multiply(weight, realtime_consumption)) * ERCTO_CO2_kg_per_kwh
+    if profit:
+        constraints += [
+            grid_co2 <= GREEN_THRESHOLD_kg_per_kg * cp.sum(cp.multiply(weight, liquefacion_throughput + fuel_cell_throughput))
+        ]
+    else:
+        constraints += [
+            grid_co2 <= GREEN_THRESHOLD_kg_per_kg * (OFFTAKE_TPD * NUM_DAYS),
+            fuel_cell_throughput == 0,
+            fuelcell_nameplate_capacity_hour == 0,
+        ]
+
+    if fixed_capacities is not None:
+        constraints += [capacity == fixed_capacities[key] for key, capacity in design.items()]
+
+    # operational constraints of equipment
+    constraints += [
+        electrolyser_throughput <= electrolyser_nameplate_capacity_hour,
+        compressor_throughput <= compressor_nameplate_capacity_hour,
+        liquefacion_throughput <= liquefaction_nameplate_capacity_hour,
+        fuel_cell_throughput <= fuelcell_nameplate_capacity_hour,
+    ]
+
+    # ramp constraints within each representative day
+    constraints += [
+        liquefacion_throughput[:, 1:H] - liquefacion_throughput[:, 0:H-1] <= LIQUEFACTION_MAX_UP*liquefaction_nameplate_capacity_hour,
+        liquefacion_throughput[:, 0:H-1] - liquefacion_throughput[:, 1:H] <= LIQUEFACTION_MAX_DOWN*liquefaction_nameplate_capacity_hour,
+    ]
+
+    # add fuel cell offtake
+    if profit:
+        constraints += [fuel_cell_throughput*FUEL_CELL_EFFICIENCY == realtime_supplied]
+    else:
+        constraints += [realtime_supplied == 0]
+
+    # balance mass through system
+    constraints += [
+        electrolyser_throughput == compressor_throughput,
+        compressor_throughput == compressor_to_liquefaction + gh2_storage_inflow,
+        liquefacion_throughput == compressor_to_liquefaction + gh2_storage_outflow,
+        gh2_storage_intraday[:, 0] == 0,
+        gh2_storage_intraday[:, 1:H+1] == gh2_storage_intraday[:, 0:H] + gh2_storage_inflow - gh2_storage_outflow - fuel_cell_throughput,
+        gh2_storage_intraday >= cp.reshape(gh2_storage_intraday_min, (K, 1), order="F") @ np.ones((1, H+1)),
+    ]
+
+    # link storage across the calendar: start empty, step through the day sequence
+    constraints += [
+        gh2_storage_interday[0] == 0,
+        gh2_storage_interday[1:] == gh2_storage_interday[:-1] + gh2_storage_intraday[:, H][assignment],
+        gh2_storage_interday[:-1] + gh2_storage_intraday_min[assignment] >= 0,
+    ]
+
+    # storage on/off logic, big-M with binaries ("milp") or relaxed ("lp")
+    gh2_storage_active, storage_constraints, storage_cycling_cost = gh2_storage_logic(
+        formulation, compressor_throughput, liquefacion_throughput, gh2_storage_inflow, gh2_storage_outflow, (K, H))
+    constraints += storage_constraints
+
+    # weighted electricity cost from dayahead market and solar ppa consumption
+    electricity_cost = cp.sum(cp.multiply(weight * price_days, realtime_consumption)) \
+        + SOLAR_PPA_DOL_KWH * cp.sum(cp.multiply(weight, solar_consumed_facility))
+    # multiply 24 to get nameplate capacity in kg per day
+    capex = (electrolyser_nameplate_capacity_hour * 24) * ELECTROLYSIS_CAPEX_DOL_kgPD \
+        + (compressor_nameplate_capacity_hour * 24) * COMPRESSOR_CAPEX_DOL_kgPD \
+        + (liquefaction_nameplate_capacity_hour * 24) * LIQUEFACTION_CAPEX_DOL_kgPD
+
+    if profit:
+        capex += (fuelcell_nameplate_capacity_hour * 24) * FUELCELL_CAPEX_DOL_kgPD
+        revenue = cp.sum(cp.multiply(weight * price_days, realtime_supplied)) \
+            + cp.sum(cp.multiply(weight, liquefacion_throughput)) * H2_SALES_PRICE_DOL_per_kg
+        problem = cp.Problem(cp.Maximize(revenue - electricity_cost - capex - storage_cycling_cost), constraints)
+    else:
+        problem = cp.Problem(cp.Minimize(electricity_cost + capex + storage_cycling_cost), constraints)
+
+    wall_time = solve_problem(problem, formulation, K * H, solver)
+
+    def weighted_sum(values):
+        return float((weight * values).sum())
+
+    def column(values):
+        return np.asarray(values).ravel()
+
+    facility = {
+        "electrolyser_capacity_ph": electrolyser_nameplate_capacity_hour.value,
+        "compressor_capacity_ph": compressor_nameplate_capacity_hour.value,
+        "liquefaction_capacity_ph": liquefaction_nameplate_capacity_hour.value,
+        "fuelcell_capacity_ph": fuelcell_nameplate_capacity_hour.value,
+        "h2_sold": weighted_sum(liquefacion_throughput.value),
+        "solar_consumed": weighted_sum(solar_consumed_facility.value),
+        "wholesale_consumed": weighted_sum(realtime_consumption.value),
+        "wholesale_cost": weighted_sum(price_days * realtime_consumption.value),
+        "wholesale_supplied": weighted_sum(realtime_supplied.value),
+        "wholesale_revenue": weighted_sum(price_days * realtime_supplied.value),
+        "representative_days": len(price_days),
+        "formulation": formulation,
+        "lp_milp_gap": None,
+    }
+    if profit:
+        facility["total_profit"] = problem.value
+    else:
+        facility["total_cost"] = problem.value
+
+    operations_df = pd.DataFrame({
+        "representative_day": np.repeat(days["medoids"], H),
+        "weight_days": column(weight),
+        "hourly_dayahead_dol_per_kwh": column(price_days),
+        "realtime_production_kwh": column(realtime_consumption.value),
+        "realtime_supplied_kwh": column(realtime_supplied.value),
+        "solar_production_kwh": column(solar_consumed_facility.value),
+        "electrolyser_consumption_kwh": ELECTROLYSIS_EFFICIENCY*column(electrolyser_throughput.value),
+        "compressor_consumption_kwh": COMPRESSION_EFFICIENCY*column(compressor_throughput.value),
+        "liquefaction_consumption_kwh": LIQUEFACTION_EFFICIENCY*column(liquefacion_throughput.value),
+        "electrolyser_produced_kg": column(electrolyser_throughput.value),
+        "compressor_produced_kg": column(compressor_throughput.value),
+        "liquefaction_produced_kg": column(liquefacion_throughput.value),
+        "compress_to_liquefaction": column(compressor_to_liquefaction.value),
+        "fuel_cell_consumed_kg": column(fuel_cell_throughput.value),
+        "gh2_storage_intraday_level_kg": column(gh2_storage_intraday.value[:, 0:H]),
+        "gh2_storage_net_inflow": column(gh2_storage_inflow.value - gh2_storage_outflow.value),
+        "gh2_storge_inflow_kg": column(gh2_storage_inflow.value),
+        "gh2_storage_outflow_kg": column(gh2_storage_outflow.value),
+    })
+
+    if return_stats:
+        return problem, operations_df, facility, solve_stats(problem, wall_time)
+    return problem, operations_df, facility
+
+
+# Solve the k-day sizing for every k, optionally re-dispatch the chosen
+# capacities at full resolution and compare with the full-resolution sizing.
+#   run: run_levelised_cost_minimisation or run_profit_maximisation
+#   args: its positional arguments (full-resolution series)
+def representative_day_report(run, args, ks, method="kmedoids", extreme_days=0, formulation="lp", full_reference=True,
+                              validate=True):
+    rows = []
+    reference = None
+    if full_reference:
+        start = time.perf_counter()
+        problem, _, facility = run(*args, formulation=formulation)
+        reference = problem.value
+        rows.append({"k": None, "runtime_s": time.perf_counter() - start, "objective": problem.value,
+                     **_capacities(facility), "validated_objective": problem.value, "error": 0.0})
+
+    for k in ks:
+        start = time.perf_counter()
+        problem, _, facility = run(*args, formulation=formulation, representative_days=k,
+                                   representative_day_method=method, representative_extreme_days=extreme_days)
+        row = {"k": k, "runtime_s": time.perf_counter() - start, "objective": problem.value, **_capacities(facility)}
+        if validate:
+            start = time.perf_counter()
+            validated = validate_capacities(run, args, facility, formulation=formulation)
+            row["validation_runtime_s"] = time.perf_counter() - start
+            row["validated_objective"] = validated.value
+            if reference is not None:
+                row["error"] = abs(validated.value - reference) / max(abs(reference), 1.0)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# full-resolution dispatch with the capacities fixed to `facility`'s
+def validate_capacities(run, args, facility, formulation="lp"):
+    problem, _, _ = run(*args, formulation=formulation, fixed_capacities=facility)
+    return problem
+
+
+def _capacities(facility):
+    return {key: facility.get(key) for key in
+            ("electrolyser_capacity_ph", "compressor_capacity_ph", "liquefaction_capacity_ph", "fuelcell_capacity_ph")}
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Append-only columnar store of simulation and sweep results.
+#
+# Each run's hourly operations are written once as a float32 structured .npy
+# file under runs/, and a line with its parameters, their hash, a timestamp
+# and the scalar facility summary is appended to runs.jsonl. Queries read
+# only the metadata table and memory-map the columns they touch, so
+#
+#   store = ResultsStore("results/price_sweep")
+#   store.append(operations_df, params, facility)
+#   runs = store.query(H2_SALES_PRICE_DOL_per_kg=[3.0, 4.0], SOLAR_CAPACITY=lambda c: c > 200)
+#   runs.column("liquefaction_produced_kg")        # (N, T) float32
+#
+# compares hundreds of sweep runs without parsing a CSV per run.
+
+METADATA = "runs.jsonl"
+RUNS_DIR = "runs"
+
+
+# sha1 of a run's parameters; array parameters (the hourly series) are
+# hashed by content
+def params_hash(params):
+    digest = hashlib.sha1()
+    for name in sorted(params):
+        value = params[name]
+        digest.update(name.encode())
+        if isinstance(value, (np.ndarray, pd.Series, list, tuple)):
+            array = np.ascontiguousarray(np.asarray(value, dtype=float))
+            digest.update(array.tobytes())
+        else:
+            digest.update(json.dumps(value, default=str, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+# scalar entries of a mapping, as plain json values
+def _scalars(values):
+    return {name: value.item() if isinstance(value, np.generic) else value
+            for name, value in (values or {}).items() if np.isscalar(value) or value is None}
+
+
+class ResultsStore:
+
+    def __init__(self, path):
+        self.path = path
+
+    # hourly operations (DataFrame or dict of columns) of one run as a float32
+    # file; returns the run's metadata record, to be added with record()
+    def write_run(self, operations, params=None, summary=None):
+        run_id = uuid.uuid4().hex
+        operations = pd.DataFrame(operations)
+        columns = [name for name in operations.columns
+                   if pd.api.types.is_numeric_dtype(operations[name]) or pd.api.types.is_bool_dtype(operations[name])]
+        hourly = np.zeros(len(operations), dtype=[(name, np.float32) for name in columns])
+        for name in columns:
+            hourly[name] = operations[name].to_numpy(dtype=np.float32)
+
+        os.makedirs(os.path.join(self.path, RUNS_DIR), exist_ok=True)
+        file = os.path.join(RUNS_DIR, f"{run_id}.npy")
+        with open(os.path.join(self.path, file + ".tmp"), "wb") as handle:
+            np.save(handle, hourly)
+        os.replace(os.path.join(self.path, file + ".tmp"), os.path.join(self.path, file))
+
+        return {
+            "run_id": run_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "hash": params_hash(params or {}),
+            "hours": len(operations),
+            "file": file,
+            "params": _scalars(params),
+            "summary": _scalars(summary),
+        }
+
+    # append a run's metadata line; the run is visible to queries from then on
+    def record(self, run):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, METADATA), "a") as handle:
+            handle.write(json.dumps(run) + "\n")
+
+    def append(self, operations, params=None, summary=None):
+        run = self.write_run(operations, params, summary)
+        self.record(run)
+        return run["run_id"]
+
+    # metadata table, one row per run: run_id, timestamp, hash, hours, file,
+    # then the parameters and the facility summary as columns
+    def runs(self):
+        path = os.path.join(self.path, METADATA)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=["run_id", "timestamp", "hash", "hours", "file"])
+        rows = []
+        with open(path) as handle:
+            for line in handle:
+                if line.strip():
+                    run = json.loads(line)
+                    rows.append({**{k: v for k, v in run.items() if k not in ("params", "summary")},
+                                 **run["params"], **run["summary"]})
+        return pd.DataFrame(rows)
+
+    # runs whose metadata matches every filter: a value, a list of allowed
+    # values or a predicate on the column
+    def query(self, **filters):
+        runs = self.runs()
+        mask = np.ones(len(runs), dtype=bool)
+        for name, condition in filters.items():
+            if name not in runs:
+                raise KeyError(f"no parameter or summary field {name!r} in {self.path}")
+            if callable(condition):
+                mask &= runs[name].map(condition).to_numpy(dtype=bool)
+            elif isinstance(condition, (list, tuple, set, np.ndarray)):
+                mask &= runs[name].isin(list(condition)).to_numpy()
+            else:
+                mask &= (runs[name] == condition).to_numpy()
+        return StoredRuns(self.path, runs[mask].reset_index(drop=True))
+
+
+# Runs selected by ResultsStore.query. Columns are memory-mapped on first
+# access, so only the pages actually read are loaded.
+class StoredRuns:
+
+    def __init__(self, path, metadata):
+        self.path = path
+        self.metadata = metadata
+        self._hourly = {}
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def _load(self, run_id):
+        if run_id not in self._hourly:
+            file = self.metadata.loc[self.metadata["run_id"] == run_id, "file"].iloc[0]
+            self._hourly[run_id] = np.load(os.path.join(self.path, file), mmap_mode="r")
+        return self._hourly[run_id]
+
+    def columns(self, run_id):
+        return list(self._load(run_id).dtype.names)
+
+    # one column of every selected run, stacked to (N, T) when the runs have
+    # the same number of hours and as a list of arrays otherwise
+    def column(self, name):
+        values = [self._load(run_id)[name] for run_id in self.metadata["run_id"]]
+        if values and len({len(value) for value in values}) == 1:
+            return np.stack(values)
+        return values
+
+    # hourly operations of one run as a DataFrame
+    def operations(self, run_id):
+        return pd.DataFrame(np.asarray(self._load(run_id)))
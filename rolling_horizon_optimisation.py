@@ -1,6 +1,16 @@
+import os
+
+import numpy as np
 import pandas as pd 
 import cvxpy as cp
 
+from h2_plant import (CAPACITY_KEYS, CI_SLACK_PENALTY_DOL, SALES_KPIS, PlantParams, PlantVariables, compute_kpis,
+                      dispatch_model, hourly_columns, results_array, select_kpis, storage)
+from liquefaction_commitment import check_commitment, commitment_columns
+from results_store import params_hash
+from solver_config import solve_problem, solve_stats
+from storage_formulation import check_formulation, solve_auto, storage_logic_is_integral
+
 def run_rolling_horizon_opt(
         SOLAR_CAPACITY,
         SOLAR_PPA_DOL_KWH,
@@ -20,180 +30,530 @@ def run_rolling_horizon_opt(
         GREEN_THRESHOLD_kg_per_kg,
         ERCTO_CO2_kg_per_kwh,
         T,
-        prev_state_vector):
-    realtime_consumption = cp.Variable(T, nonneg = True)
-    realtime_supplied = cp.Variable(T, nonneg = True)
-    solar_consumed_facility = cp.Variable(T, nonneg = True) 
-
-    # set throughput
-    electrolyser_throughput = cp.Variable(T, nonneg = True)
-    compressor_throughput = cp.Variable(T, nonneg = True)
-    compressor_to_liquefaction = cp.Variable(T, nonneg = True)
-    liquefacion_throughput = cp.Variable(T, nonneg = True)
-    fuel_cell_throughput = cp.Variable(T, nonneg = True)
-
-    #   Operational decision variables
-    gh2_storage_inflow = cp.Variable(T,nonneg=True)
-    gh2_storage_outflow = cp.Variable(T,nonneg=True)
-    gh2_storage_level = cp.Variable(T+1, nonneg = True)
-    lh2_storage_level = cp.Variable(T+1, nonneg = True)
-    gh2_storage_active = cp.Variable(T, boolean=True)
-
-    ci_slack = cp.Variable(nonneg=True)
-
-    # Define power balance constraints t
-    constraints = [
-        # restrict the amount of solar that can be consumed
-        solar_consumed_facility <= SOLAR_CAPACITY * hourly_solar_production_kwh,
-        # power balance equation: sum of electricity in = amount consumed           
-        realtime_consumption + solar_consumed_facility == 
-            ELECTROLYSIS_EFFICIENCY*electrolyser_throughput + 
-            COMPRESSION_EFFICIENCY*compressor_throughput + 
-            LIQUEFACTION_EFFICIENCY*liquefacion_throughput, 
-    ]
-
-    # add 'green' constraint; restrict amount that can be taken from grid
-    constraints += [ 
-        (sum(realtime_consumption) + prev_state_vector['grid_running_sum']) * ERCTO_CO2_kg_per_kwh <=\
-              GREEN_THRESHOLD_kg_per_kg * (sum(liquefacion_throughput + fuel_cell_throughput) + prev_state_vector['h2_offtake_running_sum']) + ERCTO_CO2_kg_per_kwh * ci_slack
-    ]
-
-    # operational constraints of equipment
-    constraints += [
-        # constraint operational bounds of each piece of equipment: 
-        0 <= electrolyser_throughput, 
-        electrolyser_throughput <= electrolyser_nameplate_capacity_hour,
-        0 <= compressor_throughput, 
-        compressor_throughput <= compressor_nameplate_capacity_hour,
-        0 <= liquefacion_throughput, 
-        liquefacion_throughput <= liquefaction_nameplate_capacity_hour,
-        0 <= fuel_cell_throughput, 
-        fuel_cell_throughput <= fuelcell_nameplate_capacity_hour,
-        # 0.81 <= fuelcell_nameplate_capacity_hour
-        ]
-
-    # ramp constraints throughput constraints 
-    constraints += [ 
-        liquefacion_throughput[1:T] - liquefacion_throughput[0:T-1] <= LIQUEFACTION_MAX_UP*liquefaction_nameplate_capacity_hour,
-        liquefacion_throughput[0:T-1] - liquefacion_throughput[1:T] <= LIQUEFACTION_MAX_DOWN*liquefaction_nameplate_capacity_hour,
-    ]
-
-    # add fuel cell offtake 
-    constraints += [ 
-        fuel_cell_throughput*FUEL_CELL_EFFICIENCY == realtime_supplied, 
-
-    ]
+        prev_state_vector,
+        formulation="milp",
+        solver=None,
+        return_stats=False,
+        commitment=None,
+        dt_hours=1.0):
+    check_formulation(formulation)
+    check_commitment(commitment)
+    if formulation == "auto":
+        return solve_auto(lambda f: run_rolling_horizon_opt(
+            SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, hourly_solar_production_kwh, hourly_dayahead_dol_per_kwh,
+            ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY, FUEL_CELL_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN,
+            electrolyser_nameplate_capacity_hour, compressor_nameplate_capacity_hour,
+            liquefaction_nameplate_capacity_hour, fuelcell_nameplate_capacity_hour,
+            H2_SALES_PRICE_DOL_per_kg, GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh,
+            T, prev_state_vector, formulation=f, solver=solver, return_stats=return_stats,
+            commitment=commitment, dt_hours=dt_hours))
+
+    plant = PlantParams(
+        SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+        LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh,
+        FUEL_CELL_EFFICIENCY=FUEL_CELL_EFFICIENCY, H2_SALES_PRICE_DOL_per_kg=H2_SALES_PRICE_DOL_per_kg,
+        dt_hours=dt_hours)
+    v = PlantVariables(T, capacities=dict(zip(CAPACITY_KEYS, (
+        electrolyser_nameplate_capacity_hour, compressor_nameplate_capacity_hour,
+        liquefaction_nameplate_capacity_hour, fuelcell_nameplate_capacity_hour))), dt_hours=dt_hours)
 
     print(f"previous liquefaction {prev_state_vector['liquefaction_produced_kg']}")
-    # set initial storage levels to empty
-    constraints += [ 
-        gh2_storage_level[1] == prev_state_vector['gh2_storage_level_kg'],
-        liquefacion_throughput[0] == prev_state_vector['liquefaction_produced_kg']
-    ]
+    constraints, objective = dispatch_model(v, plant, hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh,
+                                            prev_state_vector, commitment)
 
-    # balance mass through system
-    constraints += [
-        electrolyser_throughput == compressor_throughput,
-        compressor_throughput == compressor_to_liquefaction + gh2_storage_inflow,
-        liquefacion_throughput == compressor_to_liquefaction + gh2_storage_outflow,
-        gh2_storage_level[1:T+1] == gh2_storage_level[0:T] + gh2_storage_inflow  - gh2_storage_outflow - fuel_cell_throughput,
-        # big-M constraint to only turn on storage if used 
-        # TODO: remove if computational issues arise 
-        compressor_throughput - liquefacion_throughput <= 1000 * gh2_storage_active,
-        gh2_storage_inflow <= 1000*gh2_storage_active,
-        gh2_storage_outflow <= 1000*gh2_storage_active
-    ]
+    # storage on/off logic, big-M with binaries ("milp") or relaxed ("lp");
+    # discourage simultaneous storage charge/discharge in the LP formulation
+    constraints += storage(v, formulation, initial_level=None)
+    problem = cp.Problem(cp.Maximize(objective - v.storage_cycling_cost), constraints)
 
+    # Solve problem
+    wall_time = solve_problem(problem, formulation, T, solver)
 
+    operations_df = pd.DataFrame({"hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh,
+            "realtime_production_kwh": v.realtime_consumption.value,
+            "realtime_supplied_kwh": v.realtime_supplied.value,
+            "solar_available_kwh": hourly_solar_production_kwh,
+            "solar_production_kwh": v.solar_consumed_facility.value,
+            "grid_running_sum": prev_state_vector['grid_running_sum'],
+            "h2_offtake_running_sum": prev_state_vector['h2_offtake_running_sum'],
+            **hourly_columns(v, plant),
+            "ci_slack": v.ci_slack.value,
+            **commitment_columns(v.commitment),
+        })
 
-    # Minimize total cost of supply; min(OPEX + CAPEX)
-    # OPEX = electricity, CAPEX = annualised capex
-    objective = 0
+    capacities = v.capacity_values()
+    kpis = compute_kpis(results_array(operations_df), capacities, plant)
+    facility_summary = {
+        **capacities,
+        **select_kpis(kpis, SALES_KPIS),
+        "total_profit": problem.value,
+        "formulation": formulation,
+        "lp_milp_gap": None,
+    }
 
-    # add electricity cost from dayahead market consumption
-    objective -= realtime_consumption @ hourly_dayahead_dol_per_kwh  
+    operations_t_vector = {
+            "grid_running_sum":  prev_state_vector['grid_running_sum'] + v.realtime_consumption.value[1],
+            "h2_offtake_running_sum": prev_state_vector['h2_offtake_running_sum'] + v.liquefacion_throughput.value[1],
+            "hourly_dayahead_dol_per_kwh": np.asarray(hourly_dayahead_dol_per_kwh)[1],
+            "realtime_production_kwh": v.realtime_consumption.value[1],
+            "realtime_supplied_kwh": v.realtime_supplied.value[1],
+            "solar_available_kwh": np.asarray(hourly_solar_production_kwh)[1],
+            "solar_production_kwh": v.solar_consumed_facility.value[1],
+            **hourly_columns(v, plant, 1, levels=2),
+            "ci_slack": v.ci_slack.value
+        }
 
-    # add electricity cost from solar ppa consumption
-    objective -= cp.sum(SOLAR_PPA_DOL_KWH * solar_consumed_facility)
+    if return_stats:
+        return problem, operations_df, facility_summary, operations_t_vector, solve_stats(problem, wall_time)
+    return problem, operations_df, facility_summary, operations_t_vector
 
-    objective += realtime_supplied @ hourly_dayahead_dol_per_kwh  
-    # H2 SALES REVENUE 
-    objective +=   sum(liquefacion_throughput) * H2_SALES_PRICE_DOL_per_kg
-    
-    objective -= 100 * ci_slack
 
+# Parameterised version of run_rolling_horizon_opt. The problem is built and
+# canonicalised once for a fixed horizon T; every hour afterwards only the
+# cp.Parameter values (prices, solar, previous state, capacities) are updated
+# before re-solving, which skips cvxpy's canonicalisation on all later solves.
+class RollingHorizonModel:
 
+    def __init__(
+            self,
+            SOLAR_CAPACITY,
+            SOLAR_PPA_DOL_KWH,
+            ELECTROLYSIS_EFFICIENCY,
+            COMPRESSION_EFFICIENCY,
+            LIQUEFACTION_EFFICIENCY,
+            FUEL_CELL_EFFICIENCY,
+            LIQUEFACTION_MAX_UP,
+            LIQUEFACTION_MAX_DOWN,
+            H2_SALES_PRICE_DOL_per_kg,
+            GREEN_THRESHOLD_kg_per_kg,
+            ERCTO_CO2_kg_per_kwh,
+            T,
+            capacities=None,
+            formulation="milp",
+            solver=None,
+            commitment=None,
+            dt_hours=1.0):
+        check_formulation(formulation)
+        check_commitment(commitment)
+        self.formulation = formulation
+        self.commitment = commitment
+        self.solver = solver
+        self.plant = PlantParams(
+            SOLAR_CAPACITY, SOLAR_PPA_DOL_KWH, ELECTROLYSIS_EFFICIENCY, COMPRESSION_EFFICIENCY, LIQUEFACTION_EFFICIENCY,
+            LIQUEFACTION_MAX_UP, LIQUEFACTION_MAX_DOWN, GREEN_THRESHOLD_kg_per_kg, ERCTO_CO2_kg_per_kwh,
+            FUEL_CELL_EFFICIENCY=FUEL_CELL_EFFICIENCY, H2_SALES_PRICE_DOL_per_kg=H2_SALES_PRICE_DOL_per_kg,
+            dt_hours=dt_hours)
+        self.T = T
 
-    # Define problem
-    objective_min = cp.Maximize(objective)
-    problem = cp.Problem(objective_min, constraints)
+        # market and solar data for the horizon
+        self.hourly_dayahead_dol_per_kwh = cp.Parameter(T)
+        self.hourly_solar_production_kwh = cp.Parameter(T, nonneg = True)
 
-    # Solve problem
-    problem.solve()
+        # state carried over from the previously committed hour
+        self.previous = {name: cp.Parameter(nonneg = True) for name in INITIAL_STATE}
 
-    facility_summary = {
-        "electrolyser_capacity_ph":electrolyser_nameplate_capacity_hour,
-        "compressor_capacity_ph": compressor_nameplate_capacity_hour, 
-        "liquefaction_capacity_ph": liquefaction_nameplate_capacity_hour, 
-        "fuelcell_capacity_ph":fuelcell_nameplate_capacity_hour,
-        "h2_sold": sum(liquefacion_throughput.value), 
-        "h2_revenue":  sum(liquefacion_throughput.value) * H2_SALES_PRICE_DOL_per_kg, 
-        "solar_consumed": sum(solar_consumed_facility.value), 
-        "solar_cost": sum(solar_consumed_facility.value) * SOLAR_PPA_DOL_KWH, 
-        "wholesale_consumed": sum(realtime_consumption.value),
-        "wholesale_cost": realtime_consumption.value @ hourly_dayahead_dol_per_kwh, 
-        "wholesale_supplied": sum(realtime_supplied.value), 
-        "wholesale_revenue": realtime_supplied.value @ hourly_dayahead_dol_per_kwh, 
-        "total_profit": problem.value
-    }
+        #   Design parameters (fixed nameplate capacities)
+        self.capacities = {key: cp.Parameter(nonneg = True) for key in CAPACITY_KEYS}
 
-    operations_df = pd.DataFrame({"hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh,
-            "realtime_production_kwh":realtime_consumption.value,
-            "realtime_supplied_kwh": realtime_supplied.value,
-            "solar_available_kwh":hourly_solar_production_kwh,
-            "solar_production_kwh": solar_consumed_facility.value, 
-            "grid_running_sum": prev_state_vector['grid_running_sum'],
-            "h2_offtake_running_sum": prev_state_vector['h2_offtake_running_sum'],
-            "electrolyser_consumption_kwh": ELECTROLYSIS_EFFICIENCY*electrolyser_throughput.value, 
-            "compressor_consumption_kwh": COMPRESSION_EFFICIENCY*compressor_throughput.value, 
-            "liquefaction_consumption_kwh": LIQUEFACTION_EFFICIENCY*liquefacion_throughput.value,
-            "electrolyser_produced_kg": electrolyser_throughput.value, 
-            "compressor_produced_kg": compressor_throughput.value,
-            "liquefaction_produced_kg": liquefacion_throughput.value,
-            "compress_to_liquefaction": compressor_to_liquefaction.value,
-            "fuel_cell_consumed_kg": fuel_cell_throughput.value,
-            "gh2_storage_level_kg": gh2_storage_level.value[0:T],
-            # TODO: if problem size allows, add in big-M constraint 
-            "gh2_storage_net_inflow": gh2_storage_inflow.value - gh2_storage_outflow.value,
-            "gh2_storge_inflow_kg": gh2_storage_inflow.value,
-            "gh2_storage_outflow_kg": gh2_storage_outflow.value, 
-            "ci_slack": ci_slack.value
-        })
-    
-    operations_t_vector = {
-            "grid_running_sum":  prev_state_vector['grid_running_sum'] + realtime_consumption.value[1],
-            "h2_offtake_running_sum": prev_state_vector['h2_offtake_running_sum'] + liquefacion_throughput.value[1],
-            "hourly_dayahead_dol_per_kwh": hourly_dayahead_dol_per_kwh.tolist()[1],
-            "realtime_production_kwh":realtime_consumption.value[1],
-            "realtime_supplied_kwh": realtime_supplied.value[1],
-            "solar_available_kwh":hourly_solar_production_kwh.tolist()[1],
-            "solar_production_kwh": solar_consumed_facility.value[1], 
-            "electrolyser_consumption_kwh": ELECTROLYSIS_EFFICIENCY*electrolyser_throughput.value[1], 
-            "compressor_consumption_kwh": COMPRESSION_EFFICIENCY*compressor_throughput.value[1], 
-            "liquefaction_consumption_kwh": LIQUEFACTION_EFFICIENCY*liquefacion_throughput.value[1],
-            "electrolyser_produced_kg": electrolyser_throughput.value[1], 
-            "compressor_produced_kg": compressor_throughput.value[1], 
-            "liquefaction_produced_kg": liquefacion_throughput.value[1],
-            "compress_to_liquefaction": compressor_to_liquefaction.value[1],
-            "fuel_cell_consumed_kg": fuel_cell_throughput.value[1],
-            "gh2_storage_level_kg": gh2_storage_level.value[2],
-            # TODO: if problem size allows, add in big-M constraint 
-            "gh2_storage_net_inflow": gh2_storage_inflow.value[1] - gh2_storage_outflow.value[1],
-            "gh2_storge_inflow_kg": gh2_storage_inflow.value[1], 
-            "gh2_storage_outflow_kg": gh2_storage_outflow.value[1],
-            "ci_slack": ci_slack.value
+        self.v = PlantVariables(T, capacities=self.capacities, dt_hours=dt_hours)
+        constraints, objective = dispatch_model(
+            self.v, self.plant, self.hourly_dayahead_dol_per_kwh, self.hourly_solar_production_kwh,
+            self.previous, commitment)
+
+        # "auto" compiles the LP and only builds the MILP the first time an LP
+        # solution is not feasible for it
+        self.constraints = constraints
+        self.objective = objective
+        self.problems = {}
+        self.problem = self.build_problem("milp" if formulation == "milp" else "lp")
+        self.dispatch_v = self.v
+        self.relaxed = None
+
+        if capacities is not None:
+            self.set_capacities(capacities)
+
+    def build_problem(self, formulation):
+        if formulation not in self.problems:
+            storage_constraints = storage(self.v, formulation, initial_level=None)
+            self.problems[formulation] = cp.Problem(
+                cp.Maximize(self.objective - self.v.storage_cycling_cost), self.constraints + storage_constraints)
+        return self.problems[formulation]
+
+    # capacities as returned in the facility summary of run_profit_maximisation
+    def set_capacities(self, capacities):
+        for key, parameter in self.capacities.items():
+            parameter.value = capacities[key]
+
+    def step(self, prices, solar, state, **solve_kwargs):
+        self.hourly_dayahead_dol_per_kwh.value = np.asarray(prices, dtype=float)
+        self.hourly_solar_production_kwh.value = np.asarray(solar, dtype=float)
+        for name, parameter in self.previous.items():
+            parameter.value = state[name]
+        self.state = state
+
+        v = self.v = self.dispatch_v
+        if self.formulation == "auto":
+            self.problem = self.problems["lp"]
+            self.wall_time = solve_problem(self.problem, "lp", self.T, self.solver, **solve_kwargs)
+            if self.problem.value is None or not storage_logic_is_integral(
+                    v.compressor_throughput.value,
+                    v.liquefacion_throughput.value,
+                    v.gh2_storage_inflow.value,
+                    v.gh2_storage_outflow.value):
+                self.problem = self.build_problem("milp")
+                self.wall_time = solve_problem(self.problem, "milp", self.T, self.solver, **solve_kwargs)
+        else:
+            self.problem = self.problems[self.formulation]
+            self.wall_time = solve_problem(self.problem, self.formulation, self.T, self.solver, **solve_kwargs)
+
+        return self.operations_t_vector() if self.solved() else None
+
+    # whether the last solve found a solution (None from step otherwise)
+    def solved(self):
+        return self.problem.status in cp.settings.SOLUTION_PRESENT
+
+    # the window with the storage on/off logic relaxed to the LP and the
+    # first hour's liquefaction and storage level pinned to the previous state
+    # only softly, at PIN_SLACK_PENALTY_DOL per kg off the pin (the green cap
+    # is soft in every solve, through ci_slack). Built on its own variables,
+    # the first time a window is relaxed.
+    def build_relaxed(self):
+        v = PlantVariables(self.T, capacities=self.capacities, dt_hours=self.plant.dt_hours)
+        pin_slack = {name: cp.Variable() for name in ("liquefaction_produced_kg", "gh2_storage_level_kg")}
+        state = {**self.previous, **{name: self.previous[name] + slack for name, slack in pin_slack.items()}}
+        constraints, objective = dispatch_model(
+            v, self.plant, self.hourly_dayahead_dol_per_kwh, self.hourly_solar_production_kwh, state, self.commitment)
+        constraints += storage(v, "lp", initial_level=None)
+        penalty = PIN_SLACK_PENALTY_DOL * sum(cp.abs(slack) for slack in pin_slack.values())
+        return v, cp.Problem(cp.Maximize(objective - v.storage_cycling_cost - penalty), constraints)
+
+    # re-solve the window of the last step relaxed (build_relaxed), e.g.
+    # after the MILP failed or the previous state is out of reach of the
+    # ramp limits at the current capacities
+    def solve_relaxed(self, **solve_kwargs):
+        if self.relaxed is None:
+            self.relaxed = self.build_relaxed()
+        self.v, self.problem = self.relaxed
+        self.wall_time = solve_problem(self.problem, "lp", self.T, self.solver, **solve_kwargs)
+        return self.operations_t_vector() if self.solved() else None
+
+    # SolveStats of the last step
+    def solve_stats(self):
+        return solve_stats(self.problem, self.wall_time)
+
+    # columns of the hours committed by the last solve (positions 1..commit of
+    # the horizon; position 0 is pinned to the previously committed hour)
+    def committed_columns(self, commit=1):
+        c = slice(1, commit + 1)
+        v = self.v
+        realtime_consumption = v.realtime_consumption.value[c]
+        return {
+            "grid_running_sum": self.state['grid_running_sum'] + np.cumsum(realtime_consumption),
+            "h2_offtake_running_sum": self.state['h2_offtake_running_sum'] + np.cumsum(v.liquefacion_throughput.value[c]),
+            "hourly_dayahead_dol_per_kwh": self.hourly_dayahead_dol_per_kwh.value[c],
+            "realtime_production_kwh": realtime_consumption,
+            "realtime_supplied_kwh": v.realtime_supplied.value[c],
+            "solar_available_kwh": self.hourly_solar_production_kwh.value[c],
+            "solar_production_kwh": v.solar_consumed_facility.value[c],
+            **hourly_columns(v, self.plant, c, levels=slice(2, commit + 2)),
+            "ci_slack": np.full(commit, v.ci_slack.value)
         }
 
+    # same row as the operations_t_vector returned by run_rolling_horizon_opt
+    def operations_t_vector(self):
+        return {name: column[0] for name, column in self.committed_columns(1).items()}
 
+    # shift the last solution forward by `commit` hours (repeating the final
+    # hour) so it can be handed to the solver as a warm start
+    def shift_solution(self, commit=1):
+        for variable in self.problem.variables():
+            if variable.value is None or variable.ndim == 0:
+                continue
+            value = variable.value
+            variable.value = np.concatenate([value[commit:], np.repeat(value[-1:], commit)])
+
+    # full-horizon operations of the last solve, as in run_rolling_horizon_opt
+    def operations_df(self):
+        v = self.v
+        return pd.DataFrame({"hourly_dayahead_dol_per_kwh": self.hourly_dayahead_dol_per_kwh.value,
+                "realtime_production_kwh": v.realtime_consumption.value,
+                "realtime_supplied_kwh": v.realtime_supplied.value,
+                "solar_available_kwh": self.hourly_solar_production_kwh.value,
+                "solar_production_kwh": v.solar_consumed_facility.value,
+                "grid_running_sum": self.state['grid_running_sum'],
+                "h2_offtake_running_sum": self.state['h2_offtake_running_sum'],
+                **hourly_columns(v, self.plant),
+                "ci_slack": v.ci_slack.value,
+                **commitment_columns(v.commitment),
+            })
+
+
+# $ per kg the first hour of a relaxed window is off the previous state
+PIN_SLACK_PENALTY_DOL = CI_SLACK_PENALTY_DOL
+
+# initial state of a simulation: empty storage, nothing produced yet
+INITIAL_STATE = {
+    "grid_running_sum": 0,
+    "h2_offtake_running_sum": 0,
+    "gh2_storage_level_kg": 0,
+    "liquefaction_produced_kg": 0,
+}
+
+OPERATIONS_T_COLUMNS = [
+    "grid_running_sum",
+    "h2_offtake_running_sum",
+    "hourly_dayahead_dol_per_kwh",
+    "realtime_production_kwh",
+    "realtime_supplied_kwh",
+    "solar_available_kwh",
+    "solar_production_kwh",
+    "electrolyser_consumption_kwh",
+    "compressor_consumption_kwh",
+    "liquefaction_consumption_kwh",
+    "electrolyser_produced_kg",
+    "compressor_produced_kg",
+    "liquefaction_produced_kg",
+    "compress_to_liquefaction",
+    "fuel_cell_consumed_kg",
+    "gh2_storage_level_kg",
+    "gh2_storage_net_inflow",
+    "gh2_storge_inflow_kg",
+    "gh2_storage_outflow_kg",
+    "ci_slack",
+]
+
+
+# hourly columns of the last committed hour a held window is rebuilt from
+HELD_COLUMNS = [name for name in OPERATIONS_T_COLUMNS if name not in (
+    "grid_running_sum", "h2_offtake_running_sum", "hourly_dayahead_dol_per_kwh", "solar_available_kwh",
+    "gh2_storage_level_kg")]
+
+ON_FAILURE = ("raise", "relax", "hold")
+
+
+class RollingHorizonFailure(RuntimeError):
+    pass
+
+
+# digest of the series a checkpoint was taken on
+def _series_hash(prices, solar, forecast=None):
+    series = {"prices": prices, "solar": solar}
+    if forecast is not None:
+        series["forecast"] = forecast
+    return params_hash(series)
+
+
+def _write_checkpoint(path, t, state, results, series_hash, horizon, commit):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as file:
+        np.savez(file, t=t, state=np.array([state[name] for name in INITIAL_STATE], dtype=float),
+                 series_hash=series_hash, horizon=horizon, commit=commit, **results)
+    os.replace(tmp, path)
+
+
+def _read_checkpoint(path, series_hash, horizon, commit, N):
+    with np.load(path) as checkpoint:
+        if str(checkpoint["series_hash"]) != series_hash or len(checkpoint["fallback"]) != N:
+            raise ValueError(f"checkpoint {path} was taken on different price / solar series")
+        if int(checkpoint["horizon"]) != horizon or int(checkpoint["commit"]) != commit:
+            raise ValueError(f"checkpoint {path} was taken with horizon={int(checkpoint['horizon'])}, "
+                             f"commit={int(checkpoint['commit'])}")
+        state = dict(zip(INITIAL_STATE, checkpoint["state"].tolist()))
+        results = {name: checkpoint[name].copy() for name in [*OPERATIONS_T_COLUMNS, "fallback"]}
+        return int(checkpoint["t"]), state, results
+
+
+# repeat the dispatch of hour t for the k hours after it (all set points zero
+# when row t is the initial state, not a dispatched hour), rebuilt within the
+# plant: production within nameplate, the compressor output feeding
+# liquefaction first and storage with the rest, liquefaction at the held rate
+# clipped to its nameplate and ramp limits with storage covering what the
+# compressor does not, and the storage outflows (to liquefaction and the fuel
+# cell) cut to the gas stored; the solar is cut to what is available and the
+# grid covers the rest of the load
+def _hold(results, state, t, k, plant, capacities):
+    dt = plant.dt_hours
+    held = {name: results[name][t] if t > 0 else 0.0 for name in HELD_COLUMNS}
+    compressed = min(held["compressor_produced_kg"], capacities["electrolyser_capacity_ph"] * dt,
+                     capacities["compressor_capacity_ph"] * dt)
+    target = held["compress_to_liquefaction"] + held["gh2_storage_outflow_kg"]
+    fuel_cell_target = min(held["fuel_cell_consumed_kg"], capacities["fuelcell_capacity_ph"] * dt)
+    capacity = capacities["liquefaction_capacity_ph"] * dt
+    grid_running_sum = state['grid_running_sum']
+    h2_offtake_running_sum = state['h2_offtake_running_sum']
+    level = state['gh2_storage_level_kg']
+    liquefaction = state['liquefaction_produced_kg']
+    for h in range(t+1, t+1+k):
+        liquefaction = min(max(target, liquefaction - plant.LIQUEFACTION_MAX_DOWN * dt * capacity),
+                           liquefaction + plant.LIQUEFACTION_MAX_UP * dt * capacity, capacity)
+        to_liquefaction = min(liquefaction, compressed)
+        inflow = compressed - to_liquefaction
+        stored = level + inflow
+        outflow = liquefaction - to_liquefaction
+        scale = min(1.0, stored / (outflow + fuel_cell_target)) if outflow + fuel_cell_target > 0 else 1.0
+        outflow, fuel_cell = scale * outflow, scale * fuel_cell_target
+        liquefaction = to_liquefaction + outflow
+        level = max(stored - outflow - fuel_cell, 0)
+        load = (plant.ELECTROLYSIS_EFFICIENCY + plant.COMPRESSION_EFFICIENCY) * compressed \
+            + plant.LIQUEFACTION_EFFICIENCY * liquefaction
+        solar = min(held["solar_production_kwh"], load,
+                    plant.SOLAR_CAPACITY * dt * results["solar_available_kwh"][h])
+        grid_running_sum += load - solar
+        h2_offtake_running_sum += liquefaction + fuel_cell
+
+        results["ci_slack"][h] = held["ci_slack"]
+        results["electrolyser_produced_kg"][h] = compressed
+        results["electrolyser_consumption_kwh"][h] = plant.ELECTROLYSIS_EFFICIENCY * compressed
+        results["compressor_produced_kg"][h] = compressed
+        results["compressor_consumption_kwh"][h] = plant.COMPRESSION_EFFICIENCY * compressed
+        results["compress_to_liquefaction"][h] = to_liquefaction
+        results["gh2_storge_inflow_kg"][h] = inflow
+        results["gh2_storage_outflow_kg"][h] = outflow
+        results["gh2_storage_net_inflow"][h] = inflow - outflow
+        results["fuel_cell_consumed_kg"][h] = fuel_cell
+        results["realtime_supplied_kwh"][h] = plant.FUEL_CELL_EFFICIENCY * fuel_cell
+        results["liquefaction_produced_kg"][h] = liquefaction
+        results["liquefaction_consumption_kwh"][h] = plant.LIQUEFACTION_EFFICIENCY * liquefaction
+        results["solar_production_kwh"][h] = solar
+        results["realtime_production_kwh"][h] = load - solar
+        results["gh2_storage_level_kg"][h] = level
+        results["grid_running_sum"][h] = grid_running_sum
+        results["h2_offtake_running_sum"][h] = h2_offtake_running_sum
+
+
+# Receding-horizon simulation over the whole price/solar series in one call.
+# Every solve looks `horizon` hours ahead and commits the next `commit` hours;
+# the previous solution shifted by `commit` hours is passed to the solver as a
+# warm start. Committed hours are written straight into preallocated arrays,
+# one row per hour of the input series (hour 0 is the initial state).
+#
+# capacities: dict with the *_capacity_ph keys of the facility summary
+# plant: remaining RollingHorizonModel arguments (SOLAR_CAPACITY, ..., formulation, solver, commitment,
+#        dt_hours; with dt_hours the series, horizon, commit and checkpoint_every count periods)
+#
+# With checkpoint_path the state and the rows committed so far are saved
+# every checkpoint_every hours (and when a failure is raised); resume=True
+# continues from that checkpoint. A window without a solution (infeasible, or
+# a solver error) is handled as on_failure says:
+#   "raise": raise RollingHorizonFailure
+#   "relax": re-solve it with the storage on/off logic relaxed to the LP and
+#            soft pins on the previous state (RollingHorizonModel.build_relaxed),
+#            and hold if that fails too
+#   "hold":  repeat the dispatch of the last committed hour for the next
+#            `commit` hours (zero dispatch before the first), advancing the
+#            running sums and the storage level, within the nameplates, the
+#            ramp limits and the gas stored (not re-optimised; only a previous
+#            state beyond the nameplate or an empty store breaks a ramp limit)
+# Hours not taken from a normal solve have fallback = 1.
+#
+# By default every window sees the realised prices (perfect foresight). With
+# price_forecast, an (N, horizon) array whose row t is the lookahead vector
+# known at hour t (e.g. from price_forecast.py), the windows are optimised on
+# the forecasts while the operations table keeps the realised prices, so its
+# KPIs are the profit of dispatching on the forecasts.
+def simulate_rolling_horizon(
+        price_series,
+        solar_series,
+        capacities,
+        horizon=24,
+        commit=1,
+        initial_state=None,
+        warm_start=True,
+        solve_kwargs=None,
+        checkpoint_path=None,
+        checkpoint_every=168,
+        resume=False,
+        on_failure="raise",
+        price_forecast=None,
+        **plant):
+    if not 1 <= commit < horizon:
+        raise ValueError(f"commit must be between 1 and horizon - 1, got {commit}")
+    if on_failure not in ON_FAILURE:
+        raise ValueError(f"on_failure must be one of {ON_FAILURE}, got {on_failure!r}")
+
+    hourly_dayahead_dol_per_kwh = np.asarray(price_series, dtype=float)
+    hourly_solar_production_kwh = np.asarray(solar_series, dtype=float)
+    N = len(hourly_dayahead_dol_per_kwh)
+    if len(hourly_solar_production_kwh) != N:
+        raise ValueError("price_series and solar_series must have the same length")
+    if price_forecast is not None:
+        price_forecast = np.asarray(price_forecast, dtype=float)
+        if price_forecast.shape != (N, horizon):
+            raise ValueError(f"price_forecast must have shape {(N, horizon)}, got {price_forecast.shape}")
+    series_hash = _series_hash(hourly_dayahead_dol_per_kwh, hourly_solar_production_kwh, price_forecast) \
+        if checkpoint_path is not None else None
+
+    # pad the end of the series so the last windows still see a full horizon
+    hourly_dayahead_dol_per_kwh = np.pad(hourly_dayahead_dol_per_kwh, (0, horizon), mode="edge")
+    hourly_solar_production_kwh = np.pad(hourly_solar_production_kwh, (0, horizon), mode="edge")
+
+    solve_kwargs = dict(solve_kwargs or {})
+
+    if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+        t, state, results = _read_checkpoint(checkpoint_path, series_hash, horizon, commit, N)
+    else:
+        t = 0
+        state = dict(INITIAL_STATE if initial_state is None else initial_state)
+        results = {name: np.zeros(N) for name in OPERATIONS_T_COLUMNS}
+        results["fallback"] = np.zeros(N)
+        results["hourly_dayahead_dol_per_kwh"][:] = hourly_dayahead_dol_per_kwh[:N]
+        results["solar_available_kwh"][:] = hourly_solar_production_kwh[:N]
+        results["grid_running_sum"][0] = state['grid_running_sum']
+        results["h2_offtake_running_sum"][0] = state['h2_offtake_running_sum']
+        results["gh2_storage_level_kg"][0] = state['gh2_storage_level_kg']
+        results["liquefaction_produced_kg"][0] = state['liquefaction_produced_kg']
+
+    def checkpoint():
+        if checkpoint_path is not None:
+            _write_checkpoint(checkpoint_path, t, state, results, series_hash, horizon, commit)
+
+    model = RollingHorizonModel(T=horizon, capacities=capacities, **plant)
+
+    solved = False
+    last_checkpoint = t
+    while t < N - 1:
+        k = min(commit, N - 1 - t)
+        window = (hourly_dayahead_dol_per_kwh[t:t+horizon] if price_forecast is None else price_forecast[t],
+                  hourly_solar_production_kwh[t:t+horizon])
+        if warm_start and solved:
+            model.shift_solution(commit)
+        try:
+            solved = model.step(*window, state, warm_start=warm_start, **solve_kwargs) is not None
+        except cp.error.SolverError:
+            solved = False
+        relaxed = False
+        if not solved and on_failure == "relax":
+            try:
+                solved = relaxed = model.solve_relaxed(**solve_kwargs) is not None
+            except cp.error.SolverError:
+                solved = False
+        if not solved and on_failure == "raise":
+            checkpoint()
+            raise RollingHorizonFailure(f"no solution for the window starting at hour {t} "
+                                        f"(status {model.problem.status})")
+
+        if solved:
+            committed = model.committed_columns(k)
+            # the committed hours keep the realised prices, not the forecasts
+            committed["hourly_dayahead_dol_per_kwh"] = hourly_dayahead_dol_per_kwh[t+1:t+1+k]
+            for name, column in committed.items():
+                results[name][t+1:t+1+k] = column
+            results["fallback"][t+1:t+1+k] = relaxed
+        else:
+            _hold(results, state, t, k, model.plant, capacities)
+            results["fallback"][t+1:t+1+k] = 1
+
+        state = {
+            "grid_running_sum": results["grid_running_sum"][t+k],
+            "h2_offtake_running_sum": results["h2_offtake_running_sum"][t+k],
+            "gh2_storage_level_kg": results["gh2_storage_level_kg"][t+k],
+            "liquefaction_produced_kg": results["liquefaction_produced_kg"][t+k],
+        }
+        t += k
+        if t - last_checkpoint >= checkpoint_every:
+            checkpoint()
+            last_checkpoint = t
 
-    return problem, operations_df, facility_summary, operations_t_vector
\ No newline at end of file
+    checkpoint()
+    return pd.DataFrame(results)
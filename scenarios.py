@@ -0,0 +1,111 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from annual_profit_optimisation import run_profit_maximisation
+from market_data import PRICE_SOURCES, load_aligned
+
+# Monte Carlo price / solar scenarios and the outcomes of a fixed design
+# across them.
+#
+#   library = load_day_library("LZ_HOUSTON")
+#   scenarios = bootstrap_scenarios(library, n=500, seed=0)
+#   outcomes = evaluate_scenarios(base_params, facility, scenarios, workers=8)
+#   outcome_percentiles(outcomes)
+#
+# Synthetic years are a seasonal block bootstrap of the historical days:
+# each block of block_days consecutive days is copied from a random source
+# year, starting within window_days of the same calendar day, so the
+# seasonal shape, the within-week autocorrelation and the price / solar
+# correlation of each day are kept. Scenarios are generated and evaluated
+# in chunks, so memory stays bounded by the chunks in flight however large
+# n is. The fixed capacities are dispatched with the sparse LP backend of
+# run_profit_maximisation.
+
+
+# the (years, days, 24) price and solar days of every year of `market` in
+# PRICE_SOURCES (by default the 2019 and 2023 real-time files); years are
+# cut to 365 days
+def load_day_library(zone, market="realtime", years=None):
+    years = sorted(year for source_market, year in PRICE_SOURCES if source_market == market) \
+        if years is None else list(years)
+    prices, solar = [], []
+    for year in years:
+        aligned = load_aligned(zone, year, market=market)
+        prices.append(aligned["hourly_dayahead_dol_per_kwh"][:365*24].reshape(365, 24))
+        solar.append(aligned["hourly_solar_production_kwh"][:365*24].reshape(365, 24))
+    return {"years": years, "prices": np.stack(prices), "solar": np.stack(solar)}
+
+
+# n synthetic years of `days` days, yielded as chunks of (prices, solar)
+# arrays of shape (chunk, days * 24)
+def bootstrap_scenarios(library, n, days=365, block_days=7, window_days=15, seed=None, chunk_size=32):
+    prices, solar = library["prices"], library["solar"]
+    Y, D, _ = prices.shape
+    block_days = min(block_days, D)
+    rng = np.random.default_rng(seed)
+    blocks = -(-days // block_days)
+    calendar_day = np.arange(blocks) * block_days
+
+    for first in range(0, n, chunk_size):
+        c = min(chunk_size, n - first)
+        year = rng.integers(Y, size=(c, blocks))
+        shift = rng.integers(-window_days, window_days + 1, size=(c, blocks))
+        start = np.clip(calendar_day + shift, 0, D - block_days)
+        day = (start[..., None] + np.arange(block_days)).reshape(c, -1)[:, :days]
+        year = np.repeat(year, block_days, axis=1)[:, :days]
+        yield prices[year, day].reshape(c, -1), solar[year, day].reshape(c, -1)
+
+
+def _evaluate_chunk(first, prices, solar, base_params, capacities, formulation, backend):
+    rows = []
+    for i in range(len(prices)):
+        problem, _, facility = run_profit_maximisation(**{
+            **base_params, "hourly_dayahead_dol_per_kwh": prices[i], "hourly_solar_production_kwh": solar[i],
+            "T": prices.shape[1], "fixed_capacities": capacities, "formulation": formulation, "backend": backend})
+        row = {"scenario": first + i, "status": problem.status}
+        row.update({key: value for key, value in (facility or {}).items() if np.isscalar(value) or value is None})
+        rows.append(row)
+    return rows
+
+
+# facility summary of the design `capacities` (a facility summary of
+# run_profit_maximisation) in every scenario, one row per scenario;
+# base_params holds the run_profit_maximisation arguments other than the
+# hourly series, T and fixed_capacities
+def evaluate_scenarios(base_params, capacities, scenarios, workers=None, formulation="lp", backend="sparse"):
+    workers = workers or os.cpu_count()
+    rows = []
+    first = 0
+
+    # serial in-process run, e.g. for debugging
+    if workers == 1:
+        for prices, solar in scenarios:
+            rows += _evaluate_chunk(first, prices, solar, base_params, capacities, formulation, backend)
+            first += len(prices)
+        return pd.DataFrame(rows)
+
+    # at most two chunks per worker in flight
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for prices, solar in scenarios:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows += future.result()
+            pending.add(executor.submit(_evaluate_chunk, first, prices, solar, base_params, capacities,
+                                        formulation, backend))
+            first += len(prices)
+        for future in wait(pending).done:
+            rows += future.result()
+
+    return pd.DataFrame(rows).sort_values("scenario").reset_index(drop=True)
+
+
+# percentiles of the scenario outcomes, one row per percentile
+def outcome_percentiles(outcomes, columns=("total_profit", "lcoh_dol_per_kg"), percentiles=(5, 25, 50, 75, 95)):
+    values = outcomes[list(columns)].to_numpy(dtype=float)
+    return pd.DataFrame(np.nanpercentile(values, percentiles, axis=0), index=pd.Index(percentiles, name="percentile"),
+                        columns=list(columns))
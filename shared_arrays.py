@@ -0,0 +1,52 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# NumPy arrays handed to worker processes through shared memory instead of
+# being pickled with every task.
+#
+#   blocks, descriptors = share_arrays({"prices": prices, "T": 8760})    # parent, arrays only
+#   ProcessPoolExecutor(initializer=attach_arrays, initargs=(descriptors,))
+#   prices = attached["prices"]                                          # worker, read-only
+#   release(blocks)                                                      # parent, workers done
+#
+# The parent owns the blocks and unlinks them in release; each worker keeps
+# its attached blocks open for the life of the process.
+
+# arrays attached in this process, by name
+attached = {}
+_attached_blocks = []
+
+
+# copy the array entries of `values` (ndarrays and Series; other values are
+# skipped) into new shared memory blocks; returns the blocks and the
+# descriptors a worker attaches them by
+def share_arrays(values):
+    blocks = []
+    descriptors = {}
+    for name, value in values.items():
+        if isinstance(value, (np.ndarray, pd.Series)):
+            array = np.ascontiguousarray(np.asarray(value, dtype=float))
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            blocks.append(block)
+            descriptors[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, descriptors
+
+
+# attach the arrays of share_arrays' descriptors (read-only) into `attached`
+def attach_arrays(descriptors):
+    for name, (block_name, shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        _attached_blocks.append(block)
+        attached[name] = array
+    return attached
+
+
+def release(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
@@ -0,0 +1,114 @@
+import inspect
+import os
+import pickle
+
+from market_data import CACHE_DIR
+from results_store import params_hash
+
+# Content-addressed cache of solved cases.
+#
+# A case is keyed on the entry point and all of its arguments: the scalar
+# parameters, the price and solar arrays by content digest, and the
+# formulation, solver config, commitment mode and initial state. A hit costs
+# a file read instead of a solve:
+#
+#   cache = SolveCache()
+#   problem, operations_df, facility = cache.run(run_profit_maximisation, **params)
+#   cached_rolling = cache.wrap(run_rolling_horizon_opt)
+#
+# On a hit `problem` is a CachedProblem holding the stored status and value,
+# and with return_stats=True the stats of the original solve are returned.
+# Entries are pickles under data/cache/solves; once they exceed max_bytes
+# the least recently used are evicted.
+
+SOLVE_CACHE_DIR = os.path.join(CACHE_DIR, "solves")
+# bumped whenever the cached entry layout or the models' results change
+SOLVE_CACHE_LAYOUT = 1
+
+
+# status and objective value of a cached solve, in place of the cvxpy problem
+class CachedProblem:
+
+    def __init__(self, status, value):
+        self.status = status
+        self.value = value
+
+
+class SolveCache:
+
+    def __init__(self, cache_dir=SOLVE_CACHE_DIR, max_bytes=2 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    # key of a call of `run`, independent of whether the arguments are given
+    # by position or by name and of return_stats
+    def key(self, run, args, kwargs):
+        arguments = inspect.signature(run).bind(*args, **kwargs)
+        arguments.apply_defaults()
+        params = dict(arguments.arguments)
+        params.pop("return_stats", None)
+        params["__run__"] = f"{run.__module__}.{run.__qualname__}"
+        params["__layout__"] = SOLVE_CACHE_LAYOUT
+        return params_hash(params)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def run(self, run, *args, return_stats=False, **kwargs):
+        path = self._path(self.key(run, args, kwargs))
+        try:
+            with open(path, "rb") as file:
+                entry = pickle.load(file)
+            # mark as recently used
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            result = run(*args, return_stats=True, **kwargs)
+            problem, outputs, stats = result[0], result[1:-1], result[-1]
+            entry = (CachedProblem(problem.status, problem.value), outputs, stats)
+            self._write(path, entry)
+            return (problem, *outputs, stats) if return_stats else (problem, *outputs)
+
+        problem, outputs, stats = entry
+        return (problem, *outputs, stats) if return_stats else (problem, *outputs)
+
+    def wrap(self, run):
+        def cached_run(*args, **kwargs):
+            return self.run(run, *args, **kwargs)
+        cached_run.__name__ = run.__name__
+        cached_run.__doc__ = run.__doc__
+        return cached_run
+
+    def _write(self, path, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    # drop the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, name))
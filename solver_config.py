@@ -0,0 +1,171 @@
+import time
+from dataclasses import asdict, dataclass, field
+
+import cvxpy as cp
+
+from storage_formulation import default_solve_options
+
+# Solver choice / settings for the optimisation entry points and the
+# statistics of a solve.
+#
+#   config = SolverConfig(solver="HIGHS", threads=4, mip_gap=1e-3, time_limit=60)
+#   problem, operations_df, facility, stats = run_profit_maximisation(
+#       ..., solver=config, return_stats=True)
+#
+# Without a config the entry points keep their defaults (HiGHS for LPs, see
+# default_solve_options, cvxpy's choice for MILPs).
+
+# solver option names of the common settings, per cvxpy solver; settings a
+# solver has no option for raise instead of being silently dropped
+SOLVER_OPTION_NAMES = {
+    cp.HIGHS: {"threads": "threads", "mip_gap": "mip_rel_gap", "time_limit": "time_limit"},
+    cp.SCIPY: {"mip_gap": "mip_rel_gap", "time_limit": "time_limit"},
+    cp.CLARABEL: {"time_limit": "time_limit"},
+    cp.SCS: {"time_limit": "time_limit_secs"},
+    cp.GUROBI: {"threads": "Threads", "mip_gap": "MIPGap", "time_limit": "TimeLimit"},
+    cp.CPLEX: {"threads": "threads", "mip_gap": "mip.tolerances.mipgap", "time_limit": "timelimit"},
+    cp.SCIP: {"threads": "parallel/maxnthreads", "mip_gap": "limits/gap", "time_limit": "limits/time"},
+}
+# solvers taking their options in one nested dict
+NESTED_OPTIONS = {cp.HIGHS: "highs_options", cp.SCIPY: "scipy_options", cp.CPLEX: "cplex_params",
+                  cp.SCIP: "scip_params"}
+
+
+@dataclass(frozen=True)
+class SolverConfig:
+    # cvxpy solver name; None keeps the default choice (HiGHS when any setting is given)
+    solver: str = None
+    threads: int = None
+    # relative MIP gap
+    mip_gap: float = None
+    # seconds
+    time_limit: float = None
+    warm_start: bool = False
+    # further solver-specific options, passed through unchanged
+    options: dict = field(default_factory=dict)
+
+    def settings(self):
+        return {name: value for name, value in
+                (("threads", self.threads), ("mip_gap", self.mip_gap), ("time_limit", self.time_limit))
+                if value is not None}
+
+    # keyword arguments of problem.solve for a model of `formulation` over T hours
+    def solve_kwargs(self, formulation, T):
+        kwargs = default_solve_options(formulation, T)
+        if self.solver is not None and self.solver != kwargs.get("solver"):
+            kwargs = {"solver": self.solver}
+        elif "solver" not in kwargs and (self.settings() or self.options):
+            kwargs = {"solver": cp.HIGHS}
+        solver = kwargs.get("solver")
+
+        options = {}
+        names = SOLVER_OPTION_NAMES.get(solver, {})
+        for setting, value in self.settings().items():
+            if setting not in names:
+                raise ValueError(f"solver {solver} has no option for {setting}")
+            options[names[setting]] = value
+        options.update(self.options)
+
+        nested = NESTED_OPTIONS.get(solver)
+        if nested is not None:
+            kwargs[nested] = {**kwargs.get(nested, {}), **options}
+        else:
+            kwargs.update(options)
+        if self.warm_start:
+            kwargs["warm_start"] = True
+        return kwargs
+
+    # options of scipy.optimize.linprog / milp for the sparse backend
+    def scipy_options(self, formulation):
+        if self.threads is not None:
+            raise ValueError("scipy.optimize has no option for threads")
+        options = dict(self.options)
+        if self.time_limit is not None:
+            options["time_limit"] = self.time_limit
+        if self.mip_gap is not None and formulation == "milp":
+            options["mip_rel_gap"] = self.mip_gap
+        return options
+
+
+@dataclass
+class SolveStats:
+    status: str
+    objective: float
+    # best bound on the objective (the objective itself for a solved LP)
+    objective_bound: float
+    mip_gap: float
+    solver: str
+    # model construction: cvxpy canonicalization, or sparse matrix assembly
+    canonicalization_time: float
+    solve_time: float
+    # wall time of problem.solve (canonicalization + solver + unpacking)
+    wall_time: float
+    iterations: int
+    node_count: int
+    num_variables: int
+    num_integer_variables: int
+    num_constraints: int
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# problem.solve with the default options or those of `solver` (a
+# SolverConfig); returns its wall time
+def solve_problem(problem, formulation, T, solver=None, **solve_kwargs):
+    kwargs = default_solve_options(formulation, T) if solver is None else solver.solve_kwargs(formulation, T)
+    start = time.perf_counter()
+    problem.solve(**{**kwargs, **solve_kwargs})
+    return time.perf_counter() - start
+
+
+def _highs_value(info, name):
+    value = getattr(info, name, None)
+    return None if value is None or abs(value) == float("inf") else value
+
+
+def solve_stats(problem, wall_time=None):
+    # the sparse backend records its own statistics
+    if hasattr(problem, "solve_stats"):
+        return problem.solve_stats()
+
+    stats = problem.solver_stats
+    info = stats.extra_stats if stats is not None else None
+    sizes = problem.size_metrics
+    integer = sum(variable.size for variable in problem.variables()
+                  if variable.attributes["boolean"] or variable.attributes["integer"])
+
+    iterations = stats.num_iters if stats is not None else None
+    node_count = None
+    mip_gap = None
+    bound = problem.value if problem.status == cp.OPTIMAL and not integer else None
+    if info is not None and hasattr(info, "mip_node_count"):
+        if iterations is None:
+            iterations = (info.simplex_iteration_count or 0) + (info.ipm_iteration_count or 0)
+        if integer:
+            node_count = info.mip_node_count
+            mip_gap = _highs_value(info, "mip_gap")
+            dual_bound = _highs_value(info, "mip_dual_bound")
+            primal = _highs_value(info, "objective_function_value")
+            # HiGHS minimises and leaves out constant terms, so shift the
+            # problem's objective by the solver's primal-dual difference
+            if dual_bound is not None and primal is not None and problem.value is not None:
+                difference = dual_bound - primal
+                bound = problem.value - difference if isinstance(problem.objective, cp.Maximize) \
+                    else problem.value + difference
+
+    return SolveStats(
+        status=problem.status,
+        objective=problem.value,
+        objective_bound=bound,
+        mip_gap=mip_gap,
+        solver=stats.solver_name if stats is not None else None,
+        canonicalization_time=getattr(problem, "compilation_time", None),
+        solve_time=stats.solve_time if stats is not None else None,
+        wall_time=wall_time,
+        iterations=iterations,
+        node_count=node_count,
+        num_variables=sizes.num_scalar_variables,
+        num_integer_variables=integer,
+        num_constraints=sizes.num_scalar_eq_constr + sizes.num_scalar_leq_constr,
+    )
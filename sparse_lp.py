@@ -0,0 +1,416 @@
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+
+from h2_plant import (CAPACITY_FACTOR_KPIS, CAPEX_KPIS, PER_KG_KPIS, SALES_KPIS, compute_kpis, results_array,
+                      select_kpis)
+from solver_config import SolveStats
+from storage_formulation import STORAGE_BIG_M, STORAGE_CYCLING_COST_DOL_per_kg, check_formulation
+
+# Direct sparse assembly of the annual models.
+#
+# build_lp_matrices writes the rows of run_profit_maximisation (or, with
+# objective="levelised", run_levelised_cost_minimisation) straight into
+# scipy.sparse CSR matrices with vectorised index arithmetic, skipping the
+# cvxpy expression trees, and solve_lp_matrices hands them to HiGHS through
+# scipy.optimize.linprog (LP) or scipy.optimize.milp (MILP).
+#
+#   problem, operations_df, facility = run_sparse(params, T, objective="profit")
+#
+# params holds the run_* arguments by name, as in parameter_sweep. Every
+# block of rows is a handful of index arrays, so the memory of the build
+# grows linearly with T (the 100k periods of a year of 5-minute intervals
+# included); params["dt_hours"] sets the period length as in PlantParams.
+
+# hourly variables, in column order; each occupies T columns (the storage
+# level T+1), followed by the four nameplate capacities
+HOURLY_VARIABLES = (
+    "realtime_consumption",
+    "realtime_supplied",
+    "solar_consumed_facility",
+    "electrolyser_throughput",
+    "compressor_throughput",
+    "compressor_to_liquefaction",
+    "liquefacion_throughput",
+    "fuel_cell_throughput",
+    "gh2_storage_inflow",
+    "gh2_storage_outflow",
+    "gh2_storage_active",
+    "gh2_storage_level",
+)
+CAPACITY_VARIABLES = (
+    "electrolyser_nameplate_capacity_hour",
+    "compressor_nameplate_capacity_hour",
+    "liquefaction_nameplate_capacity_hour",
+    "fuelcell_nameplate_capacity_hour",
+)
+OBJECTIVES = ("profit", "levelised")
+# model construction of the annual entry points
+BACKENDS = ("cvxpy", "sparse")
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+
+
+def column_layout(T):
+    columns = {}
+    start = 0
+    for name in HOURLY_VARIABLES:
+        size = T + 1 if name == "gh2_storage_level" else T
+        columns[name] = np.arange(start, start + size)
+        start += size
+    for name in CAPACITY_VARIABLES:
+        columns[name] = start
+        start += 1
+    return columns, start
+
+
+# block of rows: rows[i] gets coefficient data[i] in column cols[i]
+class _RowBuilder:
+
+    def __init__(self):
+        self.rows = []
+        self.cols = []
+        self.data = []
+        self.rhs = []
+        self.num_rows = 0
+
+    # one row per hour (len(rhs) rows) with the given {column array: coefficient} terms
+    def add(self, terms, rhs):
+        rhs = np.asarray(rhs, dtype=float)
+        n = rhs.size
+        rows = self.num_rows + np.arange(n)
+        for cols, coefficient in terms:
+            cols = np.broadcast_to(cols, (n,))
+            self.rows.append(rows)
+            self.cols.append(cols)
+            self.data.append(np.broadcast_to(np.asarray(coefficient, dtype=float), (n,)))
+        self.rhs.append(np.broadcast_to(rhs, (n,)))
+        self.num_rows += n
+
+    # a single row summing coefficient * x over every column of `cols`
+    def add_sum(self, terms, rhs):
+        for cols, coefficient in terms:
+            cols = np.atleast_1d(cols)
+            self.rows.append(np.full(cols.size, self.num_rows))
+            self.cols.append(cols)
+            self.data.append(np.broadcast_to(np.asarray(coefficient, dtype=float), (cols.size,)))
+        self.rhs.append(np.array([rhs], dtype=float))
+        self.num_rows += 1
+
+    def matrix(self, num_columns):
+        if not self.rows:
+            return sp.csr_array((0, num_columns)), np.zeros(0)
+        matrix = sp.coo_array((np.concatenate(self.data), (np.concatenate(self.rows), np.concatenate(self.cols))),
+                              shape=(self.num_rows, num_columns))
+        return matrix.tocsr(), np.concatenate(self.rhs)
+
+
+# A/b/c/bounds of the annual model. The objective is always minimised
+# (profit is returned negated, see "sense").
+def build_lp_matrices(params, T, objective="profit", formulation="lp", fixed_capacities=None):
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}, got {objective!r}")
+    check_formulation(formulation)
+    if formulation == "auto":
+        raise ValueError("build_lp_matrices needs formulation 'lp' or 'milp'")
+    profit = objective == "profit"
+    columns, n = column_layout(T)
+    c = columns
+
+    prices = np.asarray(params["hourly_dayahead_dol_per_kwh"], dtype=float)[:T]
+    solar = np.asarray(params["hourly_solar_production_kwh"], dtype=float)[:T]
+    ELECTROLYSIS_EFFICIENCY = params["ELECTROLYSIS_EFFICIENCY"]
+    COMPRESSION_EFFICIENCY = params["COMPRESSION_EFFICIENCY"]
+    LIQUEFACTION_EFFICIENCY = params["LIQUEFACTION_EFFICIENCY"]
+    LIQUEFACTION_MAX_UP = params["LIQUEFACTION_MAX_UP"]
+    LIQUEFACTION_MAX_DOWN = params["LIQUEFACTION_MAX_DOWN"]
+    ERCTO_CO2_kg_per_kwh = params["ERCTO_CO2_kg_per_kwh"]
+    GREEN_THRESHOLD_kg_per_kg = params["GREEN_THRESHOLD_kg_per_kg"]
+    # period length: capacities and solar per period, ramp limits per period of nameplate
+    dt = params.get("dt_hours", 1.0)
+
+    lower = np.zeros(n)
+    upper = np.full(n, np.inf)
+    # restrict the amount of solar that can be consumed
+    upper[c["solar_consumed_facility"]] = params["SOLAR_CAPACITY"] * dt * solar
+    # set initial storage levels to empty
+    upper[c["gh2_storage_level"][0]] = 0
+    upper[c["gh2_storage_active"]] = 1
+    if not profit:
+        # no fuel cell in the levelised model
+        upper[c["fuel_cell_throughput"]] = 0
+        upper[c["realtime_supplied"]] = 0
+        upper[c["fuelcell_nameplate_capacity_hour"]] = 0
+    if fixed_capacities is not None:
+        for name, key in zip(CAPACITY_VARIABLES, ("electrolyser_capacity_ph", "compressor_capacity_ph",
+                                                  "liquefaction_capacity_ph", "fuelcell_capacity_ph")):
+            if key in fixed_capacities:
+                lower[c[name]] = upper[c[name]] = fixed_capacities[key]
+
+    equality = _RowBuilder()
+    zeros = np.zeros(T)
+    # power balance equation: sum of electricity in = amount consumed
+    equality.add([
+        (c["realtime_consumption"], 1),
+        (c["solar_consumed_facility"], 1),
+        (c["electrolyser_throughput"], -ELECTROLYSIS_EFFICIENCY),
+        (c["compressor_throughput"], -COMPRESSION_EFFICIENCY),
+        (c["liquefacion_throughput"], -LIQUEFACTION_EFFICIENCY),
+    ], zeros)
+    # add fuel cell offtake
+    if profit:
+        equality.add([(c["fuel_cell_throughput"], params["FUEL_CELL_EFFICIENCY"]), (c["realtime_supplied"], -1)], zeros)
+    # balance mass through system
+    equality.add([(c["electrolyser_throughput"], 1), (c["compressor_throughput"], -1)], zeros)
+    equality.add([(c["compressor_throughput"], 1), (c["compressor_to_liquefaction"], -1),
+                  (c["gh2_storage_inflow"], -1)], zeros)
+    equality.add([(c["liquefacion_throughput"], 1), (c["compressor_to_liquefaction"], -1),
+                  (c["gh2_storage_outflow"], -1)], zeros)
+    level = c["gh2_storage_level"]
+    equality.add([(level[1:T+1], 1), (level[0:T], -1), (c["gh2_storage_inflow"], -1),
+                  (c["gh2_storage_outflow"], 1), (c["fuel_cell_throughput"], 1)], zeros)
+
+    inequality = _RowBuilder()
+    # add 'green' constraint; restrict amount that can be taken from grid
+    if profit:
+        inequality.add_sum([(c["realtime_consumption"], ERCTO_CO2_kg_per_kwh),
+                            (c["liquefacion_throughput"], -GREEN_THRESHOLD_kg_per_kg),
+                            (c["fuel_cell_throughput"], -GREEN_THRESHOLD_kg_per_kg)], 0)
+    else:
+        inequality.add_sum([(c["realtime_consumption"], ERCTO_CO2_kg_per_kwh)],
+                           GREEN_THRESHOLD_kg_per_kg * (params["OFFTAKE_TPD"] * params["NUM_DAYS"]))
+    # operational constraints of equipment
+    for throughput, capacity in (("electrolyser_throughput", "electrolyser_nameplate_capacity_hour"),
+                                 ("compressor_throughput", "compressor_nameplate_capacity_hour"),
+                                 ("liquefacion_throughput", "liquefaction_nameplate_capacity_hour"),
+                                 ("fuel_cell_throughput", "fuelcell_nameplate_capacity_hour")):
+        if profit or throughput != "fuel_cell_throughput":
+            inequality.add([(c[throughput], 1), (c[capacity], -dt)], zeros)
+    # ramp constraints throughput constraints
+    liquefaction = c["liquefacion_throughput"]
+    inequality.add([(liquefaction[1:T], 1), (liquefaction[0:T-1], -1),
+                    (c["liquefaction_nameplate_capacity_hour"], -LIQUEFACTION_MAX_UP * dt * dt)], zeros[1:])
+    inequality.add([(liquefaction[0:T-1], 1), (liquefaction[1:T], -1),
+                    (c["liquefaction_nameplate_capacity_hour"], -LIQUEFACTION_MAX_DOWN * dt * dt)], zeros[1:])
+    # big-M constraint to only turn on storage if used
+    inequality.add([(c["compressor_throughput"], 1), (c["liquefacion_throughput"], -1),
+                    (c["gh2_storage_active"], -STORAGE_BIG_M)], zeros)
+    inequality.add([(c["gh2_storage_inflow"], 1), (c["gh2_storage_active"], -STORAGE_BIG_M)], zeros)
+    inequality.add([(c["gh2_storage_outflow"], 1), (c["gh2_storage_active"], -STORAGE_BIG_M)], zeros)
+
+    # costs, minimised: electricity from the dayahead market and the solar
+    # ppa, capex per kg per day of nameplate (24 * hourly capacity)
+    cost = np.zeros(n)
+    cost[c["realtime_consumption"]] = prices
+    cost[c["solar_consumed_facility"]] = params["SOLAR_PPA_DOL_KWH"]
+    cost[c["electrolyser_nameplate_capacity_hour"]] = 24 * params["ELECTROLYSIS_CAPEX_DOL_kgPD"]
+    cost[c["compressor_nameplate_capacity_hour"]] = 24 * params["COMPRESSOR_CAPEX_DOL_kgPD"]
+    cost[c["liquefaction_nameplate_capacity_hour"]] = 24 * params["LIQUEFACTION_CAPEX_DOL_kgPD"]
+    if profit:
+        cost[c["fuelcell_nameplate_capacity_hour"]] = 24 * params["FUELCELL_CAPEX_DOL_kgPD"]
+        cost[c["realtime_supplied"]] = -prices
+        cost[c["liquefacion_throughput"]] = -params["H2_SALES_PRICE_DOL_per_kg"]
+    if formulation == "lp":
+        # discourage simultaneous storage charge/discharge in the LP formulation
+        cost[c["gh2_storage_inflow"]] += STORAGE_CYCLING_COST_DOL_per_kg
+        cost[c["gh2_storage_outflow"]] += STORAGE_CYCLING_COST_DOL_per_kg
+
+    integrality = np.zeros(n, dtype=np.uint8)
+    if formulation == "milp":
+        integrality[c["gh2_storage_active"]] = 1
+
+    A_eq, b_eq = equality.matrix(n)
+    A_ub, b_ub = inequality.matrix(n)
+    return {
+        "c": cost,
+        "A_ub": A_ub,
+        "b_ub": b_ub,
+        "A_eq": A_eq,
+        "b_eq": b_eq,
+        "lower": lower,
+        "upper": upper,
+        "integrality": integrality,
+        "columns": columns,
+        # objective value of the model = sense * c @ x
+        "sense": -1 if profit else 1,
+        "objective": objective,
+        "formulation": formulation,
+        "T": T,
+    }
+
+
+# result of solve_lp_matrices; value and status mirror the cvxpy problem
+class SparseProblem:
+
+    def __init__(self, matrices, result, build_time, solve_time):
+        self.status = SCIPY_STATUS.get(result.status, "solver_error")
+        self.x = result.x
+        self.value = None if result.x is None else matrices["sense"] * result.fun
+        self.message = result.message
+        self.build_time = build_time
+        self.solve_time = solve_time
+        self.matrices = matrices
+        self.result = result
+
+    def solve_stats(self):
+        matrices = self.matrices
+        result = self.result
+        integer = int(matrices["integrality"].sum())
+        bound = self.value if self.status == "optimal" and not integer else None
+        if integer and getattr(result, "mip_dual_bound", None) is not None:
+            bound = matrices["sense"] * result.mip_dual_bound
+        return SolveStats(
+            status=self.status,
+            objective=self.value,
+            objective_bound=bound,
+            mip_gap=getattr(result, "mip_gap", None) if integer else None,
+            solver="SCIPY-HIGHS",
+            canonicalization_time=self.build_time,
+            solve_time=self.solve_time,
+            wall_time=self.build_time + self.solve_time,
+            iterations=getattr(result, "nit", None),
+            node_count=getattr(result, "mip_node_count", None) if integer else None,
+            num_variables=len(matrices["c"]),
+            num_integer_variables=integer,
+            num_constraints=matrices["A_eq"].shape[0] + matrices["A_ub"].shape[0],
+        )
+
+
+# scipy status codes -> cvxpy status strings
+SCIPY_STATUS = {0: "optimal", 1: "user_limit", 2: "infeasible", 3: "unbounded", 4: "solver_error"}
+
+
+def solve_lp_matrices(matrices, build_time=0.0, **options):
+    start = time.perf_counter()
+    if matrices["formulation"] == "milp":
+        constraints = [LinearConstraint(matrices["A_eq"], matrices["b_eq"], matrices["b_eq"])]
+        if matrices["A_ub"].shape[0]:
+            constraints.append(LinearConstraint(matrices["A_ub"], -np.inf, matrices["b_ub"]))
+        result = milp(matrices["c"], constraints=constraints, integrality=matrices["integrality"],
+                      bounds=Bounds(matrices["lower"], matrices["upper"]), options=options or None)
+    else:
+        result = linprog(matrices["c"], A_ub=matrices["A_ub"], b_ub=matrices["b_ub"],
+                         A_eq=matrices["A_eq"], b_eq=matrices["b_eq"],
+                         bounds=np.column_stack([matrices["lower"], matrices["upper"]]),
+                         method="highs", options=options or None)
+    return SparseProblem(matrices, result, build_time, time.perf_counter() - start)
+
+
+# operations_df / facility summary in the layout of the cvxpy functions
+def sparse_results(matrices, params, problem):
+    T = matrices["T"]
+    c = matrices["columns"]
+    x = problem.x
+    value = {name: x[c[name]] for name in HOURLY_VARIABLES + CAPACITY_VARIABLES}
+    prices = np.asarray(params["hourly_dayahead_dol_per_kwh"], dtype=float)[:T]
+
+    operations = {
+        "hourly_dayahead_dol_per_kwh": prices,
+        "realtime_production_kwh": value["realtime_consumption"],
+        "realtime_supplied_kwh": value["realtime_supplied"],
+        "solar_production_kwh": value["solar_consumed_facility"],
+        "electrolyser_consumption_kwh": params["ELECTROLYSIS_EFFICIENCY"]*value["electrolyser_throughput"],
+        "compressor_consumption_kwh": params["COMPRESSION_EFFICIENCY"]*value["compressor_throughput"],
+        "liquefaction_consumption_kwh": params["LIQUEFACTION_EFFICIENCY"]*value["liquefacion_throughput"],
+        "electrolyser_produced_kg": value["electrolyser_throughput"],
+        "compressor_produced_kg": value["compressor_throughput"],
+        "liquefaction_produced_kg": value["liquefacion_throughput"],
+        "compress_to_liquefaction": value["compressor_to_liquefaction"],
+        "fuel_cell_consumed_kg": value["fuel_cell_throughput"],
+        "gh2_storage_level_kg": value["gh2_storage_level"][0:T],
+        "gh2_storage_net_inflow": value["gh2_storage_inflow"] - value["gh2_storage_outflow"],
+        "gh2_storge_inflow_kg": value["gh2_storage_inflow"],
+        "gh2_storage_outflow_kg": value["gh2_storage_outflow"],
+    }
+    facility = {
+        "electrolyser_capacity_ph": value["electrolyser_nameplate_capacity_hour"],
+        "compressor_capacity_ph": value["compressor_nameplate_capacity_hour"],
+        "liquefaction_capacity_ph": value["liquefaction_nameplate_capacity_hour"],
+    }
+
+    if matrices["objective"] == "levelised":
+        for name in ("realtime_supplied_kwh", "fuel_cell_consumed_kg"):
+            operations.pop(name)
+        kpis = compute_kpis(results_array(operations), facility, params)
+        facility.update(select_kpis(kpis, CAPEX_KPIS[0:3] + CAPACITY_FACTOR_KPIS[0:3] + PER_KG_KPIS))
+    else:
+        facility["fuelcell_capacity_ph"] = value["fuelcell_nameplate_capacity_hour"]
+        kpis = compute_kpis(results_array(operations), facility, params)
+        facility.update({
+            **select_kpis(kpis, SALES_KPIS),
+            "total_profit": problem.value,
+            **select_kpis(kpis, CAPEX_KPIS + CAPACITY_FACTOR_KPIS + PER_KG_KPIS),
+        })
+    facility["formulation"] = matrices["formulation"]
+    facility["lp_milp_gap"] = None
+    return pd.DataFrame(operations), facility
+
+
+# solver: optional SolverConfig (time limit, MIP gap, extra scipy options)
+def run_sparse(params, T, objective="profit", formulation="lp", fixed_capacities=None, solver=None, **options):
+    start = time.perf_counter()
+    matrices = build_lp_matrices(params, T, objective, formulation, fixed_capacities)
+    if solver is not None:
+        options = {**solver.scipy_options(formulation), **options}
+    problem = solve_lp_matrices(matrices, build_time=time.perf_counter() - start, **options)
+    if problem.x is None:
+        return problem, None, None
+    operations_df, facility = sparse_results(matrices, params, problem)
+    return problem, operations_df, facility
+
+
+# objective of the sparse backend against the cvxpy model for the same
+# params; run is run_profit_maximisation or run_levelised_cost_minimisation
+def cross_check(run, params, T, objective="profit", formulation="lp", rtol=1e-6):
+    start = time.perf_counter()
+    cvxpy_problem, _, _ = run(**params, T=T, formulation=formulation)
+    cvxpy_time = time.perf_counter() - start
+
+    sparse_problem, _, _ = run_sparse(params, T, objective, formulation)
+    error = abs(sparse_problem.value - cvxpy_problem.value) / max(abs(cvxpy_problem.value), 1.0)
+    return {
+        "objective": objective,
+        "formulation": formulation,
+        "T": T,
+        "cvxpy_objective": cvxpy_problem.value,
+        "sparse_objective": sparse_problem.value,
+        "relative_error": error,
+        "match": error <= rtol,
+        "cvxpy_time_s": cvxpy_time,
+        "sparse_build_time_s": sparse_problem.build_time,
+        "sparse_solve_time_s": sparse_problem.solve_time,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import inspect
+
+    from annual_profit_optimisation import run_levelised_cost_minimisation, run_profit_maximisation
+    from benchmark_representative_days import profit_args
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=int, nargs="+", default=[168, 720])
+    parser.add_argument("--formulation", nargs="+", default=["lp", "milp"])
+    args = parser.parse_args()
+
+    checks = []
+    for hours in args.hours:
+        params = dict(zip(inspect.signature(run_profit_maximisation).parameters, profit_args(hours)))
+        params.pop("T")
+        levelised = {name: params[name] for name in inspect.signature(run_levelised_cost_minimisation).parameters
+                     if name in params}
+        for formulation in args.formulation:
+            checks.append(cross_check(run_profit_maximisation, params, hours, "profit", formulation))
+            checks.append(cross_check(run_levelised_cost_minimisation, levelised, hours, "levelised", formulation))
+    checks = pd.DataFrame(checks)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(checks)
+    if not checks["match"].all():
+        raise SystemExit("sparse and cvxpy objectives differ")
@@ -0,0 +1,402 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import cvxpy as cp
+
+from benders_decomposition import STALL_ITERATIONS, blend_linking, capacity_bounds_from_data, check_capacity_bounds
+from h2_plant import (CAPACITY_FACTOR_KPIS, CAPACITY_KEYS, CAPEX_KPIS, PER_KG_KPIS, SALES_KPIS, PlantParams,
+                      PlantVariables, capacity_limits, capex, compute_kpis, electricity_cost, electricity_revenue,
+                      green_cap, h2_revenue, hourly_columns, mass_balance, power_balance, ramp, results_array, storage)
+from h2_plant.objective import CAPEX_PARAMS
+from shared_arrays import attach_arrays, release, share_arrays
+from solver_config import SolveStats, solve_stats
+from storage_formulation import default_solve_options
+
+# Two-stage stochastic sizing: one set of nameplate capacities against S
+# price / solar scenarios (LP formulation).
+#
+#   problem, operations_df, facility = run_stochastic_profit_maximisation(
+#       prices, solar, plant, probabilities=None, cvar_weight=0.2, cvar_alpha=0.1, workers=8)
+#
+# prices is (S, T); solar is (S, T) or one (T,) profile for every scenario.
+# The objective is
+#   (1 - cvar_weight) * E[dispatch profit] + cvar_weight * CVaR_alpha[dispatch profit] - capex
+# where CVaR_alpha is the mean of the worst alpha (probability) tail of the
+# scenarios. A monolithic model grows as S x T, so by default it is solved by
+# a multi-cut L-shaped decomposition: the master holds the capacities, one
+# value theta[s] per scenario bounded by the cuts of that scenario, and the
+# CVaR auxiliaries (Rockafellar-Uryasev); each scenario's dispatch at given
+# capacities is a subproblem compiled once per worker process and solved in
+# parallel, its value and the duals of the capacity fixing rows giving a cut
+#   theta[s] <= Q[s](x_k) + grad_k . (x - x_k)
+# Every dispatch is feasible at any capacities (the plant can idle), so no
+# feasibility cuts are needed. method="monolithic" builds the extensive form
+# instead, e.g. to check the decomposition on a few scenarios.
+
+METHODS = ("lshaped", "monolithic")
+
+
+# lower-tail CVaR of discrete outcomes: the probability-weighted mean of the
+# worst `alpha` of the distribution
+def cvar(values, probabilities, alpha):
+    order = np.argsort(values)
+    values = np.asarray(values, dtype=float)[order]
+    probabilities = np.asarray(probabilities, dtype=float)[order]
+    taken = np.minimum(probabilities, np.maximum(alpha - (np.cumsum(probabilities) - probabilities), 0))
+    return float(taken @ values / alpha)
+
+
+# dispatch profit of T hours at given capacities; prices, solar and the
+# capacities are parameters, so the model is compiled once and re-solved for
+# every scenario and master point
+class ScenarioDispatch:
+
+    def __init__(self, plant, T):
+        self.T = T
+        self.plant = plant
+        self.hourly_dayahead_dol_per_kwh = cp.Parameter(T)
+        self.hourly_solar_production_kwh = cp.Parameter(T, nonneg = True)
+
+        # capacities copied into variables by fixing rows whose duals are the
+        # slopes of the scenario's value in the capacities
+        self.capacities = {key: cp.Parameter(nonneg = True) for key in CAPACITY_KEYS}
+        fixed = {key: cp.Variable() for key in CAPACITY_KEYS}
+        self.fixing = {key: fixed[key] == parameter for key, parameter in self.capacities.items()}
+
+        self.v = v = PlantVariables(T, capacities=fixed)
+        constraints = list(self.fixing.values())
+        constraints += power_balance(v, plant, self.hourly_solar_production_kwh)
+        constraints += green_cap(v, plant)
+        constraints += capacity_limits(v)
+        constraints += ramp(v, plant)
+        constraints += storage(v, "lp")
+        constraints += mass_balance(v)
+
+        objective = -electricity_cost(v, plant, self.hourly_dayahead_dol_per_kwh) \
+            + electricity_revenue(v, self.hourly_dayahead_dol_per_kwh) + h2_revenue(v, plant) \
+            - v.storage_cycling_cost
+        self.problem = cp.Problem(cp.Maximize(objective), constraints)
+
+    def solve(self, prices, solar, capacities):
+        self.hourly_dayahead_dol_per_kwh.value = np.asarray(prices, dtype=float)
+        self.hourly_solar_production_kwh.value = np.asarray(solar, dtype=float)
+        for key, parameter in self.capacities.items():
+            parameter.value = capacities[key]
+        self.problem.solve(**default_solve_options("lp", self.T))
+        if self.problem.status not in ("optimal", "optimal_inaccurate"):
+            raise RuntimeError(f"scenario dispatch {self.problem.status}")
+        return self.problem.value, {key: float(row.dual_value) for key, row in self.fixing.items()}
+
+    def operations_df(self):
+        v = self.v
+        return pd.DataFrame({
+            "hourly_dayahead_dol_per_kwh": self.hourly_dayahead_dol_per_kwh.value,
+            "realtime_production_kwh": v.realtime_consumption.value,
+            "realtime_supplied_kwh": v.realtime_supplied.value,
+            "solar_production_kwh": v.solar_consumed_facility.value,
+            **hourly_columns(v, self.plant),
+        })
+
+
+# compiled dispatch models, plant and scenario arrays of this process
+_models = {}
+_plant = {}
+_arrays = {}
+
+
+def _init_worker(plant, descriptors):
+    _plant["plant"] = plant
+    _arrays.update(attach_arrays(descriptors))
+
+
+def _solve_scenario(s, capacities, operations=False):
+    prices = _arrays["hourly_dayahead_dol_per_kwh"][s]
+    T = len(prices)
+    if T not in _models:
+        _models[T] = ScenarioDispatch(_plant["plant"], T)
+    model = _models[T]
+    value, gradient = model.solve(prices, _arrays["hourly_solar_production_kwh"][s], capacities)
+    return value, gradient, model.operations_df() if operations else None
+
+
+class StochasticMaster:
+
+    # compiled once: cuts go into preallocated parameter rows
+    #   cut_theta @ theta <= cut_constant + cut_slope @ x
+    def __init__(self, plant, prices, probabilities, capacity_bounds, cvar_weight, cvar_alpha, max_cuts):
+        S, T = prices.shape
+        cap_max = np.array([capacity_bounds[key] for key in CAPACITY_KEYS], dtype=float)
+        self.x = cp.Variable(4)
+        self.theta = cp.Variable(S)
+
+        # most a scenario can earn: all liquefaction sold, fuel cell at the top price
+        revenue_bound = T * (plant.H2_SALES_PRICE_DOL_per_kg * cap_max[2]
+                             + np.maximum(prices.max(axis=1), 0) * plant.FUEL_CELL_EFFICIENCY * cap_max[3])
+        constraints = [self.x >= 0, self.x <= cap_max, self.theta <= revenue_bound]
+
+        self.cuts = {"theta": np.zeros((max_cuts, S)), "slope": np.zeros((max_cuts, 4)), "constant": np.zeros(max_cuts)}
+        self.num_cuts = 0
+        self.cut_theta = cp.Parameter((max_cuts, S))
+        self.cut_slope = cp.Parameter((max_cuts, 4))
+        self.cut_constant = cp.Parameter(max_cuts)
+        constraints += [self.cut_theta @ self.theta <= self.cut_constant + self.cut_slope @ self.x]
+
+        # CVaR of the scenario values: value at risk minus the expected
+        # shortfall below it, scaled by the tail probability
+        risk = probabilities @ self.theta
+        if cvar_weight > 0:
+            value_at_risk = cp.Variable()
+            shortfall = cp.Variable(S, nonneg = True)
+            constraints += [shortfall >= value_at_risk - self.theta]
+            risk = (1 - cvar_weight) * risk \
+                + cvar_weight * (value_at_risk - probabilities @ shortfall / cvar_alpha)
+
+        self.capex_dol_kgpd = np.array([getattr(plant, CAPEX_PARAMS[key]) for key in CAPACITY_KEYS], dtype=float)
+        self.problem = cp.Problem(cp.Maximize(risk - 24 * (self.capex_dol_kgpd @ self.x)), constraints)
+
+    def capex_of(self, design):
+        return 24 * sum(self.capex_dol_kgpd[i] * design[key] for i, key in enumerate(CAPACITY_KEYS))
+
+    # theta[s] <= value + gradient . (x - x_k)
+    def add_cut(self, s, value, gradient, design):
+        if self.num_cuts == len(self.cuts["constant"]):
+            raise RuntimeError("no cut rows left in the master")
+        row = self.num_cuts
+        self.cuts["theta"][row, s] = 1
+        self.cuts["slope"][row] = [gradient[key] for key in CAPACITY_KEYS]
+        self.cuts["constant"][row] = value - sum(gradient[key] * design[key] for key in CAPACITY_KEYS)
+        self.num_cuts += 1
+
+    def solve(self):
+        self.cut_theta.value = self.cuts["theta"]
+        self.cut_slope.value = self.cuts["slope"]
+        self.cut_constant.value = self.cuts["constant"]
+        self.problem.solve(**default_solve_options("lp", 0))
+        return self.problem.value
+
+    def design(self):
+        # clip solver noise so the fixing parameters stay nonnegative
+        return {key: max(float(self.x.value[i]), 0.0) for i, key in enumerate(CAPACITY_KEYS)}
+
+
+# status and objective of a decomposed solve, in place of a cvxpy problem
+class DecomposedProblem:
+
+    def __init__(self, status, value, bound, iterations, wall_time, num_variables):
+        self.status = status
+        self.value = value
+        self.bound = bound
+        self.iterations = iterations
+        self.wall_time = wall_time
+        self.num_variables = num_variables
+
+    def solve_stats(self):
+        return SolveStats(
+            status=self.status, objective=self.value, objective_bound=self.bound, mip_gap=None,
+            solver="L-SHAPED", canonicalization_time=None, solve_time=self.wall_time, wall_time=self.wall_time,
+            iterations=self.iterations, node_count=None, num_variables=self.num_variables,
+            num_integer_variables=0, num_constraints=None)
+
+
+def _lshaped(plant, prices, solar, probabilities, capacity_bounds, cvar_weight, cvar_alpha,
+             tolerance, max_iterations, in_out, workers, verbose):
+    S = len(prices)
+    master = StochasticMaster(plant, prices, probabilities, capacity_bounds, cvar_weight, cvar_alpha,
+                              max_cuts=S * max_iterations)
+    arrays = {"hourly_dayahead_dol_per_kwh": prices, "hourly_solar_production_kwh": solar}
+
+    # probability-weighted objective of a design from its scenario values
+    def objective_of(values, design):
+        risk = probabilities @ values
+        if cvar_weight > 0:
+            risk = (1 - cvar_weight) * risk + cvar_weight * cvar(values, probabilities, cvar_alpha)
+        return risk - master.capex_of(design)
+
+    shared = []
+    executor = None
+    try:
+        if workers > 1:
+            shared, descriptors = share_arrays(arrays)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(plant, descriptors))
+        else:
+            _models.clear()
+            _plant["plant"] = plant
+            _arrays.update(arrays)
+
+        def solve_scenarios(design, operations=False):
+            if executor is None:
+                return [_solve_scenario(s, design, operations) for s in range(S)]
+            return list(executor.map(_solve_scenario, range(S), [design] * S, [operations] * S))
+
+        history = []
+        best = None
+        stalled = 0
+        for iteration in range(max_iterations):
+            start = time.perf_counter()
+            upper_bound = master.solve()
+            design = master.design()
+            master_time = time.perf_counter() - start
+
+            # in-out stabilisation, as in the Benders decomposition
+            weight = 1.0 if best is None or stalled >= STALL_ITERATIONS else in_out
+            design = blend_linking([design], [best[1]] if best else None, weight)[0]
+
+            start = time.perf_counter()
+            results = solve_scenarios(design)
+            subproblem_time = time.perf_counter() - start
+
+            values = np.array([value for value, _, _ in results])
+            objective = objective_of(values, design)
+            if best is not None and objective <= best[0] + tolerance * max(abs(best[0]), 1.0):
+                stalled += 1
+            else:
+                stalled = 0
+            if best is None or objective > best[0]:
+                best = (objective, design)
+            for s, (value, gradient, _) in enumerate(results):
+                master.add_cut(s, value, gradient, design)
+
+            gap = (upper_bound - best[0]) / max(abs(best[0]), 1.0)
+            history.append({"iteration": iteration, "upper_bound": upper_bound, "lower_bound": best[0],
+                            "objective": objective, "gap": gap, "in_out": weight,
+                            "master_time_s": master_time, "subproblem_time_s": subproblem_time})
+            if verbose:
+                print(f"iteration {iteration}: bound {upper_bound:.2f} best {best[0]:.2f} gap {gap:.2e}")
+            if gap <= tolerance:
+                break
+
+        # dispatch of the best design in every scenario
+        objective, design = best
+        results = solve_scenarios(design, operations=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        release(shared)
+
+    return objective, design, [operations for _, _, operations in results], pd.DataFrame(history)
+
+
+def _monolithic(plant, prices, solar, probabilities, capacity_bounds, cvar_weight, cvar_alpha):
+    S, T = prices.shape
+    first = PlantVariables(T)
+    scenarios = [first] + [PlantVariables(T, capacities=first.capacities) for _ in range(S - 1)]
+    constraints = [first.capacities[key] <= capacity_bounds[key] for key in CAPACITY_KEYS]
+    values = []
+    for s, v in enumerate(scenarios):
+        constraints += power_balance(v, plant, solar[s])
+        constraints += green_cap(v, plant)
+        constraints += capacity_limits(v)
+        constraints += ramp(v, plant)
+        constraints += storage(v, "lp")
+        constraints += mass_balance(v)
+        values.append(-electricity_cost(v, plant, prices[s]) + electricity_revenue(v, prices[s])
+                      + h2_revenue(v, plant) - v.storage_cycling_cost)
+    values = cp.hstack(values)
+
+    risk = probabilities @ values
+    if cvar_weight > 0:
+        value_at_risk = cp.Variable()
+        shortfall = cp.Variable(S, nonneg = True)
+        constraints += [shortfall >= value_at_risk - values]
+        risk = (1 - cvar_weight) * risk + cvar_weight * (value_at_risk - probabilities @ shortfall / cvar_alpha)
+
+    problem = cp.Problem(cp.Maximize(risk - capex(first, plant)), constraints)
+    problem.solve(**default_solve_options("lp", S * T))
+    if problem.status not in ("optimal", "optimal_inaccurate"):
+        raise RuntimeError(f"extensive form {problem.status}")
+
+    operations = []
+    for s, v in enumerate(scenarios):
+        operations.append(pd.DataFrame({
+            "hourly_dayahead_dol_per_kwh": prices[s],
+            "realtime_production_kwh": v.realtime_consumption.value,
+            "realtime_supplied_kwh": v.realtime_supplied.value,
+            "solar_production_kwh": v.solar_consumed_facility.value,
+            **hourly_columns(v, plant),
+        }))
+    return problem.value, first.capacity_values(), operations, problem
+
+
+# Returns (problem, operations_df, facility[, stats]) like
+# run_profit_maximisation: operations_df stacks the dispatch of every
+# scenario (column "scenario"), and the facility summary holds the
+# capacities, the probability-weighted KPIs and the distribution of profit.
+# plant: PlantParams or the scalar run_profit_maximisation arguments by name
+# capacity_bounds: box on the capacities, by default capacity_bounds_from_data
+def run_stochastic_profit_maximisation(
+        hourly_dayahead_dol_per_kwh,
+        hourly_solar_production_kwh,
+        plant,
+        probabilities=None,
+        cvar_weight=0.0,
+        cvar_alpha=0.1,
+        method="lshaped",
+        capacity_bounds=None,
+        tolerance=1e-4,
+        max_iterations=200,
+        in_out=0.5,
+        workers=None,
+        verbose=False,
+        return_stats=False):
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    if not 0 <= cvar_weight <= 1 or not 0 < cvar_alpha <= 1:
+        raise ValueError("cvar_weight must be in [0, 1] and cvar_alpha in (0, 1]")
+    plant = plant if isinstance(plant, PlantParams) else PlantParams.from_mapping(plant)
+    prices = np.atleast_2d(np.asarray(hourly_dayahead_dol_per_kwh, dtype=float))
+    S, T = prices.shape
+    solar = np.ascontiguousarray(np.broadcast_to(np.asarray(hourly_solar_production_kwh, dtype=float), (S, T)))
+    probabilities = np.full(S, 1 / S) if probabilities is None else np.asarray(probabilities, dtype=float)
+    if len(probabilities) != S or not np.isclose(probabilities.sum(), 1) or (probabilities < 0).any():
+        raise ValueError(f"probabilities must be {S} nonnegative numbers summing to 1")
+    if capacity_bounds is None:
+        capacity_bounds = capacity_bounds_from_data(plant, prices, solar)
+
+    start = time.perf_counter()
+    if method == "lshaped":
+        workers = min(workers or os.cpu_count(), S)
+        objective, design, operations, history = _lshaped(
+            plant, prices, solar, probabilities, capacity_bounds, cvar_weight, cvar_alpha,
+            tolerance, max_iterations, in_out, workers, verbose)
+        gap = history["gap"].iloc[-1]
+        problem = DecomposedProblem("optimal" if gap <= tolerance else "user_limit", objective, history["upper_bound"].iloc[-1], len(history),
+                                    time.perf_counter() - start, 4 + S)
+    else:
+        objective, design, operations, problem = _monolithic(
+            plant, prices, solar, probabilities, capacity_bounds, cvar_weight, cvar_alpha)
+        history = None
+        gap = 0.0
+    check_capacity_bounds(design, capacity_bounds)
+
+    # KPIs of every scenario in one pass, then their expectation
+    kpis = compute_kpis(results_array(operations), design, plant)
+    profit = kpis["total_profit"]
+    facility = {
+        **design,
+        **{name: float(probabilities @ kpis[name]) for name in SALES_KPIS},
+        "total_profit": objective,
+        "expected_profit": float(probabilities @ profit),
+        "profit_cvar": cvar(profit, probabilities, cvar_alpha),
+        "profit_min": float(profit.min()),
+        "profit_max": float(profit.max()),
+        **{name: float(kpis[name][0]) for name in CAPEX_KPIS},
+        **{name: float(probabilities @ kpis[name]) for name in CAPACITY_FACTOR_KPIS + PER_KG_KPIS},
+        "scenarios": S,
+        "cvar_weight": cvar_weight,
+        "cvar_alpha": cvar_alpha,
+        "iterations": None if history is None else len(history),
+        "lshaped_gap": gap,
+        "formulation": "lp",
+        "lp_milp_gap": None,
+    }
+    wall_time = time.perf_counter() - start
+    operations_df = pd.concat([scenario.assign(scenario=s) for s, scenario in enumerate(operations)],
+                              ignore_index=True)
+
+    if return_stats:
+        return problem, operations_df, facility, solve_stats(problem, wall_time)
+    return problem, operations_df, facility
@@ -0,0 +1,148 @@
+import time
+
+import numpy as np
+import cvxpy as cp
+
+# Formulations of the gh2 storage on/off logic shared by all models.
+#   "milp": gh2_storage_active is boolean, big-M rows switch storage on/off
+#   "lp":   gh2_storage_active is relaxed to [0, 1] and every kg moved in or
+#           out of storage pays a small cycling cost, so simultaneous charge
+#           and discharge is never optimal; no integer variables
+#   "auto": solve the LP, accept it if it is feasible for the MILP (storage
+#           flags can be rounded up without violating the big-M rows),
+#           otherwise fall back to the MILP and report the objective gap
+FORMULATIONS = ("milp", "lp", "auto")
+
+STORAGE_BIG_M = 1000
+# $/kg moved through gh2 storage in the LP formulation
+STORAGE_CYCLING_COST_DOL_per_kg = 1e-5
+INTEGRALITY_TOLERANCE = 1e-6
+
+
+# horizon length above which the LP goes to HiGHS' interior point method
+IPM_MIN_HORIZON = 1000
+
+
+# cvxpy hands pure LPs to its default conic solver; HiGHS is faster on both
+# the short rolling windows (simplex) and the full-year LP (interior point)
+def default_solve_options(formulation, T):
+    if formulation != "lp" or cp.HIGHS not in cp.installed_solvers():
+        return {}
+    if T >= IPM_MIN_HORIZON:
+        return {"solver": cp.HIGHS, "highs_options": {"solver": "ipm"}}
+    return {"solver": cp.HIGHS}
+
+
+def check_formulation(formulation):
+    if formulation not in FORMULATIONS:
+        raise ValueError(f"formulation must be one of {FORMULATIONS}, got {formulation!r}")
+
+
+# big-M storage rows for the "milp" and "lp" formulations; returns the storage
+# flag variable, its constraints and the cycling cost to take off the objective
+def gh2_storage_logic(
+        formulation,
+        compressor_throughput,
+        liquefacion_throughput,
+        gh2_storage_inflow,
+        gh2_storage_outflow,
+        T):
+    if formulation == "milp":
+        gh2_storage_active = cp.Variable(T, boolean=True)
+        constraints = []
+        cycling_cost = 0
+    elif formulation == "lp":
+        gh2_storage_active = cp.Variable(T, nonneg=True)
+        constraints = [gh2_storage_active <= 1]
+        cycling_cost = STORAGE_CYCLING_COST_DOL_per_kg * cp.sum(gh2_storage_inflow + gh2_storage_outflow)
+    else:
+        raise ValueError(f"no storage constraints for formulation {formulation!r}")
+
+    # big-M constraint to only turn on storage if used
+    constraints += [
+        compressor_throughput - liquefacion_throughput <= STORAGE_BIG_M * gh2_storage_active,
+        gh2_storage_inflow <= STORAGE_BIG_M * gh2_storage_active,
+        gh2_storage_outflow <= STORAGE_BIG_M * gh2_storage_active
+    ]
+    return gh2_storage_active, constraints, cycling_cost
+
+
+# True if the hourly storage flows can be given 0/1 storage flags that satisfy
+# the big-M rows, i.e. the LP solution is also a solution of the MILP
+def storage_logic_is_integral(
+        compressor_throughput,
+        liquefacion_throughput,
+        gh2_storage_inflow,
+        gh2_storage_outflow):
+    net_to_storage = np.asarray(compressor_throughput) - np.asarray(liquefacion_throughput)
+    gh2_storage_inflow = np.asarray(gh2_storage_inflow)
+    gh2_storage_outflow = np.asarray(gh2_storage_outflow)
+
+    active = (net_to_storage > INTEGRALITY_TOLERANCE) \
+        | (gh2_storage_inflow > INTEGRALITY_TOLERANCE) \
+        | (gh2_storage_outflow > INTEGRALITY_TOLERANCE)
+    limit = STORAGE_BIG_M * active + INTEGRALITY_TOLERANCE
+    return bool(np.all(net_to_storage <= limit)
+                and np.all(gh2_storage_inflow <= limit)
+                and np.all(gh2_storage_outflow <= limit))
+
+
+def operations_storage_is_integral(operations_df):
+    return storage_logic_is_integral(
+        operations_df["compressor_produced_kg"],
+        operations_df["liquefaction_produced_kg"],
+        operations_df["gh2_storge_inflow_kg"],
+        operations_df["gh2_storage_outflow_kg"])
+
+
+# relative gap, with a $1 floor so near-zero objectives do not blow it up
+def objective_gap(lp_value, milp_value):
+    return abs(lp_value - milp_value) / max(abs(milp_value), 1.0)
+
+
+# cycling cost in the LP objective relative to it (with the $1 floor of
+# objective_gap): the LP keeps the cost off the objective, the MILP does not,
+# so it is what the two objectives of one dispatch differ by, not a measured
+# LP-MILP gap. Representative-day rows count for the days they stand for.
+def cycling_cost_gap(lp_value, operations_df):
+    weight = operations_df["weight_days"] if "weight_days" in operations_df else 1
+    throughput = (weight * (operations_df["gh2_storge_inflow_kg"] + operations_df["gh2_storage_outflow_kg"])).sum()
+    return float(STORAGE_CYCLING_COST_DOL_per_kg * throughput / max(abs(lp_value), 1.0))
+
+
+# "auto" formulation for the functional entry points. solve(formulation) runs
+# the model and returns its (problem, operations_df, facility, ...) tuple.
+# When the LP is kept the MILP is never solved, so lp_milp_gap stays None and
+# lp_cycling_cost_gap records the cycling cost the LP objective carries.
+def solve_auto(solve):
+    lp_result = solve("lp")
+    problem, operations_df, facility = lp_result[0:3]
+    if problem.value is not None and operations_storage_is_integral(operations_df):
+        facility["formulation"] = "lp"
+        facility["lp_milp_gap"] = None
+        facility["lp_cycling_cost_gap"] = cycling_cost_gap(problem.value, operations_df)
+        return lp_result
+
+    milp_result = solve("milp")
+    milp_facility = milp_result[2]
+    milp_facility["formulation"] = "milp"
+    if problem.value is not None and milp_result[0].value is not None:
+        milp_facility["lp_milp_gap"] = objective_gap(problem.value, milp_result[0].value)
+    return milp_result
+
+
+# Solve the same case with both formulations and report the objective gap,
+# e.g. compare_formulations(lambda f: run_profit_maximisation(..., formulation=f))
+def compare_formulations(solve):
+    report = {}
+    for formulation in ("lp", "milp"):
+        start = time.perf_counter()
+        problem = solve(formulation)[0]
+        report[f"{formulation}_objective"] = problem.value
+        report[f"{formulation}_status"] = problem.status
+        report[f"{formulation}_wall_time"] = time.perf_counter() - start
+    if report["lp_objective"] is not None and report["milp_objective"] is not None:
+        report["lp_milp_gap"] = objective_gap(report["lp_objective"], report["milp_objective"])
+    else:
+        report["lp_milp_gap"] = None
+    return report
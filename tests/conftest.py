@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The notebook plant (benchmark_representative_days.profit_args) on a
+# synthetic price / solar series, so the tests need no market data cache.
+
+FACILITY_LIFETIME = 20
+
+
+# diurnal solar and a price with an evening peak and a few negative hours
+# (which make the levelised cost model build a plant)
+def synthetic_series(T, seed=0):
+    rng = np.random.default_rng(seed)
+    hour = np.arange(T) % 24
+    solar = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * rng.uniform(0.6, 1.0, T)
+    prices = 0.025 + 0.02 * np.sin((hour - 12) / 24 * 2 * np.pi) + rng.normal(0, 0.005, T)
+    prices[rng.choice(T, size=T // 12, replace=False)] = -0.1
+    return prices, solar
+
+
+# run_profit_maximisation arguments by name, without T
+def notebook_params(T, seed=0):
+    prices, solar = synthetic_series(T, seed)
+    num_days = T / 24
+    # $ per kg per day of nameplate, annualised over the modelled days
+    capex = lambda dol_tpd: dol_tpd / 1000 * (num_days / (FACILITY_LIFETIME * 365))
+    return {
+        "SOLAR_CAPACITY": 400,
+        "SOLAR_PPA_DOL_KWH": 0.03,
+        "hourly_solar_production_kwh": solar,
+        "hourly_dayahead_dol_per_kwh": prices,
+        "ELECTROLYSIS_EFFICIENCY": 55,
+        "COMPRESSION_EFFICIENCY": 4,
+        "LIQUEFACTION_EFFICIENCY": 10,
+        "FUEL_CELL_EFFICIENCY": 20,
+        "LIQUEFACTION_MAX_UP": 0.1,
+        "LIQUEFACTION_MAX_DOWN": 0.1,
+        "OFFTAKE_TPD": 1,
+        "NUM_DAYS": num_days,
+        "ELECTROLYSIS_CAPEX_DOL_kgPD": capex(1200000),
+        "COMPRESSOR_CAPEX_DOL_kgPD": capex(900000),
+        "LIQUEFACTION_CAPEX_DOL_kgPD": capex(2350000),
+        "FUELCELL_CAPEX_DOL_kgPD": capex(1945000),
+        "H2_SALES_PRICE_DOL_per_kg": 4.5,
+        "GREEN_THRESHOLD_kg_per_kg": 0.4,
+        "ERCTO_CO2_kg_per_kwh": 0.42062,
+    }
+
+
+@pytest.fixture
+def params():
+    return notebook_params(48)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from annual_profit_optimisation import run_profit_maximisation
+from conftest import notebook_params
+from h2_plant import CAPACITY_KEYS, PlantParams, compute_kpis, results_array
+from merit_order_dispatch import merit_order_dispatch
+
+T = 168
+# operating margin (sales less electricity) the heuristic may leave on the
+# table against the LP dispatch of the same design
+MARGIN_GAP = 0.25
+TOLERANCE = 1e-6
+
+
+def operating_margin(operations_df, capacities, plant):
+    kpis = compute_kpis(results_array(operations_df), capacities, plant)
+    return kpis["h2_revenue"] + kpis["wholesale_revenue"] - kpis["opex"]
+
+
+@pytest.fixture(scope="module")
+def lp_run():
+    params = notebook_params(T)
+    _, operations_df, facility = run_profit_maximisation(**params, T=T, formulation="lp")
+    return params, operations_df, {key: facility[key] for key in CAPACITY_KEYS}
+
+
+# every row of the continuous-ramp dispatch model, with no green slack
+def test_heuristic_is_feasible(lp_run):
+    params, _, capacities = lp_run
+    plant = PlantParams.from_mapping(params)
+    df = merit_order_dispatch(params["hourly_dayahead_dol_per_kwh"], params["hourly_solar_production_kwh"],
+                              capacities, plant)
+    production = df["electrolyser_produced_kg"].to_numpy()
+    liquefaction = df["liquefaction_produced_kg"].to_numpy()
+    fuel_cell = df["fuel_cell_consumed_kg"].to_numpy()
+    inflow = df["gh2_storge_inflow_kg"].to_numpy()
+    outflow = df["gh2_storage_outflow_kg"].to_numpy()
+    level = np.append(df["gh2_storage_level_kg"].to_numpy(), 0)
+    level[-1] = level[-2] + inflow[-1] - outflow[-1] - fuel_cell[-1]
+
+    assert liquefaction.sum() > 0
+    assert (production <= min(capacities["electrolyser_capacity_ph"], capacities["compressor_capacity_ph"])
+            + TOLERANCE).all()
+    assert (liquefaction <= capacities["liquefaction_capacity_ph"] + TOLERANCE).all()
+    assert (fuel_cell <= capacities["fuelcell_capacity_ph"] + TOLERANCE).all()
+    assert (np.diff(liquefaction) <= plant.LIQUEFACTION_MAX_UP * capacities["liquefaction_capacity_ph"]
+            + TOLERANCE).all()
+    assert (-np.diff(liquefaction) <= plant.LIQUEFACTION_MAX_DOWN * capacities["liquefaction_capacity_ph"]
+            + TOLERANCE).all()
+    assert (level >= -TOLERANCE).all()
+    np.testing.assert_allclose(np.diff(level), inflow - outflow - fuel_cell, atol=TOLERANCE)
+    np.testing.assert_allclose(production, df["compress_to_liquefaction"] + inflow, atol=TOLERANCE)
+    np.testing.assert_allclose(liquefaction, df["compress_to_liquefaction"] + outflow, atol=TOLERANCE)
+    np.testing.assert_allclose(
+        df["realtime_production_kwh"] + df["solar_production_kwh"],
+        df["electrolyser_consumption_kwh"] + df["compressor_consumption_kwh"] + df["liquefaction_consumption_kwh"],
+        atol=TOLERANCE)
+    assert (df["solar_production_kwh"] <= plant.SOLAR_CAPACITY * df["solar_available_kwh"] + TOLERANCE).all()
+    assert (df["realtime_production_kwh"] >= -TOLERANCE).all()
+    assert df["ci_slack"].max() == 0
+
+
+def test_heuristic_is_close_to_the_lp(lp_run):
+    params, operations_df, capacities = lp_run
+    plant = PlantParams.from_mapping(params)
+    df = merit_order_dispatch(params["hourly_dayahead_dol_per_kwh"], params["hourly_solar_production_kwh"],
+                              capacities, plant)
+    lp_margin = operating_margin(operations_df, capacities, plant)
+    heuristic_margin = operating_margin(df, capacities, plant)
+    assert heuristic_margin <= lp_margin + TOLERANCE
+    assert heuristic_margin >= (1 - MARGIN_GAP) * lp_margin
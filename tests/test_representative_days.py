@@ -0,0 +1,57 @@
+import pytest
+
+from annual_profit_optimisation import run_profit_maximisation
+from conftest import notebook_params
+from representative_days import run_representative_day_sizing, select_representative_days
+
+T = 24 * 7
+FIXED = {
+    "electrolyser_capacity_ph": 1,
+    "compressor_capacity_ph": 1,
+    "liquefaction_capacity_ph": 1,
+    "fuelcell_capacity_ph": 1,
+}
+
+
+# a fixed design is dispatched on the representative days, not re-sized
+def test_fixed_capacities_pin_the_design():
+    _, _, facility = run_profit_maximisation(**notebook_params(T), T=T, formulation="lp", representative_days=3,
+                                             fixed_capacities=FIXED)
+    for key, capacity in FIXED.items():
+        assert facility[key] == pytest.approx(capacity, abs=1e-6), key
+
+
+# the representative-day model has no sparse backend
+def test_sparse_backend_is_rejected():
+    with pytest.raises(ValueError, match="backend"):
+        run_profit_maximisation(**notebook_params(T), T=T, representative_days=3, backend="sparse")
+
+
+# nor a merit-order warm start
+def test_warm_start_is_rejected():
+    with pytest.raises(ValueError, match="warm_start"):
+        run_profit_maximisation(**notebook_params(T), T=T, representative_days=3, warm_start=FIXED)
+
+
+def size_days(formulation):
+    params = notebook_params(T)
+    days = select_representative_days(params.pop("hourly_dayahead_dol_per_kwh"),
+                                      params.pop("hourly_solar_production_kwh"), 3)
+    return run_representative_day_sizing("profit", days, **params, formulation=formulation)
+
+
+# the formulation is checked like the other entry points; "auto" reports the
+# one it kept
+def test_formulation_is_checked():
+    with pytest.raises(ValueError, match="formulation"):
+        size_days("MILP")
+    _, _, facility = size_days("auto")
+    assert facility["formulation"] in ("lp", "milp")
+
+
+# an "auto" run that keeps the LP never measures the LP-MILP gap
+def test_auto_keeping_the_lp_reports_no_gap():
+    _, _, facility = size_days("auto")
+    assert facility["formulation"] == "lp"
+    assert facility["lp_milp_gap"] is None
+    assert 0 < facility["lp_cycling_cost_gap"] < 1e-3
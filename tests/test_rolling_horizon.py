@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import notebook_params
+from rolling_horizon_optimisation import INITIAL_STATE, RollingHorizonModel, _hold, simulate_rolling_horizon
+
+N = 48
+HORIZON = 12
+CAPACITIES = {
+    "electrolyser_capacity_ph": 10,
+    "compressor_capacity_ph": 10,
+    "liquefaction_capacity_ph": 5,
+    "fuelcell_capacity_ph": 5,
+}
+PLANT_KEYS = ["SOLAR_CAPACITY", "SOLAR_PPA_DOL_KWH", "ELECTROLYSIS_EFFICIENCY", "COMPRESSION_EFFICIENCY",
+              "LIQUEFACTION_EFFICIENCY", "FUEL_CELL_EFFICIENCY", "LIQUEFACTION_MAX_UP", "LIQUEFACTION_MAX_DOWN",
+              "H2_SALES_PRICE_DOL_per_kg", "GREEN_THRESHOLD_kg_per_kg", "ERCTO_CO2_kg_per_kwh"]
+
+
+def simulate(on_failure, initial_state=None, commit=1):
+    params = notebook_params(N)
+    return simulate_rolling_horizon(params["hourly_dayahead_dol_per_kwh"], params["hourly_solar_production_kwh"],
+                                    CAPACITIES, horizon=HORIZON, commit=commit, initial_state=initial_state,
+                                    on_failure=on_failure, formulation="lp", **{key: params[key] for key in PLANT_KEYS})
+
+
+# held rows: mass balance per hour, within the nameplates and the gas stored
+def assert_plant_holds(operations, rows, initial_level):
+    held = operations.iloc[rows]
+    atol = 1e-9
+    np.testing.assert_allclose(held["liquefaction_produced_kg"],
+                               held["compress_to_liquefaction"] + held["gh2_storage_outflow_kg"], atol=atol)
+    np.testing.assert_allclose(held["compressor_produced_kg"],
+                               held["compress_to_liquefaction"] + held["gh2_storge_inflow_kg"], atol=atol)
+    np.testing.assert_allclose(held["electrolyser_produced_kg"], held["compressor_produced_kg"], atol=atol)
+    for column, key in [("electrolyser_produced_kg", "electrolyser_capacity_ph"),
+                        ("compressor_produced_kg", "compressor_capacity_ph"),
+                        ("liquefaction_produced_kg", "liquefaction_capacity_ph"),
+                        ("fuel_cell_consumed_kg", "fuelcell_capacity_ph")]:
+        assert (held[column] <= CAPACITIES[key] + atol).all(), column
+    assert (held["solar_production_kwh"] <= held["solar_available_kwh"] * notebook_params(N)["SOLAR_CAPACITY"]
+            + atol).all()
+    level = np.r_[initial_level, held["gh2_storage_level_kg"]]
+    assert (level >= -atol).all()
+    np.testing.assert_allclose(np.diff(level), held["gh2_storge_inflow_kg"] - held["gh2_storage_outflow_kg"]
+                               - held["fuel_cell_consumed_kg"], atol=atol)
+
+
+# a previous liquefaction ten times the capacity: no window can start from it
+@pytest.fixture(scope="module")
+def out_of_reach():
+    return {**INITIAL_STATE, "gh2_storage_level_kg": 20, "liquefaction_produced_kg": 50}
+
+
+# the first window fails; relax and hold both carry on from a state in reach
+def test_failure_modes_recover_after_the_first_window(out_of_reach):
+    with pytest.raises(Exception):
+        simulate("raise", out_of_reach)
+    for on_failure in ("relax", "hold"):
+        operations = simulate(on_failure, out_of_reach)
+        assert operations["fallback"].sum() == 1
+        assert (operations["liquefaction_produced_kg"][1:] <= CAPACITIES["liquefaction_capacity_ph"] + 1e-6).all()
+
+
+# holding the initial row dispatches nothing: the liquefaction only drains
+# the gas stored, and the offtake counts no more than that
+def test_hold_from_the_initial_state(out_of_reach):
+    commit = HORIZON - 1
+    held = simulate("hold", out_of_reach, commit=commit)
+    rows = slice(1, commit + 1)
+    assert held["fallback"][rows].all()
+    assert_plant_holds(held, rows, out_of_reach["gh2_storage_level_kg"])
+    assert (held["electrolyser_produced_kg"][rows] == 0).all()
+    assert held["liquefaction_produced_kg"][rows].sum() <= out_of_reach["gh2_storage_level_kg"] + 1e-9
+    np.testing.assert_allclose(np.diff(held["h2_offtake_running_sum"][:commit + 1]),
+                               held["liquefaction_produced_kg"][rows] + held["fuel_cell_consumed_kg"][rows], atol=1e-9)
+
+
+# holding a dispatched hour keeps it within the plant for a whole day
+def test_hold_a_dispatched_hour():
+    operations = simulate("raise")
+    params = notebook_params(N)
+    plant = RollingHorizonModel(T=HORIZON, capacities=CAPACITIES, formulation="lp",
+                                **{key: params[key] for key in PLANT_KEYS}).plant
+    t = int(operations["liquefaction_produced_kg"].to_numpy().argmax())
+    t = min(t, N - 25)
+    results = {name: operations[name].to_numpy().copy() for name in operations}
+    state = {name: results[name][t] for name in INITIAL_STATE}
+    _hold(results, state, t, 24, plant, CAPACITIES)
+    rows = slice(t + 1, t + 25)
+    assert_plant_holds(pd.DataFrame(results), rows, state["gh2_storage_level_kg"])
+    assert results["liquefaction_produced_kg"][t + 1] > 0
+    ramp = np.diff(results["liquefaction_produced_kg"][t:t + 25])
+    limit = params["LIQUEFACTION_MAX_UP"] * CAPACITIES["liquefaction_capacity_ph"]
+    # the held rate within the ramp limits until the store runs empty
+    assert (ramp <= limit + 1e-9).all()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+# Canonical hourly time axis for a year of ERCOT / solar data.
+#
+# The canonical index of a year is the sequence of UTC hours from local
+# midnight on Jan 1 to local midnight on Jan 1 of the next year, so it always
+# has 8760 (8784) contiguous slots regardless of DST. Sources are mapped onto
+# it with integer hour offsets:
+#   - ERCOT files carry local wall-clock times: the spring-forward hour does
+#     not exist (its slot stays a gap) and the fall-back hour is repeated, the
+#     first occurrence is daylight time and the second standard time (if the
+#     file only has one row for it, the standard-time slot is a gap)
+#   - the Renewables.ninja profile carries UTC times and maps directly
+# Every aligned series comes with a boolean mask of the slots with no data.
+
+ERCOT_TIMEZONE = "America/Chicago"
+
+
+def canonical_start(year, tz=ERCOT_TIMEZONE):
+    return pd.Timestamp(year, 1, 1).tz_localize(tz).tz_convert("UTC")
+
+
+def canonical_hours(year, tz=ERCOT_TIMEZONE):
+    end = pd.Timestamp(year + 1, 1, 1).tz_localize(tz).tz_convert("UTC")
+    return int((end - canonical_start(year, tz)) // pd.Timedelta(hours=1))
+
+
+# local wall-clock time of each canonical slot (naive, repeats the fall-back hour)
+def canonical_local_time(year, tz=ERCOT_TIMEZONE):
+    utc = pd.date_range(canonical_start(year, tz), periods=canonical_hours(year, tz), freq="h")
+    return utc.tz_convert(tz).tz_localize(None)
+
+
+def utc_offsets(utc_times, year, tz=ERCOT_TIMEZONE):
+    utc_times = pd.DatetimeIndex(utc_times)
+    if utc_times.tz is None:
+        utc_times = utc_times.tz_localize("UTC")
+    return ((utc_times - canonical_start(year, tz)) // pd.Timedelta(hours=1)).to_numpy()
+
+
+# offsets of naive local wall-clock times; `groups` (e.g. the load zone of
+# every row) separates series stacked in one file so repeats are detected per
+# series. Non-existent times get offset -1.
+def local_offsets(wall_clock_times, year, groups=None, tz=ERCOT_TIMEZONE):
+    wall_clock_times = pd.DatetimeIndex(wall_clock_times)
+    if groups is None:
+        groups = np.zeros(len(wall_clock_times), dtype=np.int64)
+    groups = pd.factorize(np.asarray(groups))[0]
+
+    # a row repeating an earlier wall-clock time of its series is the
+    # standard-time (second) occurrence of the fall-back hour
+    repeated = pd.DataFrame({"group": groups, "time": wall_clock_times}).duplicated(keep="first").to_numpy()
+    localised = wall_clock_times.tz_localize(tz, ambiguous=~repeated, nonexistent="NaT")
+    offsets = np.full(len(localised), -1, dtype=np.int64)
+    valid = ~localised.isna()
+    offsets[valid] = (localised[valid].tz_convert("UTC") - canonical_start(year, tz)) // pd.Timedelta(hours=1)
+    return offsets
+
+
+# scatter values onto the canonical index; returns (values, gap_mask)
+def align(offsets, values, n, dtype=np.float32):
+    offsets = np.asarray(offsets)
+    aligned = np.full(n, np.nan, dtype=dtype)
+    keep = (offsets >= 0) & (offsets < n)
+    aligned[offsets[keep]] = np.asarray(values)[keep]
+    return aligned, np.isnan(aligned)
+
+
+# fill gaps with the last observed value, or with the value `period` slots
+# earlier (e.g. 24 for the diurnal solar profile); leading gaps that cannot be
+# filled that way take the first observed value
+def fill_gaps(values, period=None):
+    values = np.array(values, dtype=float)
+    missing = np.isnan(values)
+    if missing.all():
+        raise ValueError("series has no data")
+    if not missing.any():
+        return values
+
+    if period is not None:
+        gaps = np.flatnonzero(missing)
+        gaps = gaps[gaps >= period]
+        # each pass fills gaps whose value one period back is known
+        while len(gaps):
+            values[gaps] = values[gaps - period]
+            gaps = gaps[np.isnan(values[gaps])]
+            gaps = gaps[~np.isnan(values[gaps - period])]
+        missing = np.isnan(values)
+
+    index = np.where(missing, 0, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    values = values[index]
+    first = np.flatnonzero(~np.isnan(values))[0]
+    values[:first] = values[first]
+    return values
+
+
+# an hourly series on a grid of dt_hours periods: dt_hours = 1/k splits each
+# hour into k periods, holding its value ("hold", e.g. prices) or
+# interpolating between hour centres ("linear", e.g. the solar profile);
+# an integer dt_hours averages whole hours (a trailing partial period
+# averages the hours it has). Boolean series (gap masks) are held, or any().
+def resample(values, dt_hours, method="hold"):
+    values = np.asarray(values)
+    if dt_hours == 1:
+        return values
+    if dt_hours > 1:
+        hours = int(round(dt_hours))
+        if not np.isclose(hours, dt_hours):
+            raise ValueError(f"dt_hours {dt_hours} is not a whole number of hours")
+        starts = np.arange(0, len(values), hours)
+        if values.dtype == bool:
+            return np.logical_or.reduceat(values, starts)
+        return np.add.reduceat(values.astype(float), starts) / np.diff(np.append(starts, len(values)))
+
+    steps = int(round(1 / dt_hours))
+    if not np.isclose(steps * dt_hours, 1):
+        raise ValueError(f"dt_hours {dt_hours} does not divide an hour")
+    if method == "hold" or values.dtype == bool:
+        return np.repeat(values, steps)
+    if method == "linear":
+        centres = (np.arange(len(values) * steps) + 0.5) / steps - 0.5
+        return np.interp(centres, np.arange(len(values)), values)
+    raise ValueError(f"unknown method {method!r}")
@@ -0,0 +1,89 @@
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from annual_profit_optimisation import run_profit_maximisation
+from h2_plant import (CAPACITY_FACTOR_KPIS, CAPACITY_KEYS, CAPEX_KPIS, PER_KG_KPIS, SALES_KPIS, compute_kpis,
+                      results_array, select_kpis)
+from market_data import load_zone_matrix
+from rolling_horizon_optimisation import RollingHorizonModel, simulate_rolling_horizon
+
+# The same plant in every ERCOT load zone, one row per zone.
+#
+#   table = run_zones(base_params, 2019, hours=24*28, workers=8)
+#   table = run_zones(plant_params, 2019, mode="rolling", capacities=facility, horizon=24)
+#
+# The price file is parsed once (market_data caches every zone) and stacked
+# into a zones x hours matrix; each worker gets its zone's row and the shared
+# solar profile. mode="profit" sizes the plant with run_profit_maximisation
+# (base_params: its arguments other than the hourly series and T);
+# mode="rolling" dispatches given capacities with simulate_rolling_horizon
+# (base_params: the RollingHorizonModel arguments, plus the capex
+# parameters if the table should include capex and LCOH; capacities: one
+# facility summary for all zones or a dict of them by zone). The table holds
+# the capacities, profit, LCOH and the other KPIs of each zone.
+
+MODES = ("profit", "rolling")
+
+# RollingHorizonModel arguments taken from base_params in rolling mode
+ROLLING_PLANT_ARGS = [name for name in inspect.signature(RollingHorizonModel).parameters
+                      if name not in ("T", "capacities")]
+
+
+def _run_zone(zone, prices, solar, base_params, mode, capacities, simulate_kwargs):
+    if mode == "profit":
+        problem, _, facility = run_profit_maximisation(**{
+            **base_params, "hourly_dayahead_dol_per_kwh": prices, "hourly_solar_production_kwh": solar,
+            "T": len(prices)})
+        row = {"zone": zone, "status": problem.status}
+        row.update({key: value for key, value in (facility or {}).items() if np.isscalar(value) or value is None})
+        return row
+
+    plant = {name: base_params[name] for name in ROLLING_PLANT_ARGS if name in base_params}
+    operations_df = simulate_rolling_horizon(prices, solar, capacities, **plant, **simulate_kwargs)
+    kpis = compute_kpis(results_array(operations_df), capacities, base_params)
+    return {
+        "zone": zone,
+        **{key: capacities[key] for key in CAPACITY_KEYS},
+        **select_kpis(kpis, SALES_KPIS),
+        "total_profit": kpis["total_profit"],
+        **select_kpis(kpis, CAPEX_KPIS + CAPACITY_FACTOR_KPIS + PER_KG_KPIS),
+        "fallback_hours": int(operations_df["fallback"].sum()),
+    }
+
+
+def run_zones(base_params, year, zone_names=None, mode="profit", capacities=None, start=0, hours=None,
+              market="dayahead", workers=None, **simulate_kwargs):
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if mode == "rolling" and capacities is None:
+        raise ValueError("mode='rolling' needs the capacities to dispatch")
+
+    data = load_zone_matrix(year, start, hours, market, zone_names)
+    zone_names = data["zones"]
+    prices = data["hourly_dayahead_dol_per_kwh"]
+    solar = data["hourly_solar_production_kwh"]
+
+    # one facility summary for every zone, or one per zone
+    def zone_capacities(zone):
+        if capacities is None or all(key in capacities for key in CAPACITY_KEYS):
+            return capacities
+        return capacities[zone]
+
+    cases = [(zone, prices[i], solar, base_params, mode, zone_capacities(zone), simulate_kwargs)
+             for i, zone in enumerate(zone_names)]
+    workers = min(workers or os.cpu_count(), len(cases))
+
+    # serial in-process run, e.g. for debugging a single zone
+    if workers == 1:
+        rows = [_run_zone(*case) for case in cases]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(_run_zone, *zip(*cases)))
+
+    table = pd.DataFrame(rows)
+    table["price_gap_hours"] = data["price_gap"].sum(axis=1)
+    return table